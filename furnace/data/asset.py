@@ -4,8 +4,11 @@
     not just one day's worth """
 
 from furnace.data import fcalendar
+import abc
 import numpy
+import pandas
 import functools
+from pandas import DatetimeIndex
 
 def growth(begin, end):
     """ Calculates the percent growth between two values """
@@ -30,6 +33,7 @@ class Universe(object):
     def __init__(self, assets, factory):
         self._assets = dict((asset.symbol(), asset) for asset in assets)
         self._factory = factory
+        self._covariances = {}
 
     def __getitem__(self, symbol):
         """ Grabs one of our assets based on the symbol """
@@ -57,6 +61,132 @@ class Universe(object):
         """ Iterates through all assets """
         return self._assets.itervalues()
 
+    def resampled(self, calendar):
+        """ Returns this universe with its assets sampled on the bars of calendar """
+        return self._factory.resampled(calendar).make_universe(self._assets.keys())
+
+    def windowed_covariance(self, lookback):
+        """ Returns this universe's covariance over trailing windows of lookback trading days, shared by everything
+        asking for the same lookback """
+        key = ("windowed", lookback)
+        if key not in self._covariances:
+            self._covariances[key] = WindowedCovariance(sorted(self), lookback)
+        return self._covariances[key]
+
+    def exponential_covariance(self, halflife):
+        """ Returns this universe's exponentially weighted covariance with a halflife in trading days, shared by
+        everything asking for the same halflife """
+        key = ("exponential", halflife)
+        if key not in self._covariances:
+            self._covariances[key] = ExponentialCovariance(sorted(self), halflife)
+        return self._covariances[key]
+
+class Covariance(object):
+    """ Annualized covariance of assets' daily returns, looked up by date. Assets are rows and columns in the order
+    given. Covariances are maintained incrementally, so lookups are cheapest moving forward through time """
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, assets):
+        closes = pandas.concat([asset.prices() for asset in assets], axis=1)
+        returns = closes.astype(float).pct_change().iloc[1:]
+        self._assets = assets
+        self._dates = returns.index
+        self._missing = numpy.concatenate([[0], numpy.cumsum(returns.isnull().any(axis=1).values)])
+        self._returns = returns.fillna(0.0).values
+
+    def assets(self):
+        """ The assets covaried, in row and column order """
+        return self._assets
+
+    @abc.abstractmethod
+    def on(self, date):
+        """ Returns the covariance as of the close on date """
+        pass
+
+    def correlation_on(self, date):
+        """ Returns the correlation as of the close on date """
+        covariance = self.on(date)
+        volatilities = numpy.sqrt(numpy.diag(covariance))
+        return covariance / numpy.outer(volatilities, volatilities)
+
+    def _days_through(self, date):
+        """ The number of days of returns up to and including date """
+        return self._dates.values.searchsorted(numpy.datetime64(date), side='right')
+
+    def _complete_between(self, first, last):
+        """ Predicate on every asset having returns for the days from first up to last """
+        return self._missing[last] == self._missing[first]
+
+class WindowedCovariance(Covariance):
+    """ Covariance over a trailing window of lookback trading days. Running sums of returns and their outer products
+    are kept for the current window, each day is added to them as a rank one update and removed as a downdate once
+    it leaves the window. Moving back in time starts the sums over """
+
+    def __init__(self, assets, lookback):
+        super(WindowedCovariance, self).__init__(assets)
+        self._lookback = lookback
+        self._first = self._last = 0
+        self._sums = numpy.zeros(len(assets))
+        self._products = numpy.zeros((len(assets), len(assets)))
+
+    def on(self, date):
+        last = self._days_through(date)
+        first = max(last - self._lookback, 0)
+        assert last - first > 1
+        assert self._complete_between(first, last), "not every asset has prices before {0}".format(date)
+
+        #NOTE: windows clamped to the start of history share their first day, so moving back shows in last alone
+        if first < self._first or last < self._last or first >= self._last:
+            self._first = self._last = first
+            self._sums[:] = 0.0
+            self._products[:] = 0.0
+        #NOTE: the rank one updates of many days at once are summed as a single matrix product
+        self._slide(self._returns[self._last:last], 1.0)
+        self._slide(self._returns[self._first:first], -1.0)
+        self._first, self._last = first, last
+
+        count = float(last - first)
+        means = self._sums / count
+        covariance = (self._products - count * numpy.outer(means, means)) / (count - 1.0)
+        return fcalendar.trading_days_in_year() * covariance
+
+    def _slide(self, returns, sign):
+        """ Adds or removes days of returns from the running sums """
+        self._sums += sign * returns.sum(axis=0)
+        self._products += sign * returns.T.dot(returns)
+
+class ExponentialCovariance(Covariance):
+    """ Exponentially weighted covariance, with each day's weight halving every halflife trading days. Starts from
+    the first day of the latest stretch in which every asset has returns, and is updated one rank one step per day.
+    Moving back in time starts over. Matches pandas' ewmcov with adjust=False and bias=True """
+
+    def __init__(self, assets, halflife):
+        super(ExponentialCovariance, self).__init__(assets)
+        self._decay = 0.5 ** (1.0 / halflife)
+        self._incomplete = numpy.nonzero(numpy.diff(self._missing))[0]
+        self._start = self._last = None
+        self._means = numpy.zeros(len(assets))
+        self._covariance = numpy.zeros((len(assets), len(assets)))
+
+    def on(self, date):
+        last = self._days_through(date)
+        gaps = self._incomplete[:self._incomplete.searchsorted(last)]
+        start = gaps[-1] + 1 if len(gaps) else 0
+        assert last > start + 1, "not every asset has prices before {0}".format(date)
+
+        if start != self._start or last < self._last:
+            self._start, self._last = start, start + 1
+            self._means = self._returns[start].copy()
+            self._covariance[:] = 0.0
+        for returns in self._returns[self._last:last]:
+            deviations = returns - self._means
+            self._means += (1.0 - self._decay) * deviations
+            self._covariance = self._decay * (self._covariance +
+                                              (1.0 - self._decay) * numpy.outer(deviations, deviations))
+        self._last = last
+
+        return fcalendar.trading_days_in_year() * self._covariance
+
 #NOTE: data_cache is expected to be eager loaded (current design, anyway)
 class Factory(object):
     """ Represents all tradable assets loaded """
@@ -77,6 +207,13 @@ class Factory(object):
         """ Returns a universe of tradable assets restricted to those passed in """
         return Universe((self.make_asset(symbol) for symbol in symbols), self)
 
+    def resampled(self, calendar):
+        """ Returns a factory of assets sampled on the bars of calendar, such as a resampled calendar of weeks. Every
+        column, adjusted closes included, is taken as of each bar's close """
+        dates = calendar.dates()
+        return Factory(dict((symbol, table[table.index.isin(dates)]) for symbol, table in self._data_cache.iteritems()),
+                       calendar)
+
 @functools.total_ordering
 class Asset(object):
     """ Represents a tradable security, by symbol, over a period of time """
@@ -89,7 +226,10 @@ class Asset(object):
     #optimization
     def make_index(self, begin_date, basis, end_date):
         """ Creates an index for this asset weighted initially at basis """
-        table = self._table[(self._table.index >= begin_date) & (self._table.index <= end_date)][["Adjusted Close"]]
+        #NOTE: copying marks the slice as our own. Otherwise pandas checks for chained assignment on every column we
+        #add below with a full garbage collection, which used to dominate backtests
+        table = self._table[(self._table.index >= begin_date) & (self._table.index <= end_date)]
+        table = table[["Adjusted Close"]].copy()
         table.columns = [self.symbol() + "_AdjustedPrice"]
 
         initial_basis = basis / table.ix[begin_date]
@@ -98,6 +238,16 @@ class Asset(object):
         table[self.symbol() + "_Index"] = table[self.symbol() + "_AdjustedPrice"] * table[self.symbol() + "_Basis"]
         return table 
 
+    def prices(self, begin_date=None, end_date=None, column="Adjusted Close"):
+        """ Returns a column of this asset's price table, adjusted closes by default, from begin_date to end_date
+        inclusive. Either left out extends to that end of our history """
+        prices = self._table[column].astype(float)
+        if begin_date is not None:
+            prices = prices[prices.index >= begin_date]
+        if end_date is not None:
+            prices = prices[prices.index <= end_date]
+        return prices
+
     #TODO add to some sort of helper class rather than reimplementing everywhere
     #TODO test
     def total_return(self, begin_date, end_date):
@@ -144,6 +294,40 @@ class Asset(object):
 
         return numpy.sqrt(fcalendar.trading_days_in_year()*variance)
 
+    def total_returns(self, begin_dates, end_dates):
+        """ Vectorized total return, one per pair of begin and end dates """
+        closes = self._table["Adjusted Close"]
+        begin_dates = DatetimeIndex(begin_dates)
+        end_dates = DatetimeIndex(end_dates)
+        assert begin_dates.min() >= closes.index[0]
+        assert end_dates.max() <= closes.index[-1]
+
+        #NOTE: adjusted closes may be held as objects, results are always floats
+        return growth(closes.reindex(begin_dates).values.astype(float), closes.reindex(end_dates).values.astype(float))
+
+    def cagrs(self, begin_dates, end_dates):
+        """ Vectorized cagr, one per pair of begin and end dates """
+        days = self._calendar.ordinals_before(end_dates) - self._calendar.ordinals_before(begin_dates)
+        return annualized(self.total_returns(begin_dates, end_dates), days + 1.0)
+
+    def volatilities(self, begin_dates, end_dates):
+        """ Vectorized volatility, one per pair of begin and end dates. Windows may differ in length, each is taken
+        from running sums of daily returns and their squares """
+        closes = self._table["Adjusted Close"]
+        firsts = closes.index.values.searchsorted(DatetimeIndex(begin_dates).values)
+        lasts = closes.index.values.searchsorted(DatetimeIndex(end_dates).values, side='right') - 1
+        assert (lasts - firsts > 1).all()
+
+        returns = closes.pct_change().fillna(0.0).values.astype(float)
+        sums = numpy.concatenate([[0.0], numpy.cumsum(returns)])
+        squares = numpy.concatenate([[0.0], numpy.cumsum(returns * returns)])
+
+        #NOTE: the return on a window's first day belongs to the day before it, so windows start one row later
+        counts = lasts - firsts
+        window_sums = sums[lasts + 1] - sums[firsts + 1]
+        variances = (squares[lasts + 1] - squares[firsts + 1] - window_sums * window_sums / counts) / (counts - 1)
+        return numpy.sqrt(fcalendar.trading_days_in_year() * numpy.maximum(variances, 0.0))
+
     #TODO: reevaluate when comissions are in to see if this can be taken back out
     def symbol(self):
         """ Getter for this assets symbol """
@@ -8,7 +8,7 @@
 from datetime import datetime, timedelta
 from dateutil.rrule import rrule, rruleset, DAILY, WEEKLY, YEARLY, MO, TU, WE, TH, FR
 import bisect
-from pandas import Series
+from pandas import Series, DatetimeIndex
 import numpy
 
 def trading_days_in_year():
@@ -36,17 +36,60 @@ class FCalendar(object):
     def nth_trading_day_after(self, nth, a_date):
         """ Finds the nth trading day after aDate.  Takes into account holidays and weekends. """
 
-        return self._dates[bisect.bisect_left(self._dates, a_date) + nth]
+        return self._dates[bisect.bisect_left(self._dates, a_date) + int(nth)]
 
     def nth_trading_day_before(self, nth, a_date):
         """ Finds the nth trading day before aDate.  Takes into account holidays and weekends. """
 
-        return self._dates[bisect.bisect_right(self._dates, a_date) - (nth + 1)]
+        return self._dates[bisect.bisect_right(self._dates, a_date) - (int(nth) + 1)]
 
     def number_trading_days_between(self, begin, end):
         """ Returns the number of trading days between begin and end, exclusive of begin inclusive of end """
         return len(self._dates[self._dates > begin][self._dates <= end])
 
+    def ordinals_after(self, dates):
+        """ Returns the calendar ordinal, the position in this calendar, of the first trading day on or after each of
+        dates """
+        return self._dates.values.searchsorted(DatetimeIndex(dates).values)
+
+    def ordinals_before(self, dates):
+        """ Returns the calendar ordinal, the position in this calendar, of the last trading day on or before each
+        of dates """
+        return self._dates.values.searchsorted(DatetimeIndex(dates).values, side='right') - 1
+
+    def dates_at(self, ordinals):
+        """ Returns the trading dates at calendar ordinals """
+        return self._dates.iloc[ordinals]
+
+    def nth_trading_days(self, frequency, nth):
+        """ Returns the calendar ordinals of the nth trading day of every week, month or quarter in this calendar, in
+        one pass. nth counts from 0 at the start of each calendar period, or back from -1 at its end. Calendar
+        periods with too few trading days are skipped """
+        days = self._dates.values.astype('datetime64[D]').astype(numpy.int64)
+        months = self._dates.values.astype('datetime64[M]').astype(numpy.int64)
+        keys = {
+            #NOTE: day 0 was a thursday, so shifting by three days starts our weeks on mondays
+            "weekly": (days + 3) // 7,
+            "monthly": months,
+            "quarterly": months // 3
+        }[frequency]
+
+        starts = numpy.flatnonzero(numpy.concatenate([[True], keys[1:] != keys[:-1]]))
+        ends = numpy.concatenate([starts[1:], [len(keys)]])
+        if nth >= 0:
+            ordinals = starts + nth
+            return ordinals[ordinals < ends]
+        ordinals = ends + nth
+        return ordinals[ordinals >= starts]
+
+    def dates(self):
+        """ Returns every trading date in this calendar """
+        return DatetimeIndex(self._dates.values)
+
+    def resampled(self, frequency):
+        """ Returns a calendar of bars, the last trading day of every week, month or quarter in this calendar """
+        return FCalendar(self._dates.iloc[self.nth_trading_days(frequency, -1)].reset_index(drop=True))
+
     #TODO: test
     def every_nth_between(self, begin, end, ndays):
         """ Iteration helper that gives every nth trading day between begin and end """
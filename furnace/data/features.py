@@ -0,0 +1,104 @@
+""" Technical features of assets, such as lagged growths, RSI, IBS and moving averages, computed once over an asset's
+    full history and kept in a store. Features are named by specs, tuples of a feature name and its parameters, so
+    ("growth", 25, 5) is the growth over 25 trading days as of 5 trading days ago """
+
+import os
+import numpy
+import pandas
+
+def growth(asset, days, lag=0):
+    """ Growth over days trading days, as of lag trading days ago """
+    return asset.prices().pct_change(days).shift(lag)
+
+def rsi(asset, days=14):
+    """ Relative strength index over days trading days, from simple averages of gains and losses """
+    changes = asset.prices().diff()
+    gains = pandas.rolling_mean(changes.clip(lower=0.0), days)
+    losses = pandas.rolling_mean(-changes.clip(upper=0.0), days)
+    return 100.0 - 100.0 / (1.0 + gains / losses)
+
+def ibs(asset):
+    """ Internal bar strength, where the close fell between the day's low and high. Days that never moved, with a
+    high equal to their low, have no strength and are left missing """
+    low = asset.prices(column="Low")
+    ranges = asset.prices(column="High") - low
+    return (asset.prices(column="Close") - low) / ranges.where(ranges > 0.0)
+
+def percent_above(asset, days, over=1):
+    """ Percent the moving average over over trading days is above the moving average over days. Over defaults to
+    the close itself """
+    closes = asset.prices()
+    return pandas.rolling_mean(closes, over) / pandas.rolling_mean(closes, days) - 1.0
+
+def above(asset, days, over=1):
+    """ One where the moving average over over trading days is above the moving average over days, zero where it
+    isn't. A dummy version of percent_above """
+    percents = percent_above(asset, days, over)
+    return (percents > 0.0).astype(float).where(percents.notnull())
+
+FEATURES = {
+    "growth": growth,
+    "rsi": rsi,
+    "ibs": ibs,
+    "percent_above": percent_above,
+    "above": above
+}
+
+def spec_name(spec):
+    """ A readable name for a feature spec, also used for its file on disk """
+    return "_".join(str(part) for part in spec)
+
+class FeatureStore(object):
+    """ Computes features over assets' full histories once, keeping them in memory and, given a directory, on disk.
+    Features are stored by asset symbol and spec, and recomputed whenever the asset's history no longer lines up
+    with what was stored """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._features = {}
+
+    def feature(self, asset, spec):
+        """ Returns the feature over the asset's full history """
+        key = (asset.symbol(), spec)
+        if key not in self._features or not self._lines_up(self._features[key], asset):
+            self._features[key] = self._load(asset, spec)
+        return self._features[key]
+
+    def features(self, asset, specs):
+        """ Returns a table of features over the asset's full history, one column per spec """
+        return pandas.concat([self.feature(asset, spec) for spec in specs], axis=1,
+                             keys=[spec_name(spec) for spec in specs])
+
+    def features_on(self, asset, specs, dates):
+        """ Returns a (dates x specs) matrix of features """
+        features = [self.feature(asset, spec) for spec in specs]
+        rows = features[0].index.get_indexer(pandas.DatetimeIndex(dates))
+        assert (rows >= 0).all()
+        return numpy.column_stack([feature.values[rows] for feature in features])
+
+    def _load(self, asset, spec):
+        """ Reads the feature from disk if it's there and still lines up, computing and saving it otherwise """
+        path = None
+        if self._directory is not None:
+            path = os.path.join(self._directory, "{0}_{1}.pickle".format(asset.symbol(), spec_name(spec)))
+
+        if path is not None and os.path.exists(path):
+            feature = pandas.read_pickle(path)
+            if self._lines_up(feature, asset):
+                return feature
+
+        feature = FEATURES[spec[0]](asset, *spec[1:]).astype(float)
+        if path is not None:
+            feature.to_pickle(path)
+        return feature
+
+    @staticmethod
+    def _lines_up(feature, asset):
+        """ Predicate on a stored feature covering the same days as the asset's history """
+        return feature.index[0] == asset.begin() and feature.index[-1] == asset.end()
+
+def make_feature_store(directory="data/features"):
+    """ Creates a feature store caching on disk in directory, next to the price data by default """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return FeatureStore(directory)
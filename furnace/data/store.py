@@ -0,0 +1,181 @@
+""" A columnar store for sweep results. Rows are appended in chunks, each column of a chunk written to its own numpy
+file so queries only read, and memory map, the columns they need. Parameter columns, those a sweep varies, are
+indexed by the values each chunk holds so filters skip chunks that can't match. Group by queries aggregate a chunk
+at a time, so million row sweeps are summarized without ever being held in memory whole """
+
+import cPickle
+import os
+import numpy
+import pandas
+
+AGGREGATES = ["count", "sum", "mean", "std", "min", "max"]
+
+class ResultStore(object):
+    """ Sweep results kept in a directory as numbered chunks of column files, along with a catalog of the schema and
+    an index of each chunk's parameter values """
+
+    def __init__(self, directory, parameters=(), chunk_size=100000):
+        self._directory = directory
+        self._chunk_size = chunk_size
+        self._pending = []
+        self._catalog = {"parameters": list(parameters), "columns": None, "chunks": []}
+
+        if os.path.exists(self._catalog_path()):
+            with open(self._catalog_path(), "rb") as catalog:
+                self._catalog = cPickle.load(catalog)
+            assert not parameters or list(parameters) == self._catalog["parameters"]
+
+    def __len__(self):
+        """ Returns the number of rows stored, including those not yet flushed """
+        return sum(chunk["rows"] for chunk in self._catalog["chunks"]) + sum(len(rows) for rows in self._pending)
+
+    def columns(self):
+        """ Returns the names and dtypes of our columns, in order, or None before anything is appended """
+        return self._catalog["columns"]
+
+    def parameters(self):
+        """ Getter for the names of the parameter columns we index """
+        return self._catalog["parameters"]
+
+    def append(self, rows):
+        """ Appends a table of rows. The first rows appended fix our columns and their types. Rows are written out
+        a chunk at a time, and any left over are written by flush or the next query """
+        rows = pandas.DataFrame(rows)
+        assert all(rows[column].values.dtype.kind in "biufM" for column in rows.columns), "columns must be numeric"
+        if self._catalog["columns"] is None:
+            assert set(self._catalog["parameters"]) <= set(rows.columns)
+            self._catalog["columns"] = [(column, rows[column].values.dtype.str) for column in rows.columns]
+        rows = rows[[column for column, _ in self._catalog["columns"]]]
+
+        self._pending.append(rows)
+        if sum(len(pending) for pending in self._pending) >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Writes every row appended since the last flush out to new chunks """
+        if not self._pending:
+            return
+        rows = pandas.concat(self._pending, ignore_index=True)
+        self._pending = []
+        for first in xrange(0, len(rows), self._chunk_size):
+            self._write_chunk(rows.iloc[first:first + self._chunk_size])
+
+        with open(self._catalog_path(), "wb") as catalog:
+            cPickle.dump(self._catalog, catalog, cPickle.HIGHEST_PROTOCOL)
+
+    def chunks(self, columns=None, **filters):
+        """ Iterates over chunks as dictionaries of memory mapped column arrays, restricted to columns and to rows
+        whose parameters equal filters. Filter values may be single values or lists of values. Chunks whose index
+        rules out any filter are never read """
+        self.flush()
+        columns = [column for column, _ in self._catalog["columns"]] if columns is None else list(columns)
+        filters = dict((name, numpy.atleast_1d(values)) for name, values in filters.iteritems())
+        assert set(filters) <= set(self._catalog["parameters"]), "only parameters can be filtered on"
+
+        for chunk in self._catalog["chunks"]:
+            if not all(numpy.in1d(values, chunk["index"][name]).any() for name, values in filters.iteritems()):
+                continue
+
+            arrays = dict((column, self._read(chunk, column)) for column in set(columns) | set(filters))
+            keep = numpy.ones(chunk["rows"], dtype=bool)
+            for name, values in filters.iteritems():
+                keep &= numpy.in1d(arrays[name], values)
+            if keep.all():
+                yield dict((column, arrays[column]) for column in columns)
+            elif keep.any():
+                yield dict((column, arrays[column][keep]) for column in columns)
+
+    def read(self, columns=None, **filters):
+        """ Reads columns of every row matching filters in to a table """
+        chunks = list(self.chunks(columns, **filters))
+        columns = [column for column, _ in self._catalog["columns"]] if columns is None else list(columns)
+        if not chunks:
+            return pandas.DataFrame(columns=columns)
+        return pandas.DataFrame(dict((column, numpy.concatenate([chunk[column] for chunk in chunks]))
+                                     for column in columns), columns=columns)
+
+    def group_by(self, keys, column, **filters):
+        """ Aggregates column over every group of rows sharing keys, one chunk at a time. Returns a table indexed by
+        keys with a count, sum, mean, std, min and max for each group. Nans are left out of every aggregate """
+        keys = [keys] if isinstance(keys, basestring) else list(keys)
+        groups = {}
+        for chunk in self.chunks(keys + [column], **filters):
+            values = numpy.asarray(chunk[column], dtype=float)
+            present = ~numpy.isnan(values)
+            key_arrays = [numpy.asarray(chunk[key])[present] for key in keys]
+            values = values[present]
+            if not len(values):
+                continue
+
+            #NOTE: sorting by keys lines up each group's rows so reduceat can aggregate them in one pass
+            order = numpy.lexsort(key_arrays[::-1])
+            key_arrays = [key_array[order] for key_array in key_arrays]
+            values = values[order]
+            changes = numpy.zeros(len(values), dtype=bool)
+            changes[0] = True
+            for key_array in key_arrays:
+                changes[1:] |= key_array[1:] != key_array[:-1]
+            starts = numpy.flatnonzero(changes)
+
+            #NOTE: squares are summed about each group's mean. Raw sums of squares cancel catastrophically for values
+            #far from zero relative to their spread, like cagrs
+            counts = numpy.diff(numpy.append(starts, len(values)))
+            totals = numpy.add.reduceat(values, starts)
+            deviations = values - numpy.repeat(totals / counts, counts)
+            partials = zip(counts, totals, numpy.add.reduceat(deviations * deviations, starts),
+                           numpy.minimum.reduceat(values, starts),
+                           numpy.maximum.reduceat(values, starts))
+            for group, partial in zip(zip(*[key_array[starts] for key_array in key_arrays]), partials):
+                groups[group] = combine(groups[group], partial) if group in groups else partial
+
+        if not groups:
+            return pandas.DataFrame(columns=AGGREGATES)
+
+        index = sorted(groups)
+        count, total, squares, low, high = numpy.array([groups[group] for group in index], dtype=float).T
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            std = numpy.sqrt(squares / (count - 1))
+
+        if len(keys) == 1:
+            index = pandas.Index([group[0] for group in index], name=keys[0])
+        else:
+            index = pandas.MultiIndex.from_tuples(index, names=keys)
+        return pandas.DataFrame({"count": count, "sum": total, "mean": mean, "std": std, "min": low, "max": high},
+                                index=index, columns=AGGREGATES)
+
+    def _write_chunk(self, rows):
+        """ Writes rows out as a new chunk, indexing its parameter values """
+        name = "chunk_{0:06d}".format(len(self._catalog["chunks"]))
+        os.makedirs(os.path.join(self._directory, name))
+        for column, dtype in self._catalog["columns"]:
+            numpy.save(os.path.join(self._directory, name, column + ".npy"), rows[column].values.astype(dtype))
+        self._catalog["chunks"].append({
+            "name": name,
+            "rows": len(rows),
+            "index": dict((parameter, numpy.unique(rows[parameter].values))
+                          for parameter in self._catalog["parameters"])
+        })
+
+    def _read(self, chunk, column):
+        """ Memory maps a column of chunk """
+        return numpy.load(os.path.join(self._directory, chunk["name"], column + ".npy"), mmap_mode="r")
+
+    def _catalog_path(self):
+        """ Where our catalog is kept """
+        return os.path.join(self._directory, "catalog.pickle")
+
+def combine(partial, other):
+    """ Combines two partial aggregates of count, sum, sum of squared deviations from the mean, min and max. The
+    squared deviations are pooled as in Chan et al's parallel variance """
+    count = partial[0] + other[0]
+    delta = other[1] / other[0] - partial[1] / partial[0]
+    return (count, partial[1] + other[1], partial[2] + other[2] + delta * delta * partial[0] * other[0] / count,
+            min(partial[3], other[3]), max(partial[4], other[4]))
+
+def make_result_store(directory, parameters=(), chunk_size=100000):
+    """ Opens the result store in directory, creating it if need be. Parameters name the columns a sweep varies,
+    which are indexed for filtering """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return ResultStore(directory, parameters, chunk_size)
@@ -0,0 +1,28 @@
+""" Running work across a pool of forked processes """
+
+import multiprocessing
+
+def map_forked(function, items, processes=None):
+    """ Maps function over items, in order, across a pool of processes. None uses a process per cpu and 1, like
+    fewer than two items, maps in this process """
+    if processes == 1 or len(items) < 2:
+        return [function(item) for item in items]
+
+    #NOTE: function is handed to workers as they're forked rather than pickled, so it may be a closure, and whatever
+    #it holds on to, like a universe, is only copied once per worker
+    pool = multiprocessing.Pool(processes, initializer=_start_worker, initargs=(function,))
+    try:
+        return pool.map(_run_in_worker, items)
+    finally:
+        pool.close()
+        pool.join()
+
+_WORKER = {}
+
+def _start_worker(function):
+    """ Keeps function in the worker process """
+    _WORKER["function"] = function
+
+def _run_in_worker(item):
+    """ Runs function on an item in a worker process. At module level so process pools can run it """
+    return _WORKER["function"](item)
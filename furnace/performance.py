@@ -47,18 +47,17 @@ def reindex(table1, table2):
     #returns second arg for convenience
     return table2
 
-def make_overall_performance(portfolio_periods, asset_factory):
-    """ Factory function to create overall performances """
+def dates_from_ordinals(ordinals):
+    """ Converts an array of date ordinals, as kept by trade ledgers, back in to an index of dates """
+    return pandas.DatetimeIndex([datetime.datetime.fromordinal(int(ordinal)) for ordinal in ordinals])
+
+def make_overall_performance(portfolio_periods, asset_factory, ledger):
+    """ Factory function to create overall performances. Periods are expected to already be chain linked, each
+    one reindexed on the one before it, with ledger holding the trades made along the way """
 
-    #group periods into pairs to reindex the latter on the former
     period_pairs = zip(portfolio_periods[:-1], portfolio_periods[1:])
     assert all(period_pair[0].end() == period_pair[1].begin() for period_pair in period_pairs)
-
-    #reindex one by one - must go in ascending order.
-    #periods are reindexed *in place* so that by the time one is reindexed, it's ready to serve
-    #as the reference for the next
-    for period_pair in period_pairs:
-        reindex(period_pair[0]._table, period_pair[1]._table)
+    assert all(period_pair[1].chained_to(period_pair[0]) for period_pair in period_pairs)
 
     overall_period = pandas.concat(period._table for period in portfolio_periods)
     overall_period['date'] = overall_period.index
@@ -73,12 +72,28 @@ def make_overall_performance(portfolio_periods, asset_factory):
     overall_period = overall_period.dropna()
     overall_period["Cumulative Returns"] = ((overall_period["Daily Returns"] + 1.0).cumprod() - 1.0)
 
-    return OverallPerformance(portfolio_periods, asset_factory, overall_period)
+    return OverallPerformance(portfolio_periods, asset_factory, overall_period, ledger)
+
+def link_periods(portfolio_periods, asset_factory):
+    """ Chain links period performances in to an overall performance, reindexing each period in place on the one
+    before it and recording the trades made along the way in a fresh ledger """
+    ledger = TradeLedger()
+    for previous, period in zip([None] + portfolio_periods[:-1], portfolio_periods):
+        #NOTE: periods must be chained in ascending order so each is ready to serve as the reference for the next
+        if previous is not None:
+            period.chain_to(previous)
+        ledger.rebalance(period.begin(), *period.positions_on(period.begin()))
+
+    last_period = portfolio_periods[-1]
+    symbols, _, prices = last_period.positions_on(last_period.end())
+    ledger.liquidate(last_period.end(), symbols, prices)
+
+    return make_overall_performance(portfolio_periods, asset_factory, ledger)
 
 class OverallPerformance(object):
     """ OverallPerformance is how a strategy does over time. """
 
-    def __init__(self, portfolio_periods, asset_factory, table):
+    def __init__(self, portfolio_periods, asset_factory, table, ledger):
         """ Currently expects a dict of dates to portfolios. Period performances are inclusive of end
         dates and exclusive of begin dates. That means altogether, they're inclusive of the entire trading
         period and it's end and exclusive of it's end. We have a single special case to handle that in
@@ -86,6 +101,7 @@ class OverallPerformance(object):
         self._portfolio_periods = portfolio_periods
         self._asset_factory = asset_factory
         self._table = table
+        self._ledger = ledger
 
         self.__invariant()
 
@@ -123,6 +139,11 @@ class OverallPerformance(object):
         self.__invariant()
         return self._table["Daily Returns"].mean()
 
+    def daily_returns(self):
+        """ Returns the daily returns as an array, beginning the day after our first date """
+        self.__invariant()
+        return self._table["Daily Returns"].values
+
     def volatility(self):
         """ Returns the simple daily volatility of price movements, as a percent, of this entire performance period annualized """
         self.__invariant()
@@ -136,6 +157,19 @@ class OverallPerformance(object):
             return 0.0
         return self._table["Cumulative Returns"][date]
 
+    def dates(self):
+        """ Returns every trading date we cover, beginning with our first date """
+        self.__invariant()
+        return pandas.DatetimeIndex([self.begin()]).append(self._table.index)
+
+    def positions_on(self, date):
+        """ Returns the symbols held at the close of date along with their basis and their prices on date """
+        self.__invariant()
+        #NOTE: periods share their boundary dates, and the later period holds what's bought at the close
+        periods = [period for period in self._portfolio_periods if period.begin() <= date]
+        assert periods and date <= self.end()
+        return periods[-1].positions_on(date)
+
     def plot_index(self, index_base):
         """ Plots a day by day performance, with day one pegged at value of index_base, on a matplotlib chart """
         self.__invariant()
@@ -158,43 +192,63 @@ class OverallPerformance(object):
         self.__invariant()
         return self.cagr() / self.volatility()
 
-    def number_of_trades(self):
-        """ Simple turnover metric - an estimate of the number of trades we make """
+    def max_drawdown(self):
+        """ Returns the largest loss, as a percent, from any peak to any later trough """
         self.__invariant()
-        trades = self.__trade_table()
+        return drawdowns(self.daily_returns()).max()
 
-        return len(trades) * len(trades.columns)
+    def drawdown_duration(self):
+        """ Returns the longest time, in trading days, spent below a previous peak """
+        self.__invariant()
+        return longest_drawdown(self.daily_returns())
 
-    #TODO: hand test this on a yearly rebalance of spy and lqd as see in
-    #test/test_performance.py:test_number_of_trades_yearly. Can depend on the basis calculations
-    #of the first period, but then check that the returns of such basis changes are correct by hand
-    #using my own adjusted close
-    def __trade_table(self):
-        """ Constructs a table of what trades would be made and when to recreate the index performance """
+    def rolling_volatility(self, window):
+        """ Returns annualized volatility over the trailing window of trading days, by day """
         self.__invariant()
+        return pandas.Series(rolling_volatilities(self.daily_returns(), window), index=self._table.index)
 
-        basis = self._table.filter(regex=".*_Basis")
+    def rolling_sharpe(self, window):
+        """ Returns the simplified sharpe ratio over the trailing window of trading days, by day """
+        self.__invariant()
+        returns = self.daily_returns()
+        return pandas.Series(rolling_cagrs(returns, window) / rolling_volatilities(returns, window),
+                             index=self._table.index)
 
-        #Only NA to be filled is the first day, which we fill with the first day's basis since the
-        #'day before', not represented in the series, would have had a 0 basis.
-        deltas = basis.diff().fillna(basis)
+    def number_of_trades(self):
+        """ Simple turnover metric - an estimate of the number of trades we make """
+        self.__invariant()
+        return len(self._ledger)
 
+    def trade_ledger(self):
+        """ Getter for the ledger of trades made to recreate the index performance """
+        self.__invariant()
+        return self._ledger
 
-        #remove sufficiently close to zero deltas to account for floating point error
-        deltas = deltas[pandas.DataFrame(-numpy.isclose(deltas, 0.0)).any(axis=1).values].dropna()
+    def turnover(self):
+        """ Annualized one way turnover - the fraction of the portfolio sold on rebalances each year. The opening
+        purchase and the closing sale are not counted """
+        self.__invariant()
+
+        ordinals, notionals = self._ledger.notional_by_day()
+        dates = dates_from_ordinals(ordinals[1:-1])
+        traded = notionals[1:-1] / self._table["index"].reindex(dates).values
 
-        #Add on the last day as a negative, since we will be 'selling' our entire basis that day
-        return deltas.append(-basis.ix[-1])
+        #NOTE: every sale is matched by a purchase, so half of all notional traded is our one way turnover
+        return traded.sum() / 2.0 / (self.duration().days / furnace.data.fcalendar.trading_days_in_year())
 
     def growth_curve(self, principle, comissions):
         """ Simulates the actual performance of a certain amount of cash, charging comissions """
 
-        trades = self.__trade_table()
-        trades['Comissions'] = comissions
+        ordinals, trades = self._ledger.trades_by_day()
+        dates = dates_from_ordinals(ordinals)
+
+        #NOTE: our opening trades fall on the first day, which has no return of its own and so isn't in our
+        #table. searching sorted charges them alongside the first return we do have.
+        charged_comissions = numpy.zeros(len(self._table))
+        numpy.add.at(charged_comissions, self._table.index.values.searchsorted(dates.values), trades * comissions)
+
         table = self._table[['Daily Returns']] + 1.0
-        table['Comissions'] = trades['Comissions']
-        table['Comissions'].fillna(0.0, inplace=True)
-        number_assets = len(self._table.filter(regex=".*_Basis").columns)
+        table['Comissions'] = charged_comissions
 
         def principle_accumulator(principle):
             """ Wrapper that returns a stateful apply that calculates principle growth """
@@ -203,8 +257,7 @@ class OverallPerformance(object):
             def _(row):
                 """ Inner helper function to provide a stateful apply that calculates principle growth """
 
-                total_comissions = row["Comissions"] * number_assets
-                nonlocal["principle"] = nonlocal["principle"] * row["Daily Returns"] - total_comissions
+                nonlocal["principle"] = nonlocal["principle"] * row["Daily Returns"] - row["Comissions"]
                 return nonlocal["principle"]
             return _
 
@@ -212,6 +265,533 @@ class OverallPerformance(object):
 
         return table.apply(accumulator, axis=1)
 
+    def compact(self):
+        """ Returns a compact, array backed copy of this performance that doesn't hold on to any tables """
+        self.__invariant()
+
+        dates = pandas.DatetimeIndex([self.begin()]).append(self._table.index)
+        symbols = self._portfolio_periods[0].positions_on(self.begin())[0]
+
+        weights = []
+        for period in self._portfolio_periods:
+            period_symbols, basis, prices = period.positions_on(period.begin())
+            assert period_symbols == symbols
+            weights.append(basis * prices / (basis * prices).sum())
+
+        return CompactPerformance(self._table["Daily Returns"].values.astype(numpy.float64),
+                                  self.begin().toordinal(),
+                                  dates.values.searchsorted(pandas.DatetimeIndex(
+                                      [period.begin() for period in self._portfolio_periods]).values),
+                                  numpy.array(weights),
+                                  tuple(symbols),
+                                  self._asset_factory,
+                                  self._ledger.consolidated())
+
+class CompactPerformance(object):
+    """ A memory light stand in for an overall performance, meant for sweeps that hold on to many results. Only
+    daily returns, the weight of each asset at every rebalance and the ordinal of our first date are kept. Per
+    asset detail is rebuilt from the asset universe on demand """
+
+    __slots__ = ("_daily_returns", "_base", "_rebalances", "_weights", "_symbols", "_universe", "_ledger")
+
+    def __init__(self, daily_returns, base, rebalances, weights, symbols, universe, ledger):
+        """ Rebalances are offsets in trading days from base at which we moved to each row of weights. Weight
+        columns line up with symbols """
+        assert len(rebalances) == len(weights)
+        assert rebalances[0] == 0
+        self._daily_returns = daily_returns
+        self._base = base
+        self._rebalances = rebalances
+        self._weights = weights
+        self._symbols = symbols
+        self._universe = universe
+        self._ledger = ledger
+
+    def daily_returns(self):
+        """ Getter for the daily returns, which begin the day after our first date """
+        return self._daily_returns
+
+    def total_return(self):
+        """ Returns the total return from begining to end """
+        return (1.0 + self._daily_returns).prod() - 1.0
+
+    def duration(self):
+        """ Returns the length of this performance period in trading days"""
+        return datetime.timedelta(len(self._daily_returns))
+
+    def cagr(self):
+        """ Returns the compound annual growth rate """
+        return furnace.data.asset.annualized(self.total_return(), len(self._daily_returns))
+
+    def expected_return(self):
+        """ Returns the expected daily return """
+        return self._daily_returns.mean()
+
+    def volatility(self):
+        """ Returns the simple daily volatility of price movements, as a percent, of this entire performance period annualized """
+        return numpy.sqrt(furnace.data.fcalendar.trading_days_in_year()*self._daily_returns.var(ddof=1))
+
+    def simple_sharpe(self):
+        """ Returns a simplified sharpe ratio - cagr over volatility. """
+        return self.cagr() / self.volatility()
+
+    def max_drawdown(self):
+        """ Returns the largest loss, as a percent, from any peak to any later trough """
+        return drawdowns(self._daily_returns).max()
+
+    def drawdown_duration(self):
+        """ Returns the longest time, in trading days, spent below a previous peak """
+        return longest_drawdown(self._daily_returns)
+
+    def rolling_volatility(self, window):
+        """ Returns annualized volatility over the trailing window of trading days, by day """
+        return pandas.Series(rolling_volatilities(self._daily_returns, window), index=self.dates()[1:])
+
+    def rolling_sharpe(self, window):
+        """ Returns the simplified sharpe ratio over the trailing window of trading days, by day """
+        return pandas.Series(rolling_cagrs(self._daily_returns, window) /
+                             rolling_volatilities(self._daily_returns, window),
+                             index=self.dates()[1:])
+
+    def growth_by(self, date):
+        """ Returns growth by a date as a percent on beginning date of this performance """
+        offset = self.dates().get_loc(date)
+        return (1.0 + self._daily_returns[:offset]).prod() - 1.0
+
+    def begin(self):
+        """ Returns beginning date of this performance period """
+        return datetime.datetime.fromordinal(self._base)
+
+    def end(self):
+        """ Returns ending date of this performance period """
+        return self.dates()[-1]
+
+    def number_of_trades(self):
+        """ Simple turnover metric - an estimate of the number of trades we make """
+        return len(self._ledger)
+
+    def trade_ledger(self):
+        """ Getter for the ledger of trades made to recreate the index performance """
+        return self._ledger
+
+    def turnover(self):
+        """ Annualized one way turnover - the fraction of the portfolio sold on rebalances each year. The opening
+        purchase and the closing sale are not counted """
+        ordinals, notionals = self._ledger.notional_by_day()
+        offsets = self.dates().values.searchsorted(dates_from_ordinals(ordinals[1:-1]).values)
+        traded = notionals[1:-1] / self._index()[offsets]
+
+        return traded.sum() / 2.0 / (len(self._daily_returns) / furnace.data.fcalendar.trading_days_in_year())
+
+    def dates(self):
+        """ Returns every trading date we cover, beginning with our first date """
+        return self._prices().index
+
+    def details(self):
+        """ Rebuilds the per asset price, basis and index columns along with the portfolio index and returns. The
+        table matches the one kept by a full overall performance """
+        prices = self._prices()
+        index = self._index()
+
+        #NOTE: basis is set on each rebalance and held until the next one
+        periods = numpy.searchsorted(self._rebalances, numpy.arange(len(index)), side='right') - 1
+        basis = (self._weights * index[self._rebalances][:, numpy.newaxis] /
+                 prices.values[self._rebalances])[periods]
+
+        table = pandas.DataFrame(index=prices.index)
+        for column, symbol in enumerate(self._symbols):
+            table[symbol + "_AdjustedPrice"] = prices[symbol]
+            table[symbol + "_Basis"] = basis[:, column]
+            table[symbol + "_Index"] = table[symbol + "_AdjustedPrice"] * table[symbol + "_Basis"]
+        table["index"] = table.filter(regex=".*_Index").sum(axis=1)
+        table["date"] = table.index
+        table = table.ix[1:]
+        table["Daily Returns"] = self._daily_returns
+        table["Cumulative Returns"] = index[1:] - 1.0
+        return table
+
+    def _index(self):
+        """ The portfolio index, pegged at 1.0 on our first date """
+        return numpy.concatenate([[1.0], (1.0 + self._daily_returns).cumprod()])
+
+    def _prices(self):
+        """ Aligned adjusted prices of every asset we hold, one row per trading date we cover """
+        prices = pandas.concat([
+            self._universe[symbol].prices(self.begin()).iloc[:len(self._daily_returns) + 1]
+            for symbol in self._symbols
+        ], axis=1)
+        prices.columns = self._symbols
+        return prices
+
+#NOTE: the risk metrics below are all single passes over daily returns - running maximums and cumulative sums -
+#rather than aggregations repeated over every window. the trackers further down give the same metrics day by day
+def drawdowns(daily_returns):
+    """ Returns the drawdown, as a percent below the running peak, after every day of returns. Works along the last
+    axis, so a (strategies x days) array gives drawdowns for every strategy """
+    growth = numpy.cumprod(1.0 + numpy.asarray(daily_returns), axis=-1)
+    return 1.0 - growth / numpy.maximum(numpy.maximum.accumulate(growth, axis=-1), 1.0)
+
+def longest_drawdown(daily_returns):
+    """ Returns the most trading days in a row spent below a previous peak """
+    days = numpy.arange(1, len(daily_returns) + 1)
+    last_peaks = numpy.maximum.accumulate(numpy.where(drawdowns(daily_returns) > 0.0, 0, days))
+    return int((days - last_peaks).max()) if len(days) else 0
+
+def rolling_cagrs(daily_returns, window):
+    """ Returns the annualized growth over the trailing window of days after every day. Days before a full window
+    are nan """
+    log_growth = numpy.concatenate([[0.0], numpy.log1p(daily_returns).cumsum()])
+    cagrs = numpy.expm1((log_growth[window:] - log_growth[:-window]) *
+                        furnace.data.fcalendar.trading_days_in_year() / window)
+    return numpy.concatenate([numpy.repeat(numpy.nan, window - 1), cagrs])
+
+def rolling_volatilities(daily_returns, window):
+    """ Returns the annualized volatility over the trailing window of days after every day. Days before a full
+    window are nan """
+    assert window > 1
+    sums = numpy.concatenate([[0.0], numpy.cumsum(daily_returns)])
+    squares = numpy.concatenate([[0.0], numpy.cumsum(numpy.square(daily_returns))])
+    window_sums = sums[window:] - sums[:-window]
+    variances = (squares[window:] - squares[:-window] - window_sums ** 2 / window) / (window - 1)
+
+    #NOTE: differencing cumulative sums can leave tiny negative variances on flat windows
+    volatilities = numpy.sqrt(furnace.data.fcalendar.trading_days_in_year() * numpy.maximum(variances, 0.0))
+    return numpy.concatenate([numpy.repeat(numpy.nan, window - 1), volatilities])
+
+class DrawdownTracker(object):
+    """ Tracks drawdowns one day of returns at a time, for when returns arrive as they happen """
+
+    def __init__(self):
+        self._growth = 1.0
+        self._peak = 1.0
+        self._max_drawdown = 0.0
+        self._duration = 0
+        self._longest_duration = 0
+
+    def update(self, daily_return):
+        """ Takes in the next day's return and returns the drawdown after it """
+        self._growth *= 1.0 + daily_return
+        if self._growth >= self._peak:
+            self._peak = self._growth
+            self._duration = 0
+        else:
+            self._duration += 1
+
+        self._longest_duration = max(self._longest_duration, self._duration)
+        self._max_drawdown = max(self._max_drawdown, self.drawdown())
+        return self.drawdown()
+
+    def drawdown(self):
+        """ Returns the current drawdown as a percent below our peak """
+        return 1.0 - self._growth / self._peak
+
+    def max_drawdown(self):
+        """ Returns the largest drawdown seen so far """
+        return self._max_drawdown
+
+    def duration(self):
+        """ Returns the number of trading days we've currently spent below our peak """
+        return self._duration
+
+    def longest_duration(self):
+        """ Returns the most trading days in a row we've spent below a peak so far """
+        return self._longest_duration
+
+class RollingRisk(object):
+    """ Tracks growth and volatility over a trailing window one day of returns at a time. Keeps running sums over a
+    ring of the last window returns, so each update is constant time """
+
+    def __init__(self, window):
+        assert window > 1
+        self._window = window
+        self._returns = numpy.zeros(window)
+        self._count = 0
+        self._sum = 0.0
+        self._square_sum = 0.0
+        self._log_growth = 0.0
+
+    def update(self, daily_return):
+        """ Takes in the next day's return, dropping the oldest one once our window is full """
+        slot = self._count % self._window
+        if self._count >= self._window:
+            oldest = self._returns[slot]
+            self._sum -= oldest
+            self._square_sum -= oldest ** 2
+            self._log_growth -= numpy.log1p(oldest)
+
+        self._returns[slot] = daily_return
+        self._sum += daily_return
+        self._square_sum += daily_return ** 2
+        self._log_growth += numpy.log1p(daily_return)
+        self._count += 1
+
+    def full(self):
+        """ Returns true once a full window of returns has been seen """
+        return self._count >= self._window
+
+    def cagr(self):
+        """ Returns the annualized growth over our window, or nan before the window is full """
+        if not self.full():
+            return numpy.nan
+        return numpy.expm1(self._log_growth * furnace.data.fcalendar.trading_days_in_year() / self._window)
+
+    def volatility(self):
+        """ Returns the annualized volatility over our window, or nan before the window is full """
+        if not self.full():
+            return numpy.nan
+        variance = (self._square_sum - self._sum ** 2 / self._window) / (self._window - 1)
+        return numpy.sqrt(furnace.data.fcalendar.trading_days_in_year() * max(variance, 0.0))
+
+    def simple_sharpe(self):
+        """ Returns the simplified sharpe ratio over our window """
+        return self.cagr() / self.volatility()
+
+def batch_metrics(performances, days_in_year=None):
+    """ Computes metrics for many performances in one pass over a (strategies x days) array. Takes either a list of
+    performances, which may differ in length, or a matrix of daily returns with one row per strategy. Returns a
+    table with a row of cagr, volatility, simple sharpe, max drawdown, turnover and number of trades per strategy.
+    Turnover and number of trades are only known when given performances. Returns over bars longer than a day, such
+    as weeks, are annualized with days_in_year set to the number of bars in a year """
+
+    if isinstance(performances, numpy.ndarray):
+        returns = numpy.atleast_2d(performances).astype(numpy.float64)
+        lengths = numpy.repeat(returns.shape[1], len(returns))
+        turnovers = numpy.repeat(numpy.nan, len(returns))
+        trades = numpy.repeat(numpy.nan, len(returns))
+    else:
+        lengths = numpy.array([len(performance_.daily_returns()) for performance_ in performances])
+        turnovers = numpy.array([performance_.turnover() for performance_ in performances])
+        trades = numpy.array([performance_.number_of_trades() for performance_ in performances], dtype=float)
+
+        #NOTE: shorter performances are padded with zero returns, which leave growth and drawdowns untouched.
+        #volatility is kept honest by masking them out below
+        returns = numpy.zeros((len(performances), lengths.max()))
+        for row, performance_ in enumerate(performances):
+            returns[row, :lengths[row]] = performance_.daily_returns()
+
+    if days_in_year is None:
+        days_in_year = furnace.data.fcalendar.trading_days_in_year()
+    in_performance = numpy.arange(returns.shape[1]) < lengths[:, numpy.newaxis]
+
+    cagr = numpy.expm1(numpy.log1p(returns).sum(axis=1) * days_in_year / lengths)
+
+    deviations = numpy.where(in_performance, returns - (returns.sum(axis=1) / lengths)[:, numpy.newaxis], 0.0)
+    volatility = numpy.sqrt(days_in_year * (deviations ** 2).sum(axis=1) / (lengths - 1))
+
+    max_drawdown = drawdowns(returns).max(axis=1)
+
+    return pandas.DataFrame({
+        "cagr": cagr,
+        "volatility": volatility,
+        "simple_sharpe": cagr / volatility,
+        "max_drawdown": max_drawdown,
+        "turnover": turnovers,
+        "number_of_trades": trades
+    }, columns=["cagr", "volatility", "simple_sharpe", "max_drawdown", "turnover", "number_of_trades"])
+
+def window_metrics(performance_, firsts, lasts):
+    """ Computes metrics over many windows of one performance, each from trading day firsts to lasts counted from its
+    first date, as if each window were a performance of its own. Growth and volatility come from differences of
+    running sums over daily returns, so each window costs the same however long. Returns a table with a row of cagr,
+    volatility, simple sharpe, max drawdown and number of trades per window. Trades are an opening purchase of
+    everything held, those made strictly between first and last, and a closing sale of everything held """
+    firsts = numpy.asarray(firsts)
+    lasts = numpy.asarray(lasts)
+    assert (lasts - firsts > 1).all()
+    returns = performance_.daily_returns()
+    days = lasts - firsts
+    days_in_year = furnace.data.fcalendar.trading_days_in_year()
+
+    log_growth = numpy.concatenate([[0.0], numpy.log1p(returns).cumsum()])
+    sums = numpy.concatenate([[0.0], returns.cumsum()])
+    squares = numpy.concatenate([[0.0], (returns * returns).cumsum()])
+
+    cagr = numpy.expm1((log_growth[lasts] - log_growth[firsts]) * days_in_year / days)
+    window_sums = sums[lasts] - sums[firsts]
+    variance = (squares[lasts] - squares[firsts] - window_sums * window_sums / days) / (days - 1)
+    volatility = numpy.sqrt(days_in_year * numpy.maximum(variance, 0.0))
+
+    #NOTE: drawdowns aren't sums, so windows are gathered in to one (windows x days) array, padded with zero returns
+    padded = numpy.concatenate([returns, numpy.zeros(days.max())])
+    gathered = padded[firsts[:, numpy.newaxis] + numpy.arange(days.max())]
+    gathered[numpy.arange(days.max()) >= days[:, numpy.newaxis]] = 0.0
+
+    #NOTE: a window's opening purchase and closing sale are its own, as the performance may not have traded at all
+    #on those dates. Only the trades strictly between them are taken from its ledger
+    dates = performance_.dates().values
+    ordinals, counts = performance_.trade_ledger().trades_by_day()
+    trade_days = numpy.concatenate([[0], numpy.cumsum(counts)])
+    traded = dates_from_ordinals(ordinals).values
+    held = len(performance_.trade_ledger().symbols())
+    between = (trade_days[traded.searchsorted(dates[lasts])] -
+               trade_days[traded.searchsorted(dates[firsts], side="right")])
+
+    return pandas.DataFrame({
+        "cagr": cagr,
+        "volatility": volatility,
+        "simple_sharpe": cagr / volatility,
+        "max_drawdown": drawdowns(gathered).max(axis=1),
+        "number_of_trades": between + 2 * held
+    }, columns=["cagr", "volatility", "simple_sharpe", "max_drawdown", "number_of_trades"])
+
+def make_live_performance(performance_, window=25):
+    """ Carries a backtested overall performance on in to live trading. History is replayed once here so that every
+    day after only costs the live performance work in the number of assets held """
+
+    symbols, basis, prices = performance_.positions_on(performance_.end())
+    live = LivePerformance(performance_.begin(), symbols, basis, prices, performance_.trade_ledger().reopened(), window)
+    live.replay(performance_.dates()[1:], performance_.daily_returns())
+
+    assert numpy.isclose(live.total_return(), performance_.total_return())
+    return live
+
+def open_live_performance(date, weights, prices, window=25):
+    """ Starts a fresh live performance by buying in to weights, a dictionary of symbols to weights, at prices on
+    date. Prices are a dictionary of symbols to adjusted prices """
+    symbols = sorted(weights.keys())
+    prices = numpy.array([prices[symbol] for symbol in symbols])
+    basis = numpy.array([weights[symbol] for symbol in symbols]) / prices
+
+    ledger = TradeLedger()
+    ledger.rebalance(date, symbols, basis, prices)
+    return LivePerformance(date, symbols, basis, prices, ledger, window)
+
+class LivePerformance(object):
+    """ A performance that grows one trading day at a time, for tracking a strategy as it trades. Appending a day or
+    rebalancing only touches our current holdings and running metrics, never our history, so each costs work in the
+    number of assets held. The index is pegged at 1.0 on our first date, as in backtests """
+
+    def __init__(self, begin_date, symbols, basis, prices, ledger, window):
+        self._begin = begin_date.toordinal()
+        self._symbols = list(symbols)
+        self._basis = numpy.asarray(basis, dtype=float)
+        self._prices = numpy.asarray(prices, dtype=float)
+        self._value = numpy.dot(self._basis, self._prices)
+        self._ledger = ledger
+
+        self._daily_returns = numpy.zeros(252)
+        self._ordinals = numpy.zeros(252, dtype=int)
+        self._count = 0
+        self._sum = 0.0
+        self._square_sum = 0.0
+        self._log_growth = 0.0
+        self._drawdowns = DrawdownTracker()
+        self._rolling = RollingRisk(window)
+
+    def append_day(self, date, prices):
+        """ Marks our holdings to prices, a dictionary of symbols to adjusted prices, at the close of date. Returns
+        the day's return """
+        assert date.toordinal() > (self._ordinals[self._count - 1] if self._count else self._begin)
+
+        self._prices = numpy.array([prices[symbol] for symbol in self._symbols])
+        value = numpy.dot(self._basis, self._prices)
+        daily_return = value / self._value - 1.0
+        self._value = value
+
+        self._track(date, daily_return)
+        return daily_return
+
+    def rebalance(self, date, weights):
+        """ Opens a new rebalance period at the close of date, our latest day, moving to weights - a dictionary of
+        symbols to weights """
+        assert date.toordinal() == (self._ordinals[self._count - 1] if self._count else self._begin)
+        assert set(weights.keys()) == set(self._symbols)
+
+        targets = numpy.array([weights[symbol] for symbol in self._symbols])
+        self._basis = targets * self._value / self._prices
+        self._ledger.rebalance(date, self._symbols, self._basis, self._prices)
+
+    def total_return(self):
+        """ Returns the total return from begining to now """
+        return numpy.expm1(self._log_growth)
+
+    def duration(self):
+        """ Returns the length of this performance period in trading days"""
+        return datetime.timedelta(self._count)
+
+    def cagr(self):
+        """ Returns the compound annual growth rate. Undefined, so nan, until we have a day of returns """
+        if self._count == 0:
+            return numpy.nan
+        return numpy.expm1(self._log_growth * furnace.data.fcalendar.trading_days_in_year() / self._count)
+
+    def expected_return(self):
+        """ Returns the expected daily return. Undefined, so nan, until we have a day of returns """
+        if self._count == 0:
+            return numpy.nan
+        return self._sum / self._count
+
+    def volatility(self):
+        """ Returns the simple daily volatility of price movements, as a percent, annualized. Undefined, so nan,
+        until we have two days of returns """
+        if self._count < 2:
+            return numpy.nan
+        variance = (self._square_sum - self._sum ** 2 / self._count) / (self._count - 1)
+        return numpy.sqrt(furnace.data.fcalendar.trading_days_in_year() * variance)
+
+    def simple_sharpe(self):
+        """ Returns a simplified sharpe ratio - cagr over volatility. """
+        return self.cagr() / self.volatility()
+
+    def max_drawdown(self):
+        """ Returns the largest loss, as a percent, from any peak to any later trough """
+        return self._drawdowns.max_drawdown()
+
+    def drawdown_duration(self):
+        """ Returns the longest time, in trading days, spent below a previous peak """
+        return self._drawdowns.longest_duration()
+
+    def rolling_volatility(self):
+        """ Returns annualized volatility over our trailing window """
+        return self._rolling.volatility()
+
+    def rolling_sharpe(self):
+        """ Returns the simplified sharpe ratio over our trailing window """
+        return self._rolling.simple_sharpe()
+
+    def number_of_trades(self):
+        """ Simple turnover metric - an estimate of the number of trades we make. As with backtests, we count
+        selling out of every asset we hold at the end """
+        return len(self._ledger) + len(self._symbols)
+
+    def trade_ledger(self):
+        """ Getter for the ledger of trades made so far """
+        return self._ledger
+
+    def daily_returns(self):
+        """ Returns the daily returns so far, beginning the day after our first date """
+        return self._daily_returns[:self._count]
+
+    def begin(self):
+        """ Returns beginning date of this performance period """
+        return datetime.datetime.fromordinal(self._begin)
+
+    def end(self):
+        """ Returns our latest date """
+        return datetime.datetime.fromordinal(int(self._ordinals[self._count - 1])) if self._count else self.begin()
+
+    def replay(self, dates, daily_returns):
+        """ Records days already traded, such as a backtest's, without marking our holdings to them """
+        for date, daily_return in zip(dates, daily_returns):
+            self._track(date, daily_return)
+
+    def _track(self, date, daily_return):
+        """ Records a day's return and brings running metrics up to date """
+        if self._count == len(self._daily_returns):
+            #NOTE: capacity doubles so appending stays constant time on average
+            self._daily_returns = numpy.concatenate([self._daily_returns, numpy.zeros(self._count)])
+            self._ordinals = numpy.concatenate([self._ordinals, numpy.zeros(self._count, dtype=int)])
+
+        self._daily_returns[self._count] = daily_return
+        self._ordinals[self._count] = date.toordinal()
+        self._count += 1
+
+        self._sum += daily_return
+        self._square_sum += daily_return ** 2
+        self._log_growth += numpy.log1p(daily_return)
+        self._drawdowns.update(daily_return)
+        self._rolling.update(daily_return)
+
 #TODO: unit test
 #TODO: many performance tests could be simplified if i had manually created fake performance 
 #data to calculate metrics from
@@ -278,3 +858,151 @@ class PeriodPerformance(object):
     def overlaps_with(self, other):
         """ Returns true if this period overlaps with other period """
         return self.end() > other.begin() if self.begin() < other.begin() else other.end() > self.begin()
+
+    def copy(self):
+        """ Returns a copy of this period that can be chained without touching this one """
+        return PeriodPerformance(self._begin_date, self._end_date, self._table.copy())
+
+    def chain_to(self, previous):
+        """ Reindexes this period in place such that it begins where previous period ended """
+        reindex(previous._table, self._table) #pylint: disable=W0212
+
+    def chained_to(self, previous):
+        """ Returns true if this period begins at the index value previous period ended at """
+        return numpy.isclose(previous._table.ix[-1]['index'], self._table.ix[0]['index']) #pylint: disable=W0212
+
+    def positions_on(self, date):
+        """ Returns the symbols held during this period along with their basis and their prices on date. Basis
+        is constant throughout a period """
+        basis = self._table.filter(regex=".*_Basis").ix[date]
+        symbols = [column[:-len("_Basis")] for column in basis.index]
+        prices = self._table[[symbol + "_AdjustedPrice" for symbol in symbols]].ix[date]
+        return symbols, basis.values, prices.values
+
+class TradeLedger(object):
+    """ A compact record of the trades made to follow a strategy, recorded as it rebalances. Each trade is
+    stored as a date ordinal, an asset id, a change in basis and the notional value of that change in index
+    terms. Trades are kept as arrays, one chunk per rebalance, to keep recording cheap """
+
+    def __init__(self):
+        self._symbols = []
+        self._asset_ids = {}
+        self._holdings = numpy.zeros(0)
+        self._chunks = []
+
+    def __len__(self):
+        """ Returns the number of trades recorded """
+        return sum(len(chunk[1]) for chunk in self._chunks)
+
+    def rebalance(self, date, symbols, basis, prices):
+        """ Records the trades needed to move our holdings of symbols to basis at prices on date. Nothing is
+        recorded if we already hold basis """
+        asset_ids = numpy.array([self._asset_id(symbol) for symbol in symbols])
+        deltas = numpy.asarray(basis, dtype=float) - self._holdings[asset_ids]
+
+        #NOTE: chain linking leaves behind floating point error on assets whose basis didn't actually change
+        if numpy.isclose(deltas, 0.0).all():
+            return
+
+        #NOTE: we count a trade for every asset held on a rebalance, even those whose basis barely moves
+        self._holdings[asset_ids] = basis
+        self._record(date, asset_ids, deltas, deltas * prices)
+
+    def rebalance_many(self, dates, symbols, bases, prices):
+        """ Records the trades needed to move our holdings of symbols to each row of bases at the same row of prices,
+        on each of dates in order, as rebalancing on every date would but in one chunk """
+        asset_ids = numpy.array([self._asset_id(symbol) for symbol in symbols])
+        bases = numpy.asarray(bases, dtype=float)
+        deltas = numpy.diff(numpy.vstack([self._holdings[asset_ids], bases]), axis=0)
+
+        #NOTE: rebalances that leave holdings where they were are skipped as they are one at a time, though each is
+        #compared with the rebalance before it rather than the last one recorded, which isclose can't tell apart
+        traded = ~numpy.isclose(deltas, 0.0).all(axis=1)
+        if not traded.any():
+            return
+
+        self._holdings[asset_ids] = bases[traded][-1]
+        ordinals = numpy.repeat([date.toordinal() for date in pandas.DatetimeIndex(dates)[traded]], len(asset_ids))
+        self._chunks.append((ordinals, numpy.tile(asset_ids, traded.sum()), deltas[traded].ravel(),
+                             (deltas * prices)[traded].ravel()))
+
+    def liquidate(self, date, symbols, prices):
+        """ Records selling off all of our holdings of symbols at prices on date """
+        asset_ids = numpy.array([self._asset_id(symbol) for symbol in symbols])
+        deltas = -self._holdings[asset_ids]
+
+        self._holdings[asset_ids] = 0.0
+        self._record(date, asset_ids, deltas, deltas * prices)
+
+    def consolidated(self):
+        """ Returns a copy of this ledger with every recorded chunk merged in to one, which keeps long lived ledgers
+        light. This ledger is left as it was """
+        ledger = TradeLedger()
+        for symbol in self._symbols:
+            ledger._asset_id(symbol) #pylint: disable=W0212
+        if self._chunks:
+            ledger._chunks = [tuple(self._column(column) for column in range(4))] #pylint: disable=W0212
+        ledger._holdings = self._holdings.copy() #pylint: disable=W0212
+        return ledger
+
+    def reopened(self):
+        """ Returns a copy of this ledger with its closing sale taken back out, ready to carry on trading from where
+        it ended """
+        ordinals, asset_ids, deltas = self.ordinals(), self.asset_ids(), self.basis_deltas()
+        kept = ordinals < ordinals[-1]
+
+        ledger = TradeLedger()
+        for symbol in self._symbols:
+            ledger._asset_id(symbol) #pylint: disable=W0212
+        ledger._chunks = [tuple(self._column(column)[kept] for column in range(4))] #pylint: disable=W0212
+        ledger._holdings = numpy.bincount(asset_ids[kept].astype(int), weights=deltas[kept], #pylint: disable=W0212
+                                          minlength=len(self._symbols))
+        return ledger
+
+    def symbols(self):
+        """ Returns the symbols traded, indexable by asset id """
+        return list(self._symbols)
+
+    def ordinals(self):
+        """ Returns the date ordinal of each trade """
+        return self._column(0)
+
+    def asset_ids(self):
+        """ Returns the asset id of each trade """
+        return self._column(1)
+
+    def basis_deltas(self):
+        """ Returns the change in basis of each trade """
+        return self._column(2)
+
+    def notionals(self):
+        """ Returns the notional value of each trade in index terms. Purchases are positive, sales negative """
+        return self._column(3)
+
+    def trades_by_day(self):
+        """ Returns the date ordinals on which we traded along with the number of trades made on each """
+        return numpy.unique(self.ordinals(), return_counts=True)
+
+    def notional_by_day(self):
+        """ Returns the date ordinals on which we traded along with the absolute notional value traded on each """
+        ordinals, positions = numpy.unique(self.ordinals(), return_inverse=True)
+        return ordinals, numpy.bincount(positions, weights=numpy.abs(self.notionals()))
+
+    def _asset_id(self, symbol):
+        """ Looks up, or assigns, the asset id of symbol """
+        if symbol not in self._asset_ids:
+            self._asset_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            self._holdings = numpy.append(self._holdings, 0.0)
+        return self._asset_ids[symbol]
+
+    def _record(self, date, asset_ids, deltas, notionals):
+        """ Appends a chunk of trades all made on date """
+        ordinals = numpy.repeat(date.toordinal(), len(asset_ids))
+        self._chunks.append((ordinals, asset_ids, deltas, numpy.asarray(notionals, dtype=float)))
+
+    def _column(self, column):
+        """ Concatenates one column of every recorded chunk """
+        if not self._chunks:
+            return numpy.zeros(0)
+        return numpy.concatenate([chunk[column] for chunk in self._chunks])
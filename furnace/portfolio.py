@@ -19,6 +19,11 @@ class PortfolioOptimizer(object):
         """ Forecasts need to be able to back point to their asset class and thus implicitly define
         the asset universe """
         pass
+
+    def optimize_many(self, panel, asset_factory):
+        """ Optimizes on every date of a forecast panel, returning one Weightings per date. Optimizers that can work
+        on the whole panel at once override this """
+        return [self.optimize(panel.on(date, asset_factory), asset_factory) for date in panel.dates()]
 #pylint: enable=R0903
 
 # pylint: disable=R0903
@@ -33,6 +38,10 @@ class SingleAsset(PortfolioOptimizer):
 #        assert asset_factory.cardinality() == 1
 #        asset = [symbol for symbol in asset_factory.symbols()][0]
         return Weightings([Weighting(self._asset, 1.0)])
+
+    def optimize_many(self, panel, asset_factory):
+        """ We hold 100% of one asset on every date """
+        return [self.optimize(None, asset_factory)] * len(panel.dates())
 #pylint: enable=R0903
 
 # pylint: disable=R0903
@@ -45,6 +54,10 @@ class StaticTarget(PortfolioOptimizer):
     def optimize(self, _, asset_factory):
         """ We flat out ignore the forecaster argument """
         return self._target
+
+    def optimize_many(self, panel, _):
+        """ The same target on every date """
+        return [self._target] * len(panel.dates())
 #pylint: enable=R0903
 
 class ProportionalWeighting(PortfolioOptimizer):
@@ -56,7 +69,7 @@ class ProportionalWeighting(PortfolioOptimizer):
     def __init__(self, universe):
         self._universe = universe
 
-    #TODO: this function is very slow. unsure what to do to speed it up.
+    #NOTE: optimize_many is far faster when forecasting many dates
     def optimize(self, forecast, asset_factory):
         """ Ignore forecaster for now. """
         num_assets = self._universe.cardinality()
@@ -67,19 +80,168 @@ class ProportionalWeighting(PortfolioOptimizer):
         weights = sharpes / sharpes.sum() if sharpes.sum() > 0.0 else numpy.ones(num_assets) / num_assets
         return Weightings([Weighting(asset, weight) for asset, weight in zip(self._universe, weights)])
 
+    def optimize_many(self, panel, _):
+        """ Weights every date of the panel in one pass """
+        assert set(panel.assets()) == set(self._universe)
+        return make_weightings_many(panel.assets(), proportional_weights(panel.simple_sharpes()))
+
 class AntiProportionalWeighting(PortfolioOptimizer):
     """ A stand in for basically shorting all the forecasts I'm given """
     def __init__(self, symbols):
         self._symbols = symbols
+        self._assets = None
 
     def optimize(self, forecast, asset_factory):
-        assets = [asset_factory.make_asset(symbol) for symbol in self._symbols]
+        assets = self._assets_from(asset_factory)
         sharpes = numpy.array([max(forecast.simple_sharpe(asset), 0.0) for asset in assets])
 
         #NOTE: we fallback to an equal weight proportion in the case that all sharpe ratios are negative
         weights = sharpes / sharpes.sum() if sharpes.sum() > 0.0 else numpy.ones(len(assets)) / len(assets)
         return Weightings([Weighting(asset, (1.0 - weight) / (len(assets) - 1)) for asset, weight in zip(assets, weights)])
 
+    def optimize_many(self, panel, asset_factory):
+        """ Weights every date of the panel in one pass """
+        assets = self._assets_from(asset_factory)
+        columns = [panel.assets().index(asset) for asset in assets]
+        return make_weightings_many(assets, anti_proportional_weights(panel.simple_sharpes()[:, columns]))
+
+    def _assets_from(self, asset_factory):
+        """ Makes our assets once and holds on to them """
+        if self._assets is None:
+            self._assets = [asset_factory.make_asset(symbol) for symbol in self._symbols]
+        return self._assets
+
+class MeanVariance(PortfolioOptimizer):
+    """ Long only mean variance optimization. Maximizes the forecast cagr less risk_aversion / 2 times the variance of
+    the portfolio, taking covariance from daily returns over the trailing lookback trading days.
+
+    The universe's covariance is slid forward incrementally across rebalance dates and each date's solve starts from
+    the last date's weights, so optimizers are best rebalanced forward through time """
+    def __init__(self, universe, risk_aversion, lookback=60):
+        self._assets = sorted(universe)
+        self._risk_aversion = risk_aversion
+        self._covariance = universe.windowed_covariance(lookback)
+        self._weights = None
+
+    def optimize(self, forecast, asset_factory):
+        """ Needs a forecast that knows its time point """
+        cagrs = numpy.array([forecast.cagr(asset) for asset in self._assets])
+        return self._weightings_on(forecast.time_point(), cagrs)
+
+    def optimize_many(self, panel, asset_factory):
+        columns = [panel.assets().index(asset) for asset in self._assets]
+        return [self._weightings_on(date, cagrs) for date, cagrs in zip(panel.dates(), panel.cagrs()[:, columns])]
+
+    def _weightings_on(self, date, cagrs):
+        """ Solves for date, warm started from the previous solution """
+        self._weights = mean_variance_weights(self._covariance.on(date), cagrs, self._risk_aversion, self._weights)
+        return Weightings([Weighting(asset, weight) for asset, weight in zip(self._assets, self._weights)])
+
+class MinimumVariance(MeanVariance):
+    """ Long only minimum variance optimization, which ignores forecast cagrs entirely """
+    def __init__(self, universe, lookback=60):
+        super(MinimumVariance, self).__init__(universe, 1.0, lookback)
+
+    def _weightings_on(self, date, cagrs):
+        return super(MinimumVariance, self)._weightings_on(date, numpy.zeros(len(self._assets)))
+
+class RiskParity(PortfolioOptimizer):
+    """ Long only equal risk contribution: each asset contributes the same share of the portfolio's variance.
+    Covariance comes from the forecast panel when it carries one, otherwise from the universe's covariance over the
+    trailing lookback trading days. Giving a lookback always uses the universe's covariance, so that lookbacks can
+    be swept independently of forecasters """
+    def __init__(self, universe, lookback=None):
+        self._assets = sorted(universe)
+        self._universe = universe
+        self._lookback = lookback
+
+    def optimize(self, forecast, asset_factory):
+        """ Needs a lookback and a forecast that knows its time point """
+        assert self._lookback is not None, "single forecasts don't carry covariance, give risk parity a lookback"
+        covariance = self._universe.windowed_covariance(self._lookback).on(forecast.time_point())
+        return make_weightings_many(self._assets, risk_parity_weights(covariance[numpy.newaxis]))[0]
+
+    def optimize_many(self, panel, asset_factory):
+        """ Solves every date of the panel at once """
+        assert panel.assets() == self._assets
+        if self._lookback is None:
+            covariances = panel.covariances()
+            assert covariances is not None, "forecasts don't carry covariance, give risk parity a lookback"
+        else:
+            covariance = self._universe.windowed_covariance(self._lookback)
+            covariances = numpy.array([covariance.on(date) for date in panel.dates()])
+        return make_weightings_many(self._assets, risk_parity_weights(covariances))
+
+def risk_parity_weights(covariances, tolerance=1e-12, max_iterations=100):
+    """ Solves equal risk contribution weights for a stack of (dates x assets x assets) covariances at once.
+
+    Newton's method finds the positive y solving covariance.y = 1 / (assets * y), the minimum of the convex
+    y'covariance y / 2 - mean(log y), stepping every date together. Normalizing y gives the weights """
+    size = covariances.shape[-1]
+    volatilities = numpy.sqrt(numpy.diagonal(covariances, axis1=1, axis2=2))
+
+    #NOTE: inverse volatility weights scaled to the solution's unit variance are the usual starting point
+    scaled = 1.0 / volatilities
+    scaled /= numpy.sqrt(numpy.einsum('di,dij,dj->d', scaled, covariances, scaled))[:, numpy.newaxis]
+    for _ in xrange(max_iterations):
+        residuals = numpy.einsum('dij,dj->di', covariances, scaled) - 1.0 / (size * scaled)
+        if numpy.abs(residuals * scaled).max() < tolerance:
+            break
+        jacobians = covariances + numpy.eye(size) / (size * scaled * scaled)[:, :, numpy.newaxis]
+        steps = numpy.linalg.solve(jacobians, -residuals)
+
+        #NOTE: steps are cut short to stay within the positive orthant
+        shrinking = numpy.where(steps < 0.0, -scaled / numpy.where(steps < 0.0, steps, -1.0), numpy.inf)
+        scaled = scaled + numpy.minimum(1.0, 0.9 * shrinking.min(axis=1))[:, numpy.newaxis] * steps
+    return scaled / scaled.sum(axis=1)[:, numpy.newaxis]
+
+def project_to_simplex(weights):
+    """ The closest long only, fully invested weights to weights """
+    ordered = numpy.sort(weights)[::-1]
+    excesses = numpy.cumsum(ordered) - 1.0
+    last = numpy.nonzero(ordered * numpy.arange(1, len(weights) + 1) > excesses)[0][-1]
+    return numpy.maximum(weights - excesses[last] / (last + 1.0), 0.0)
+
+def mean_variance_weights(covariance, cagrs, risk_aversion, initial_weights=None, tolerance=1e-9,
+                          max_iterations=5000):
+    """ Maximizes cagrs.w - risk_aversion / 2 * w'covariance w over long only, fully invested w by accelerated
+    projected gradient, starting from initial_weights or equal weights """
+    size = len(cagrs)
+    weights = numpy.ones(size) / size if initial_weights is None else project_to_simplex(initial_weights)
+    step = 1.0 / (risk_aversion * numpy.linalg.eigvalsh(covariance)[-1])
+
+    momentum = weights
+    momentum_scale = 1.0
+    for _ in xrange(max_iterations):
+        gradient = risk_aversion * covariance.dot(momentum) - cagrs
+        updated = project_to_simplex(momentum - step * gradient)
+        if numpy.abs(updated - weights).max() < tolerance:
+            return updated
+
+        #NOTE: momentum is restarted whenever it carries the solve uphill
+        if (momentum - updated).dot(updated - weights) > 0.0:
+            momentum_scale = 1.0
+        next_scale = (1.0 + numpy.sqrt(1.0 + 4.0 * momentum_scale * momentum_scale)) / 2.0
+        momentum = updated + ((momentum_scale - 1.0) / next_scale) * (updated - weights)
+        weights, momentum_scale = updated, next_scale
+    return weights
+
+def proportional_weights(sharpes):
+    """ Weights each row of a (dates x assets) simple sharpe matrix in proportion to its positive sharpes. Rows
+    without any positive sharpe are equally weighted """
+    sharpes = numpy.maximum(numpy.asarray(sharpes, dtype=float), 0.0)
+    totals = sharpes.sum(axis=1)[:, numpy.newaxis]
+    equal_weights = numpy.ones_like(sharpes) / sharpes.shape[1]
+    return numpy.where(totals > 0.0, sharpes / numpy.where(totals > 0.0, totals, 1.0), equal_weights)
+
+def anti_proportional_weights(sharpes):
+    """ Spreads each row's proportional weights inversely across the other assets """
+    return (1.0 - proportional_weights(sharpes)) / (sharpes.shape[1] - 1)
+
+def make_weightings_many(assets, weights):
+    """ Makes one Weightings per row of a (dates x assets) weight matrix """
+    return [Weightings([Weighting(asset, weight) for asset, weight in zip(assets, row)]) for row in weights]
+
 # pylint: disable=R0903
 class Weightings(object):
     """ Represents multiple asset weights that add up to 1.0 """
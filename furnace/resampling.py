@@ -0,0 +1,55 @@
+""" Resampling of strategy returns. Rather than re-running a backtest from many start dates to wash out lucky
+timing, we resample the daily returns of one backtest in to thousands of alternate paths with a stationary block
+bootstrap and read confidence intervals for our metrics off of them """
+
+import numpy
+import pandas
+from furnace import parallel, performance
+
+METRICS = ["cagr", "volatility", "simple_sharpe", "max_drawdown"]
+
+def stationary_bootstrap_indices(days, paths, mean_block, random_state):
+    """ Returns a (paths x days) array of indices in to days of returns. Each path is a run of blocks, each block
+    starting at a random day and running on, wrapping around at the end, for a geometrically distributed number of
+    days averaging mean_block """
+    starts = random_state.randint(0, days, size=(paths, days))
+    new_block = random_state.random_sample((paths, days)) < 1.0 / mean_block
+    new_block[:, 0] = True
+
+    #NOTE: each day looks back to the day its block began and walks forward from that block's start
+    columns = numpy.arange(days)
+    block_begins = numpy.maximum.accumulate(numpy.where(new_block, columns, 0), axis=1)
+    return (starts[numpy.arange(paths)[:, numpy.newaxis], block_begins] + columns - block_begins) % days
+
+def bootstrap_returns(daily_returns, paths, mean_block=21, seed=None):
+    """ Returns a (paths x days) array of stationary block bootstrapped daily returns """
+    daily_returns = numpy.asarray(daily_returns, dtype=float)
+    random_state = numpy.random.RandomState(seed)
+    return daily_returns[stationary_bootstrap_indices(len(daily_returns), paths, mean_block, random_state)]
+
+def bootstrap_metrics(job):
+    """ Metrics of every path of a (daily returns, paths, mean block, seed) job """
+    daily_returns, paths, mean_block, seed = job
+    return performance.batch_metrics(bootstrap_returns(daily_returns, paths, mean_block, seed))[METRICS]
+
+def bootstrap(daily_returns, paths=10000, mean_block=21, seed=None, chunk_size=1000, processes=1):
+    """ Returns a table of metrics with a row per bootstrapped path of daily returns, such as an overall
+    performance's. Paths are made chunk_size at a time to keep memory in check, and chunks are spread across a pool
+    of processes unless processes is 1. None uses a process per cpu """
+    #NOTE: each chunk gets its own seed so results don't depend on how chunks are spread over processes
+    seeds = numpy.random.RandomState(seed).randint(0, 2 ** 31 - 1, size=(paths + chunk_size - 1) // chunk_size)
+    jobs = [(daily_returns, min(chunk_size, paths - chunk * chunk_size), mean_block, chunk_seed)
+            for chunk, chunk_seed in enumerate(seeds)]
+
+    return pandas.concat(parallel.map_forked(bootstrap_metrics, jobs, processes), ignore_index=True)
+
+def confidence_intervals(daily_returns, confidence=0.95, **kwargs):
+    """ Returns a table with a row per metric of its value over daily returns along with the lower and upper bounds
+    of its confidence interval across bootstrapped paths. Keyword arguments are passed on to bootstrap """
+    metrics = bootstrap(daily_returns, **kwargs)
+    tail = 100.0 * (1.0 - confidence) / 2.0
+    return pandas.DataFrame({
+        "estimate": performance.batch_metrics(numpy.asarray(daily_returns, dtype=float))[METRICS].values[0],
+        "lower": numpy.percentile(metrics.values, tail, axis=0),
+        "upper": numpy.percentile(metrics.values, 100.0 - tail, axis=0)
+    }, index=METRICS, columns=["estimate", "lower", "upper"])
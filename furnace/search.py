@@ -0,0 +1,145 @@
+""" Searches over strategy parameter grids. Rather than running every configuration over every start date, successive
+halving scores all configurations on a cheap budget - a few start offsets over shortened windows - and only carries
+the most promising on to larger budgets. Every evaluation is kept for later analysis """
+
+import itertools
+import math
+import numpy
+import pandas
+from furnace import parallel, performance
+from furnace.data import fcalendar
+
+def grid(**parameters):
+    """ Returns every configuration, a dictionary of parameter names to values, in the product of parameters """
+    names = sorted(parameters.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*[parameters[name] for name in names])]
+
+def offsets_evaluator(build, universe, calendar, begin_date, end_date, offsets, metric="simple_sharpe",
+                      min_days=None):
+    """ Creates an evaluation of configurations, scoring a configuration by its metric averaged across backtests
+    starting offsets trading days after begin and ending as many after end. Build takes a universe, a calendar and a
+    configuration and returns a strategy. A budget between 0 and 1 uses that fraction of offsets, spread evenly
+    across them, and given min_days shortens each backtest to that fraction of its trading days but no fewer than
+    min_days """
+    offsets = numpy.asarray(offsets)
+    begins = calendar.ordinals_after([begin_date])[0] + offsets
+    days = calendar.ordinals_before([end_date])[0] - calendar.ordinals_after([begin_date])[0]
+
+    def evaluate(configuration, budget):
+        """ Scores configuration on budget """
+        used = numpy.unique(numpy.linspace(0, len(offsets) - 1, int(math.ceil(budget * len(offsets)))).astype(int))
+        length = days if min_days is None else max(min_days, int(budget * days))
+
+        strategy_ = build(universe, calendar, configuration)
+        performances = [strategy_.performance_during(calendar.dates_at(begin), calendar.dates_at(begin + length),
+                                                     compact=True)
+                        for begin in begins[used]]
+        return performance.batch_metrics(performances)[metric].mean()
+    return evaluate
+
+def successive_halving(configurations, evaluate, min_budget, max_budget=1.0, eta=3, processes=1):
+    """ Scores every configuration on min_budget, keeps the best 1/eta of them and scores those again on eta times
+    the budget, until the last few are scored on max_budget. Higher scores are better. Evaluate takes a
+    configuration and a budget and returns its score. Each rung's evaluations are spread across a pool of processes
+    unless processes is 1. None uses a process per cpu """
+    assert 0.0 < min_budget <= max_budget
+    assert eta > 1
+    rungs = int(math.floor(math.log(max_budget / min_budget, eta) + 1e-9)) + 1
+
+    search = Search()
+    survivors = list(configurations)
+    for rung in range(rungs):
+        budget = max_budget if rung == rungs - 1 else min_budget * eta ** rung
+        scores = _evaluate_all(evaluate, survivors, budget, processes)
+        search.record(rung, budget, survivors, scores)
+
+        survivors = _top(survivors, scores, max(1, len(survivors) // eta))
+    return search
+
+def coarse_to_fine(build, universe, calendar, configurations, begin_date, end_date, frequency="weekly", top_k=5,
+                   metric="simple_sharpe", day_parameters=("days",), processes=1):
+    """ Screens every configuration from begin to end on weekly, monthly or quarterly bars, then backtests the top_k
+    on daily bars. Build takes a universe, a calendar and a configuration and returns a strategy, and is given
+    resampled ones while screening. Parameters named in day_parameters count trading days, so they're rescaled to
+    bars for the screen. Screens are recorded on a budget of the fraction of days they sample, and need at least two
+    bars between begin and end """
+    coarse_calendar = calendar.resampled(frequency)
+    coarse_universe = universe.resampled(coarse_calendar)
+    first = coarse_calendar.ordinals_after([begin_date])[0]
+    last = coarse_calendar.ordinals_before([end_date])[0]
+    assert last > first
+    coarse_begin, coarse_end = coarse_calendar.dates_at([first, last])
+
+    #NOTE: compact backtests run on arrays, so they cost a couple of milliseconds plus a little per day, and bars cut
+    #the days a backtest covers but not its rebalances. A 10 year SPY/LQD mix rebalanced daily takes about 20ms on
+    #daily bars and 5ms on weekly ones, while rebalanced every 25 days both take about 2ms. Screens pay off most for
+    #strategies that rebalance often or whose forecasters work on every bar
+    days_per_bar = calendar.number_trading_days_between(coarse_begin, coarse_end) / float(last - first)
+
+    def screen(configuration, _):
+        """ Scores configuration on bars """
+        rescaled = dict(configuration)
+        for name in day_parameters:
+            if name in rescaled:
+                rescaled[name] = max(1, int(round(rescaled[name] / days_per_bar)))
+        performance_ = build(coarse_universe, coarse_calendar, rescaled).performance_during(coarse_begin, coarse_end,
+                                                                                             compact=True)
+        return performance.batch_metrics([performance_], fcalendar.trading_days_in_year() / days_per_bar)[metric][0]
+
+    def refine(configuration, _):
+        """ Scores configuration on days """
+        performance_ = build(universe, calendar, configuration).performance_during(begin_date, end_date, compact=True)
+        return performance.batch_metrics([performance_])[metric][0]
+
+    search = Search()
+    configurations = list(configurations)
+    scores = _evaluate_all(screen, configurations, None, processes)
+    search.record(0, 1.0 / days_per_bar, configurations, scores)
+
+    finalists = _top(configurations, scores, top_k)
+    search.record(1, 1.0, finalists, _evaluate_all(refine, finalists, None, processes))
+    return search
+
+def _top(configurations, scores, count):
+    """ Returns the count best scoring configurations, best first. Ties keep their order """
+    #NOTE: configurations that can't be scored, such as those whose volatility is 0, always rank last
+    ranked = numpy.argsort(-numpy.where(numpy.isnan(scores), -numpy.inf, scores), kind="mergesort")
+    return [configurations[position] for position in ranked[:count]]
+
+def _evaluate_all(evaluate, configurations, budget, processes):
+    """ Scores every configuration on budget """
+    def evaluate_on_budget(configuration):
+        """ Scores configuration on budget """
+        return evaluate(configuration, budget)
+    return numpy.array(parallel.map_forked(evaluate_on_budget, configurations, processes), dtype=float)
+
+class Search(object):
+    """ Every evaluation made during a search, kept in the order they were made """
+
+    def __init__(self):
+        self._rows = []
+        self._configurations = []
+
+    def __len__(self):
+        """ Returns the number of evaluations made """
+        return len(self._rows)
+
+    def record(self, rung, budget, configurations, scores):
+        """ Records configurations' scores on budget """
+        for configuration, score in zip(configurations, scores):
+            row = dict(configuration)
+            row.update(rung=rung, budget=budget, score=score)
+            self._rows.append(row)
+            self._configurations.append(configuration)
+
+    def evaluations(self):
+        """ Returns a table of every evaluation, a row of rung, budget, score and parameters each """
+        table = pandas.DataFrame(self._rows)
+        return table[["rung", "budget", "score"] + sorted(set(table.columns) - set(["rung", "budget", "score"]))]
+
+    def best(self):
+        """ Returns the best configuration scored on the largest budget, along with its score """
+        table = self.evaluations()
+        final = table[table["budget"] == table["budget"].max()]
+        best = final["score"].idxmax()
+        return self._configurations[best], table["score"][best]
@@ -6,11 +6,12 @@
 from furnace import performance
 from furnace import weathermen
 from furnace import portfolio
-from dateutil.rrule import rrule, YEARLY
 import datetime
 import abc
+import itertools
+import numpy
+import pandas
 import furnace.data.fcalendar
-from furnace.data.fcalendar import first_day_after
 import furnace.data.yahoo
 import furnace.data.asset
 
@@ -42,18 +43,96 @@ class Strategy(object):
         self._rebalancing_rule = rebalancing_rule
         self._forecaster = forecaster
 
-    def performance_during(self, begin_date, end_date):
-        """ Gets the overall performance from begin_date to end_date """
+    def performance_during(self, begin_date, end_date, compact=False):
+        """ Gets the overall performance from begin_date to end_date. Compact performances are far lighter to hold
+        on to, for instance across a sweep """
         assert self._universe.supports_date(begin_date)
         assert self._universe.supports_date(end_date), "calendar does not support date {0}".format(end_date)
 
-        period_performances = []
-        for trading_period in self.periods_during(begin_date, end_date):
-            period_begin = trading_period.begin()
-            index = self.target_weighting_on(period_begin).make_index_on(period_begin, trading_period.end())
-            period_performances.append(performance.make_period_performance(period_begin, trading_period.end(), index))
-
-        return performance.make_overall_performance(period_performances, self._universe)
+        if compact:
+            assert begin_date <= end_date
+            return self._compact_performance(*self._rebalancing_rule.boundaries_during(begin_date, end_date))
+        return performance.link_periods(self.period_performances_during(begin_date, end_date), self._universe)
+
+    def period_performances_during(self, begin_date, end_date):
+        """ Gets the performance of each trading period from begin_date to end_date, each indexed on its own and not
+        yet chain linked """
+        return self._period_performances(list(self.periods_during(begin_date, end_date)))
+
+    def sliding_metrics(self, begin_date, end_date, offsets):
+        """ Metrics of this strategy over begin to end slid forward by each of offsets trading days, as the studies
+        use to wash out lucky start dates. Offsets whose periods line up, such as n day rebalances an exact number of
+        periods apart, share one backtest over all of their dates. Each offset's metrics then come from differences
+        of running sums over that backtest's daily returns rather than a backtest of its own. Returns a table indexed
+        by offset with begin and end dates, cagr, volatility, simple sharpe, max drawdown and number of trades """
+        calendar = self._rebalancing_rule.calendar()
+        first = calendar.ordinals_after([begin_date])[0]
+        last = calendar.ordinals_before([end_date])[0]
+
+        boundaries = {}
+        for offset in sorted(offsets):
+            begins, ends = self._rebalancing_rule.boundaries_during(calendar.dates_at(first + offset),
+                                                                    calendar.dates_at(last + offset))
+            assert len(begins), "no whole periods between begin and end"
+            boundaries[offset] = numpy.concatenate([begins, ends[-1:]])
+
+        tables = []
+        for union, members in union_boundaries(boundaries):
+            overall = performance.link_periods(self._period_performances(list(
+                self._rebalancing_rule.periods_at(union[:-1], union[1:]))), self._universe)
+            firsts = numpy.array([boundaries[offset][0] for offset in members])
+            lasts = numpy.array([boundaries[offset][-1] for offset in members])
+
+            table = performance.window_metrics(overall, firsts - union[0], lasts - union[0])
+            table.insert(0, "end", calendar.dates_at(lasts).values)
+            table.insert(0, "begin", calendar.dates_at(firsts).values)
+            table.index = members
+            tables.append(table)
+        return pandas.concat(tables).sort_index()
+
+    def _period_performances(self, trading_periods):
+        """ Gets the performance of each of trading periods, each indexed on its own """
+        target_weightings = self.target_weightings_on([trading_period.begin() for trading_period in trading_periods])
+        return [performance.make_period_performance(trading_period.begin(), trading_period.end(),
+                                                    target_weighting.make_index_on(trading_period.begin(),
+                                                                                   trading_period.end()))
+                for trading_period, target_weighting in zip(trading_periods, target_weightings)]
+
+    def _compact_performance(self, begins, ends):
+        """ Runs the periods between calendar ordinals begins and ends straight in to a compact performance, matching
+        a linked overall performance's compact copy. Within a period each asset is held at a fixed basis, so the
+        portfolio index on every day comes from one array of aligned prices rather than a table per period chain
+        linked together, and the cost is in days rather than periods """
+        calendar = self._rebalancing_rule.calendar()
+        dates = pandas.DatetimeIndex(calendar.dates_at(numpy.arange(begins[0], ends[-1] + 1)).values)
+        begins, ends = begins - begins[0], ends - begins[0]
+
+        target_weightings = self.target_weightings_on(list(dates[begins]))
+        symbols = [weighting.asset().symbol() for weighting in target_weightings[0]]
+        assert all([weighting.asset().symbol() for weighting in target_weighting] == symbols
+                   for target_weighting in target_weightings)
+        weights = numpy.array([[weighting.weight() for weighting in target_weighting]
+                               for target_weighting in target_weightings])
+
+        prices = numpy.column_stack([self._universe[symbol].prices(dates[0], dates[-1]).reindex(dates)
+                                     for symbol in symbols])
+        assert not numpy.isnan(prices).any(), "every symbol must trade on every day"
+
+        #NOTE: day d falls in the period ending on or after it, which grows from its first day's prices, and each
+        #period starts from the index its previous period ended on
+        days = numpy.arange(1, len(dates))
+        periods = numpy.searchsorted(ends, days)
+        grown = (prices[days] / prices[begins[periods]] * weights[periods]).sum(axis=1)
+        starts = numpy.concatenate([[1.0], numpy.cumprod(grown[ends - 1])[:-1]])
+        index = numpy.concatenate([[1.0], starts[periods] * grown])
+
+        ledger = performance.TradeLedger()
+        ledger.rebalance_many(dates[begins], symbols, weights * starts[:, numpy.newaxis] / prices[begins],
+                              prices[begins])
+        ledger.liquidate(dates[-1], symbols, prices[-1])
+
+        return performance.CompactPerformance(index[1:] / index[:-1] - 1.0, dates[0].toordinal(), begins, weights,
+                                              tuple(symbols), self._universe, ledger.consolidated())
 
     def periods_during(self, begin_date, end_date):
         """ The periods this strategy operates on - i.e., weekly, monthly, daily """
@@ -71,17 +150,73 @@ class Strategy(object):
         forecast = self.forecast(date)
         return self._portfolio_optimizer.optimize(forecast, self._universe)
 
+    def forecasts_on(self, dates):
+        """ Generates a forecast for each of dates, in one batch when the forecaster supports it """
+        period = self._rebalancing_rule.period_length()
+        if hasattr(self._forecaster, "forecast_many"):
+            panel = self._forecaster.forecast_many(self._universe, dates, period)
+            return [panel.on(date, self._universe) for date in dates]
+        return [self._forecaster(self._universe, date, period) for date in dates]
+
+    def target_weightings_on(self, dates):
+        """ Generates the target portfolio this strategy would recommend for each of dates, optimizing them all in
+        one batch when the forecaster supports it """
+        if hasattr(self._forecaster, "forecast_many"):
+            panel = self._forecaster.forecast_many(self._universe, dates, self._rebalancing_rule.period_length())
+            return self._portfolio_optimizer.optimize_many(panel, self._universe)
+        return [self._portfolio_optimizer.optimize(forecast, self._universe) for forecast in self.forecasts_on(dates)]
+
+def union_boundaries(boundaries):
+    """ Groups a dictionary of keys to period boundaries, arrays of calendar ordinals, in to runs of periods that
+    cover every member of a group. A key joins a group when the group rebalances on exactly its boundaries wherever
+    the two overlap, so each member's periods are a stretch of the group's. Returns pairs of a group's boundaries and
+    its keys """
+    groups = []
+    for key in sorted(boundaries):
+        bounds = boundaries[key]
+        for group in groups:
+            union = group[0]
+            if union[0] <= bounds[0] <= union[-1] and numpy.array_equal(union[(union >= bounds[0]) & (union <= bounds[-1])],
+                                             bounds[bounds <= union[-1]]):
+                group[0] = numpy.concatenate([union, bounds[bounds > union[-1]]])
+                group[1].append(key)
+                break
+        else:
+            groups.append([bounds, [key]])
+    return [(union, keys) for union, keys in groups]
+
 #NOTE: assuming there will be more rebalancing rules eventually and this interface will grow
 #pylint: disable=R0922
 class RebalancingRule(object):
-    """ Represents different strategies for when to rebalance a portfolio """
+    """ Represents different strategies for when to rebalance a portfolio. Rules work in calendar ordinals, positions
+    in their financial calendar, so that engines can work on period boundaries as arrays """
     __metaclass__ = abc.ABCMeta
 
+    def __init__(self, fcalendar):
+        """ Requires a calendar to find future trading dates """
+        self._fcalendar = fcalendar
+
     @abc.abstractmethod
+    def boundaries_during(self, begin_date, end_date):
+        """ Returns two arrays of calendar ordinals, the beginnings and ends of each period between begin and end
+        (possibly truncated at beginning and end) based on this rebalancing rule """
+        pass
+
     def periods_during(self, begin_date, end_date):
         """ Returns a set of periods, beginning at begin and ending at end (possibly truncated at beginning and end)
-            based on this rebalancing rule with rebalancing to occur at each period switch """
-        pass
+            based on this rebalancing rule with rebalancing to occur at each period switch. Periods are only made as
+            they're iterated over """
+        return self.periods_at(*self.boundaries_during(begin_date, end_date))
+
+    def periods_at(self, begins, ends):
+        """ Returns periods between calendar ordinals begins and ends. Periods are only made as they're iterated
+        over """
+        for period_begin, period_end in zip(begins, ends):
+            yield TradingPeriod(self._fcalendar.dates_at(period_begin), self._fcalendar.dates_at(period_end))
+
+    def calendar(self):
+        """ Getter for the calendar our ordinals are positions in """
+        return self._fcalendar
 
     @abc.abstractmethod
     def period_length(self):
@@ -94,17 +229,17 @@ class BuyAndHold(RebalancingRule):
 
     def __init__(self, begin_date, end_date, fcalendar):
         assert begin_date <= end_date
+        super(BuyAndHold, self).__init__(fcalendar)
         self._begin_date = begin_date
         self._end_date = end_date
-        self._fcalendar = fcalendar
 
-    def periods_during(self, begin_date, end_date):
-        """ Returns a single trading period: begin to end """
+    def boundaries_during(self, begin_date, end_date):
+        """ Returns a single period: begin to end """
         assert begin_date <= end_date
         assert self._begin_date == begin_date
         assert self._end_date == end_date
 
-        yield TradingPeriod(begin_date, end_date)
+        return self._fcalendar.ordinals_after([begin_date]), self._fcalendar.ordinals_before([end_date])
 
     def period_length(self):
         """ Returns the length of the buy and hold period """
@@ -113,17 +248,20 @@ class BuyAndHold(RebalancingRule):
 class AnnualRebalance(RebalancingRule):
     """ Annual rebalance rebalances every year on same day as begin_date """
 
-    def __init__(self, fcalendar):
-        """ Requires a calendar to find future trading dates """
-        self._fcalendar = fcalendar
+    def boundaries_during(self, begin_date, end_date):
+        """ Returns the first trading dates on or after every anniversary of begin date up until end date """
 
-    def periods_during(self, begin_date, end_date):
-        """ Returns all first trading dates of the year between begin and end date """
+        #NOTE: anniversaries are built as months since begin's month plus begin's offset in to its month. Like
+        #rrule, we skip years where that lands in the next month, i.e. february 29th
+        begin_month = numpy.datetime64(begin_date, 'M')
+        months = begin_month + 12 * numpy.arange(end_date.year - begin_date.year + 1)
+        offset = numpy.datetime64(begin_date, 'us') - begin_month.astype('datetime64[us]')
+        anniversaries = months.astype('datetime64[us]') + offset
+        anniversaries = anniversaries[(anniversaries.astype('datetime64[M]') == months) &
+                                      (anniversaries <= numpy.datetime64(end_date, 'us'))]
 
-        dates = list(rrule(YEARLY, dtstart=begin_date, until=end_date))
-        for period_begin, period_end in zip(dates[:-1], dates[1:]):
-            yield TradingPeriod(first_day_after(self._fcalendar, period_begin),
-                                first_day_after(self._fcalendar, period_end))
+        ordinals = self._fcalendar.ordinals_after(anniversaries)
+        return ordinals[:-1], ordinals[1:]
 
     def period_length(self):
         """ Returns a years length in real days. Period length would generally find the closest trading day to one year
@@ -135,22 +273,113 @@ class NDayRebalance(RebalancingRule):
 
     def __init__(self, fcalendar, ndays):
         """ Requires a calendar to find future trading dates """
-        self._fcalendar = fcalendar
+        super(NDayRebalance, self).__init__(fcalendar)
         self._ndays = ndays
 
-    def periods_during(self, begin_date, end_date):
-        """ Iterates through every n days starting at begin date """
-        periods = self._fcalendar.every_nth_between(begin_date, end_date, self._ndays)
-        periods = zip(periods[:-1], periods[1:])
+    def boundaries_during(self, begin_date, end_date):
+        """ Every n days starting at begin date """
+
+        #NOTE: we add one day to ensure that if end is a trading day we count it as our last period's end
+        first = self._fcalendar.ordinals_after([begin_date])[0]
+        last = self._fcalendar.ordinals_before([end_date + datetime.timedelta(1)])[0]
 
-        periods = [TradingPeriod(date1, date2) for date1, date2 in periods]
-        assert all(tp.trading_days(self._fcalendar) == self._ndays for tp in periods)
-        return periods
+        ordinals = numpy.arange(first, last + 1, self._ndays)
+        return ordinals[:-1], ordinals[1:]
 
     def period_length(self):
         """ Returns the trading days """
         return self._ndays
 
+class CalendarRebalance(RebalancingRule):
+    """ Rebalances on the nth trading day of every week, month or quarter. nth counts from 0, the first trading day,
+    or back from -1, the last trading day. Periods are truncated to begin and end dates that fall between
+    rebalances """
+
+    PERIOD_LENGTHS = {"weekly": 5, "monthly": 21, "quarterly": 63}
+
+    def __init__(self, fcalendar, frequency, nth=0):
+        """ Requires a calendar to find future trading dates. Frequency is one of weekly, monthly or quarterly """
+        assert frequency in CalendarRebalance.PERIOD_LENGTHS
+        super(CalendarRebalance, self).__init__(fcalendar)
+        self._frequency = frequency
+
+        #NOTE: rebalances are found once over the whole calendar so that any number of date ranges are cheap
+        self._rebalances = fcalendar.nth_trading_days(frequency, nth)
+
+    def boundaries_during(self, begin_date, end_date):
+        """ Returns periods between every rebalance, along with the stubs from begin to the first rebalance and from
+        the last rebalance to end """
+        first = self._fcalendar.ordinals_after([begin_date])[0]
+        last = self._fcalendar.ordinals_before([end_date])[0]
+        if last <= first:
+            return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int)
+
+        rebalances = self._rebalances[(self._rebalances > first) & (self._rebalances < last)]
+        ordinals = numpy.concatenate([[first], rebalances, [last]])
+        return ordinals[:-1], ordinals[1:]
+
+    def period_length(self):
+        """ Returns the typical number of trading days between rebalances """
+        return CalendarRebalance.PERIOD_LENGTHS[self._frequency]
+
+class DriftBandRebalance(RebalancingRule):
+    """ Rebalances back to static target weightings whenever any asset's weight drifts further than band away from its
+    target. Drift is found from aligned prices one period at a time, in windows that stop growing once a breach is
+    found, so a backtest costs work in its days rather than in rebalances times days """
+
+    def __init__(self, fcalendar, weightings, band, lookback=25):
+        """ Requires a calendar to find future trading dates. Band is absolute, so a band of 0.05 lets a 20% target
+        drift between 15% and 25%. Drift band periods vary in length, so forecasters are given lookback instead """
+        assert band > 0.0
+        super(DriftBandRebalance, self).__init__(fcalendar)
+        self._assets = [weighting.asset() for weighting in weightings]
+        self._targets = numpy.array([weighting.weight() for weighting in weightings])
+        self._band = band
+        self._lookback = lookback
+
+    def boundaries_during(self, begin_date, end_date):
+        """ Returns periods between every day our weightings drift out of band, truncated at begin and end """
+        first = self._fcalendar.ordinals_after([begin_date])[0]
+        last = self._fcalendar.ordinals_before([end_date])[0]
+        if last <= first:
+            return numpy.zeros(0, dtype=int), numpy.zeros(0, dtype=int)
+
+        dates = self._fcalendar.dates_at(numpy.arange(first, last + 1))
+        prices = pandas.concat([asset.prices(dates.iloc[0], dates.iloc[-1]) for asset in self._assets],
+                               axis=1).reindex(dates.values).values
+
+        rebalances = [0]
+        breach = self._first_breach(prices, 0)
+        while breach is not None:
+            rebalances.append(breach)
+            breach = self._first_breach(prices, breach)
+
+        ordinals = first + numpy.unique(rebalances + [last - first])
+        return ordinals[:-1], ordinals[1:]
+
+    def _first_breach(self, prices, rebalance):
+        """ Returns the first row of prices after rebalance on which our weightings drift out of band, or None if
+        they never do. Rows are scanned in windows that double in length, so finding a breach costs work in the days
+        until it rather than in all the days left, and a whole backtest costs work in its days """
+        length = 32
+        while True:
+            #NOTE: each asset grows from its target by its price relative to our last rebalance
+            window = prices[rebalance:rebalance + length + 1]
+            held = self._targets * window / window[0]
+            drift = numpy.abs(held / held.sum(axis=1)[:, numpy.newaxis] - self._targets)
+            out_of_band = (drift > self._band).any(axis=1)
+            out_of_band[0] = False
+
+            if out_of_band.any():
+                return rebalance + out_of_band.argmax()
+            if rebalance + length + 1 >= len(prices):
+                return None
+            length *= 2
+
+    def period_length(self):
+        """ Returns the lookback forecasters are given """
+        return self._lookback
+
 #TODO: look at eliminating most of these and decomposing common helpers out of them, DRY this up
 #family strategies
 #TODO: single asset currently has to pass in universe. There ought to be no reason to pass in universe,
@@ -230,6 +459,85 @@ def ndays_rebalance_multi_asset(universe, fcalendar, weights, days):
                     NDayRebalance(fcalendar, days),
                     weathermen.null_forecaster())
 
+def calendar_rebalance_multi_asset(universe, fcalendar, weights, frequency, nth=0):
+    """ A multi asset portfolio that is rebalanced on the nth trading day of every week, month or quarter """
+
+    weightings = portfolio.Weightings([portfolio.Weighting(universe[key], weight)
+                                       for key, weight in weights.iteritems()])
+
+    return Strategy(portfolio.StaticTarget(weightings),
+                    universe,
+                    CalendarRebalance(fcalendar, frequency, nth),
+                    weathermen.null_forecaster())
+
+def monthly_rebalance_multi_asset(universe, fcalendar, weights):
+    """ A multi asset portfolio that is rebalanced on the first trading day of every month """
+    return calendar_rebalance_multi_asset(universe, fcalendar, weights, "monthly")
+
+def drift_band_rebalance_multi_asset(universe, fcalendar, weights, band):
+    """ A multi asset portfolio that is rebalanced whenever any asset drifts more than band from its target weight """
+
+    weightings = portfolio.Weightings([portfolio.Weighting(universe[key], weight)
+                                       for key, weight in weights.iteritems()])
+
+    return Strategy(portfolio.StaticTarget(weightings),
+                    universe,
+                    DriftBandRebalance(fcalendar, weightings, band),
+                    weathermen.null_forecaster())
+
+def risk_parity_multi_asset(universe, fcalendar, days, lookback=None):
+    """ A multi asset portfolio rebalanced every n days to equal risk contributions. Covariance is taken over the
+    last n days unless a lookback is given """
+
+    return Strategy(portfolio.RiskParity(universe, lookback),
+                    universe,
+                    NDayRebalance(fcalendar, days),
+                    weathermen.period_average(fcalendar))
+
+def mix_grid(symbols, steps):
+    """ Returns every static mix of symbols with weights in multiples of 1 / steps, as a (mixes x symbols) matrix.
+    Two symbols and 30 steps gives the 31 stock and bond mixes of the studies """
+    #NOTE: stars and bars - each choice of dividers splits steps in to one count per symbol
+    slots = steps + len(symbols) - 1
+    dividers = list(itertools.combinations(range(slots), len(symbols) - 1))
+    bounds = numpy.column_stack([numpy.repeat(-1, len(dividers)),
+                                 numpy.array(dividers, dtype=int).reshape(len(dividers), len(symbols) - 1),
+                                 numpy.repeat(slots, len(dividers))])
+    return (bounds[:, 1:] - bounds[:, :-1] - 1) / float(steps)
+
+def static_mix_returns(universe, rebalancing_rule, symbols, weights, begin_date, end_date):
+    """ Daily returns of many static mixes of symbols, each rebalanced back to its weights on rebalancing_rule's
+    schedule from begin to end. Weights are a (mixes x symbols) matrix. Within a period a mix grows by its weights
+    times each asset's growth since the period began, so every mix's returns come from two matrix products of
+    weights with asset growths rather than a backtest each. Returns a (mixes x days) matrix, with days beginning the
+    day after begin as in overall performances """
+    weights = numpy.atleast_2d(numpy.asarray(weights, dtype=float))
+    assert weights.shape[1] == len(symbols)
+    assert numpy.allclose(weights.sum(axis=1), 1.0)
+
+    begins, ends = rebalancing_rule.boundaries_during(begin_date, end_date)
+    assert len(begins), "no whole periods between begin and end"
+    dates = rebalancing_rule.calendar().dates_at(numpy.arange(begins[0], ends[-1] + 1))
+    prices = pandas.concat([universe[symbol].prices(dates.iloc[0], dates.iloc[-1]) for symbol in symbols],
+                           axis=1).reindex(dates.values).values.astype(float)
+    assert not numpy.isnan(prices).any(), "every symbol must trade on every day"
+
+    #NOTE: day d falls in the period ending on or after it, and grows on that period's first day's prices
+    days = numpy.arange(1, len(dates))
+    period_begins = (begins - begins[0])[numpy.searchsorted(ends - begins[0], days)]
+    grown = numpy.dot(prices[days] / prices[period_begins], weights.T)
+    grown_before = numpy.dot(prices[days - 1] / prices[period_begins], weights.T)
+    return (grown / grown_before - 1.0).T
+
+def static_mix_metrics(universe, rebalancing_rule, symbols, weights, begin_date, end_date):
+    """ Metrics of many static mixes at once, as batch metrics, with a column of weights per symbol """
+    weights = numpy.atleast_2d(numpy.asarray(weights, dtype=float))
+    metrics = performance.batch_metrics(static_mix_returns(universe, rebalancing_rule, symbols, weights, begin_date,
+                                                           end_date))
+    for column, symbol in reversed(list(enumerate(symbols))):
+        metrics.insert(0, symbol, weights[:, column])
+    return metrics
+
 def buy_and_hold_stocks(universe, begin_date, end_date, fcalendar):
     """ Purchases the SPY at the beginning period and holds it to the end """
     spy = universe["SPY"]
@@ -6,6 +6,8 @@ Tests the asset helper class
 
 from furnace.test.helpers import is_close, DEFAULT_ASSET_FACTORY, CALENDAR
 from datetime import datetime
+import numpy
+import pandas
 from furnace.data.asset import adjust_period, annualized
 from furnace import strategy
 
@@ -80,3 +82,56 @@ def test_commodities():
 
     assert is_close(gsg.total_return(begin, end), -.3342)
     assert is_close(gsg.volatility(begin, end), .2755)
+
+def test_vectorized_metrics():
+    """ Tests the vectorized cagrs and volatilities against the single window versions, over windows of different
+    lengths """
+    begins = [datetime(2006, 7, 21), datetime(2009, 3, 2), datetime(2012, 11, 30)]
+    ends = [datetime(2012, 12, 31), datetime(2009, 12, 31), datetime(2012, 12, 31)]
+    gsg = DEFAULT_ASSET_FACTORY.make_asset("GSG")
+
+    cagrs = gsg.cagrs(begins, ends)
+    volatilities = gsg.volatilities(begins, ends)
+    for begin, end, cagr, volatility in zip(begins, ends, cagrs, volatilities):
+        assert is_close(cagr, gsg.cagr(begin, end))
+        assert is_close(volatility, gsg.volatility(begin, end))
+    assert is_close(volatilities[0], .2755)
+
+def test_windowed_covariance():
+    """ Tests that the incrementally slid covariance matches recomputing it over each window, moving both forward
+    and back in time """
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD", "GSG"])
+    assets = sorted(universe)
+    closes = pandas.concat([asset.prices() for asset in assets], axis=1)
+    returns = closes.astype(float).pct_change()
+
+    covariance = universe.windowed_covariance(60)
+    assert covariance is universe.windowed_covariance(60)
+    assert covariance.assets() == assets
+    for date in [datetime(2010, 3, 31), datetime(2010, 4, 30), datetime(2011, 6, 30), datetime(2009, 1, 2)]:
+        expected = 252 * returns[returns.index <= date].iloc[-60:].cov().values
+        assert numpy.allclose(covariance.on(date), expected, rtol=1e-9, atol=1e-12)
+    assert numpy.allclose(numpy.diag(covariance.correlation_on(datetime(2010, 3, 31))), 1.0)
+
+    #NOTE: a lookback longer than our history clamps every window to its start
+    clamped = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    closes = pandas.concat([asset.prices() for asset in sorted(clamped)], axis=1)
+    returns = closes.astype(float).pct_change()
+    covariance = clamped.windowed_covariance(5000)
+    for date in [datetime(2004, 6, 30), datetime(2003, 6, 30), datetime(2003, 3, 31), datetime(2005, 1, 3)]:
+        expected = 252 * returns[returns.index <= date].cov().values
+        assert numpy.allclose(covariance.on(date), expected, rtol=1e-9, atol=1e-12)
+
+def test_exponential_covariance():
+    """ Tests the exponentially weighted covariance against pandas, moving both forward and back in time """
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "GSG"])
+    spy, gsg = sorted(universe, reverse=True)
+    spy_returns = spy.prices(gsg.begin()).pct_change().iloc[1:]
+    gsg_returns = gsg.prices().pct_change().iloc[1:]
+    expected = 252 * pandas.ewmcov(spy_returns, gsg_returns, halflife=20, adjust=False, bias=True)
+
+    covariance = universe.exponential_covariance(20)
+    for date in [datetime(2008, 10, 31), datetime(2012, 12, 31), datetime(2007, 6, 29), datetime(2007, 3, 30)]:
+        assert is_close(covariance.on(date)[0, 1], expected[date])
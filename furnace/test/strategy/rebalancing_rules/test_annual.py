@@ -81,3 +81,28 @@ def test_empty_when_zero_days():
     rule = strategy.AnnualRebalance(CALENDAR)
     periods = list(rule.periods_during(begin, end))
     assert len(periods) == 0
+
+def test_boundaries():
+    """ Tests that the annual rule's period boundaries are the calendar ordinals of the first trading day on or after
+    each anniversary of begin """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    rule = strategy.AnnualRebalance(CALENDAR)
+    begins, ends = rule.boundaries_during(begin, end)
+
+    assert len(begins) == 9
+    assert CALENDAR.dates_at(begins[0]) == begin
+    assert CALENDAR.dates_at(ends[-1]) == datetime(2012, 1, 3)
+    assert (begins[1:] == ends[:-1]).all()
+
+def test_leap_day():
+    """ Tests that, like the calendar rule it replaced, an annual rule begun on a leap day only rebalances on leap
+    years """
+    rule = strategy.AnnualRebalance(CALENDAR)
+    periods = list(rule.periods_during(datetime(2004, 2, 29), datetime(2012, 12, 31)))
+
+    assert [(period.begin(), period.end()) for period in periods] == [
+        (datetime(2004, 3, 1), datetime(2008, 2, 29)),
+        (datetime(2008, 2, 29), datetime(2012, 2, 29))
+    ]
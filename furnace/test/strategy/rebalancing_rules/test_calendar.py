@@ -0,0 +1,82 @@
+" Tests behavior of the calendar rebalancing rules "
+
+from datetime import datetime
+from furnace import strategy
+from furnace.test.helpers import is_close, compound_growth, CALENDAR, DEFAULT_ASSET_FACTORY
+
+def rebalance_dates(rule, begin, end):
+    """ Helper that returns the dates a rule rebalances on, not counting begin """
+    return [period.begin() for period in rule.periods_during(begin, end)][1:]
+
+def test_first_of_month():
+    """ Tests that the monthly rule rebalances on the first trading day of each month, skipping holidays. January
+    2nd 2012 was new years day observed """
+    rule = strategy.CalendarRebalance(CALENDAR, "monthly")
+
+    assert rebalance_dates(rule, datetime(2011, 11, 15), datetime(2012, 3, 15)) == [
+        datetime(2011, 12, 1), datetime(2012, 1, 3), datetime(2012, 2, 1), datetime(2012, 3, 1)
+    ]
+
+def test_last_of_month():
+    """ Tests that the monthly rule can rebalance on the last trading day of each month """
+    rule = strategy.CalendarRebalance(CALENDAR, "monthly", -1)
+
+    #march 30th 2012 was a friday
+    assert rebalance_dates(rule, datetime(2012, 1, 3), datetime(2012, 4, 16)) == [
+        datetime(2012, 1, 31), datetime(2012, 2, 29), datetime(2012, 3, 30)
+    ]
+
+def test_nth_of_month():
+    """ Tests that the monthly rule can rebalance on the nth trading day of each month """
+    rule = strategy.CalendarRebalance(CALENDAR, "monthly", 2)
+
+    assert rebalance_dates(rule, datetime(2012, 1, 3), datetime(2012, 3, 15)) == [
+        datetime(2012, 1, 5), datetime(2012, 2, 3), datetime(2012, 3, 5)
+    ]
+
+def test_weekly():
+    """ Tests that the weekly rule rebalances on the first trading day of the week, tuesday after a monday
+    holiday """
+    rule = strategy.CalendarRebalance(CALENDAR, "weekly")
+
+    assert rebalance_dates(rule, datetime(2012, 1, 4), datetime(2012, 1, 25)) == [
+        datetime(2012, 1, 9), datetime(2012, 1, 17), datetime(2012, 1, 23)
+    ]
+
+def test_last_of_quarter():
+    """ Tests that the quarterly rule can rebalance on the last trading day of each quarter """
+    rule = strategy.CalendarRebalance(CALENDAR, "quarterly", -1)
+
+    assert rebalance_dates(rule, datetime(2011, 1, 3), datetime(2011, 12, 15)) == [
+        datetime(2011, 3, 31), datetime(2011, 6, 30), datetime(2011, 9, 30)
+    ]
+
+def test_stubs():
+    """ Tests that the calendar rules truncate their first and last periods to begin and end """
+    rule = strategy.CalendarRebalance(CALENDAR, "monthly")
+    periods = list(rule.periods_during(datetime(2012, 1, 17), datetime(2012, 3, 15)))
+
+    assert periods[0].begin() == datetime(2012, 1, 17)
+    assert periods[0].end() == datetime(2012, 2, 1)
+    assert periods[-1].begin() == datetime(2012, 3, 1)
+    assert periods[-1].end() == datetime(2012, 3, 15)
+
+def test_empty_when_zero_days():
+    """ Tests that the calendar rules are empty when begin and end are the same """
+    rule = strategy.CalendarRebalance(CALENDAR, "monthly")
+    assert len(list(rule.periods_during(datetime(2012, 1, 3), datetime(2012, 1, 3)))) == 0
+
+def test_monthly_multi_asset():
+    """ Tests that a monthly rebalanced portfolio compounds the buy and hold performance of each of its months """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    monthly = strategy.monthly_rebalance_multi_asset(universe, CALENDAR, {"SPY": .8, "LQD": .2})
+
+    months = [datetime(2012, 1, 17), datetime(2012, 2, 1), datetime(2012, 3, 1), datetime(2012, 3, 15)]
+    def get_buy_and_hold_growth(begin, end):
+        """ Helper to get buy and hold strategy growth over a period """
+        strat = strategy.buy_and_hold_stocks_and_bonds(universe, begin, end, CALENDAR)
+        return strat.performance_during(begin, end).total_return()
+
+    growths = [get_buy_and_hold_growth(begin, end) for begin, end in zip(months[:-1], months[1:])]
+
+    assert is_close(monthly.performance_during(months[0], months[-1]).total_return(), compound_growth(*growths))
@@ -0,0 +1,46 @@
+" Tests behavior of the drift band rebalancing rule "
+
+from datetime import datetime
+from furnace import strategy, portfolio
+from furnace.test.helpers import CALENDAR, DEFAULT_ASSET_FACTORY
+
+def test_rebalances_out_of_band():
+    """ Tests that the drift band rule rebalances on exactly the days a day by day simulation of weights drifts out of
+    band """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+    band = 0.05
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    weightings = portfolio.Weightings([portfolio.Weighting(universe["SPY"], .6),
+                                       portfolio.Weighting(universe["LQD"], .4)])
+    rule = strategy.DriftBandRebalance(CALENDAR, weightings, band)
+    rebalances = [period.begin() for period in rule.periods_during(begin, end)][1:]
+
+    spy = universe["SPY"].prices(begin, end)
+    lqd = universe["LQD"].prices(begin, end)
+    expected = []
+    spy_held, lqd_held = .6 / spy[0], .4 / lqd[0]
+    for date in spy.index[1:]:
+        spy_weight = spy_held * spy[date] / (spy_held * spy[date] + lqd_held * lqd[date])
+        if abs(spy_weight - .6) > band:
+            expected.append(date)
+            value = spy_held * spy[date] + lqd_held * lqd[date]
+            spy_held, lqd_held = .6 * value / spy[date], .4 * value / lqd[date]
+
+    assert len(rebalances) > 0
+    assert rebalances == [date for date in expected if date < end]
+
+def test_fewer_trades():
+    """ Tests that banded rebalancing trades far less than the benchmark's rebalance every 7 trading days """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2006, 12, 29)
+    weights = {"SPY": .18, "LQD": .82}
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    banded = strategy.drift_band_rebalance_multi_asset(universe, CALENDAR, weights, 0.05)
+    scheduled = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, weights, 7)
+
+    banded_perf = banded.performance_during(begin, end)
+    assert banded_perf.end() == end
+    assert banded_perf.number_of_trades() * 10 < scheduled.performance_during(begin, end).number_of_trades()
@@ -95,3 +95,18 @@ def test_correct_num_days():
         for period
         in periods
     )
+
+def test_boundaries():
+    """ Tests that the nday rule's period boundaries are calendar ordinals n trading days apart that line up with the
+    periods it makes """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    rule = strategy.NDayRebalance(CALENDAR, 25)
+    begins, ends = rule.boundaries_during(begin, end)
+    periods = list(rule.periods_during(begin, end))
+
+    assert ((ends - begins) == 25).all()
+    assert (begins[1:] == ends[:-1]).all()
+    assert list(CALENDAR.dates_at(begins)) == [period.begin() for period in periods]
+    assert list(CALENDAR.dates_at(ends)) == [period.end() for period in periods]
@@ -36,3 +36,25 @@ def test_stocks_bonds_growth_by():
     assert is_close(performance_.growth_by(datetime(2003, 2, 3)), -0.0396)
     assert is_close(performance_.growth_by(datetime(2004, 1, 2)), 0.2144)
     assert is_close(performance_.growth_by(end), 0.903)
+
+def test_boundaries_off_trading_days():
+    """ Tests a buy and hold running between non trading days holds from the first trading day on or after begin to
+    the last on or before end """
+    rule = strategy.BuyAndHold(datetime(2003, 1, 1), datetime(2012, 12, 29), CALENDAR)
+
+    begins, ends = rule.boundaries_during(datetime(2003, 1, 1), datetime(2012, 12, 29))
+
+    assert list(CALENDAR.dates_at(begins)) == [datetime(2003, 1, 2)]
+    assert list(CALENDAR.dates_at(ends)) == [datetime(2012, 12, 28)]
+
+def test_periods_off_trading_days():
+    """ Tests a buy and hold's period agrees with its boundaries when it ends on a weekend """
+    begin = datetime(2012, 1, 3)
+    end = datetime(2012, 12, 29)
+    rule = strategy.BuyAndHold(begin, end, CALENDAR)
+
+    periods = list(rule.periods_during(begin, end))
+    _, ends = rule.boundaries_during(begin, end)
+
+    assert [(period.begin(), period.end()) for period in periods] == [(begin, datetime(2012, 12, 28))]
+    assert list(CALENDAR.dates_at(ends)) == [periods[0].end()]
@@ -0,0 +1,53 @@
+""" Tests sweeps of a strategy over sliding start dates """
+
+import numpy
+from datetime import datetime
+from furnace import strategy
+from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
+
+def test_union_boundaries():
+    """ Tests boundaries are grouped with those they line up with """
+    groups = strategy.union_boundaries({
+        0: numpy.array([10, 15, 20]),
+        5: numpy.array([15, 20, 25]),
+        2: numpy.array([12, 17, 22]),
+        7: numpy.array([17, 21])
+    })
+
+    assert [keys for _, keys in groups] == [[0, 5], [2], [7]]
+    assert list(groups[0][0]) == [10, 15, 20, 25]
+
+def test_sliding_metrics():
+    """ Tests sliding start dates match backtests from each start """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    strat = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": .2, "LQD": .8}, 25)
+    begin = datetime(2003, 1, 2)
+    end = datetime(2005, 12, 30)
+
+    metrics = strat.sliding_metrics(begin, end, [0, 5, 25, 30])
+
+    assert list(metrics.index) == [0, 5, 25, 30]
+    for offset in (5, 25):
+        perf = strat.performance_during(CALENDAR.nth_trading_day_after(offset, begin),
+                                        CALENDAR.nth_trading_day_after(offset, end))
+        assert metrics.ix[offset, "begin"] == perf.begin()
+        assert metrics.ix[offset, "end"] == perf.end()
+        assert is_close(metrics.ix[offset, "cagr"], perf.cagr())
+        assert is_close(metrics.ix[offset, "volatility"], perf.volatility())
+        assert is_close(metrics.ix[offset, "simple_sharpe"], perf.simple_sharpe())
+        assert is_close(metrics.ix[offset, "max_drawdown"], perf.max_drawdown())
+        assert metrics.ix[offset, "number_of_trades"] == perf.number_of_trades()
+
+def test_sliding_trades_single_asset():
+    """ Tests each window counts its own opening purchase, even where the sweep held through that date """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY"])
+    strat = strategy.ndays_rebalance_single_asset(universe, CALENDAR, "SPY", 25)
+    begin = datetime(2003, 1, 2)
+    end = datetime(2004, 12, 31)
+
+    metrics = strat.sliding_metrics(begin, end, [0, 10, 25])
+
+    for offset in (0, 10, 25):
+        perf = strat.performance_during(CALENDAR.nth_trading_day_after(offset, begin),
+                                        CALENDAR.nth_trading_day_after(offset, end))
+        assert metrics.ix[offset, "number_of_trades"] == perf.number_of_trades()
@@ -0,0 +1,51 @@
+""" Tests evaluating many static mixes at once """
+
+import numpy
+from datetime import datetime
+from furnace import strategy
+from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
+
+def test_mix_grid():
+    """ Tests grids of mixes cover the simplex """
+    mixes = strategy.mix_grid(["SPY", "LQD", "GSG"], 4)
+
+    assert mixes.shape == (15, 3)
+    assert numpy.allclose(mixes.sum(axis=1), 1.0)
+    assert len(set(map(tuple, mixes))) == 15
+    assert list(strategy.mix_grid(["SPY", "LQD"], 30)[6]) == [0.2, 0.8]
+
+def test_static_mix_metrics():
+    """ Tests mixes match their backtests under n day and calendar rebalances """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+    mixes = strategy.mix_grid(["SPY", "LQD"], 10)
+
+    ndays = strategy.static_mix_metrics(universe, strategy.NDayRebalance(CALENDAR, 25), ["SPY", "LQD"], mixes,
+                                        begin, end)
+    monthly = strategy.static_mix_metrics(universe, strategy.CalendarRebalance(CALENDAR, "monthly"), ["SPY", "LQD"],
+                                          mixes, begin, end)
+
+    for row in (2, 8):
+        weights = {"SPY": mixes[row, 0], "LQD": mixes[row, 1]}
+        for metrics, strat in ((ndays, strategy.ndays_rebalance_multi_asset(universe, CALENDAR, weights, 25)),
+                               (monthly, strategy.monthly_rebalance_multi_asset(universe, CALENDAR, weights))):
+            perf = strat.performance_during(begin, end)
+            assert is_close(metrics["SPY"][row], weights["SPY"])
+            assert is_close(metrics["cagr"][row], perf.cagr())
+            assert is_close(metrics["volatility"][row], perf.volatility())
+            assert is_close(metrics["max_drawdown"][row], perf.max_drawdown())
+
+def test_static_mix_returns():
+    """ Tests mix returns line up with a backtest's daily returns """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    begin = datetime(2005, 1, 3)
+    end = datetime(2006, 12, 29)
+
+    returns = strategy.static_mix_returns(universe, strategy.NDayRebalance(CALENDAR, 25), ["SPY", "LQD"],
+                                          [[0.2, 0.8]], begin, end)
+    perf = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": .2, "LQD": .8}, 25).performance_during(
+        begin, end)
+
+    assert returns.shape == (1, len(perf.daily_returns()))
+    assert numpy.allclose(returns[0], perf.daily_returns())
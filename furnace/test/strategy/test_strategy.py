@@ -150,3 +150,15 @@ def test_linear_mix():
 def test_arma():
     """ An attempt to use an arma model """
     pass
+
+def test_risk_parity():
+    """ Regression test of risk parity over the candidate production universe. Short term treasuries carry so little
+    risk that they dominate the portfolio """
+    begin = datetime(2008, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD", "IYR", "GSG", "UUP", "SHV"])
+    perf = strategy.risk_parity_multi_asset(universe, CALENDAR, 25).performance_during(begin, end)
+
+    assert is_close(perf.cagr(), 0.00685)
+    assert is_close(perf.simple_sharpe(), 0.6782)
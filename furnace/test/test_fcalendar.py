@@ -54,6 +54,17 @@ def test_before():
     assert CALENDAR.nth_trading_day_before(0, date(2006, 7, 7)) == date(2006, 7, 7)
     assert CALENDAR.nth_trading_day_before(0, date(2006, 7, 8)) == date(2006, 7, 7)
 
+def test_resampled():
+    """ Tests resampled calendars keep the last trading day of each week """
+    date = datetime.datetime
+    weekly = CALENDAR.resampled("weekly")
+
+    #july forth week ends on a friday, thanksgiving week on a friday half day
+    assert date(2006, 7, 7) in weekly
+    assert date(2006, 7, 6) not in weekly
+    assert weekly.nth_trading_day_after(0, date(2006, 11, 20)) == date(2006, 11, 24)
+    assert weekly.number_trading_days_between(date(2006, 1, 1), date(2006, 12, 31)) == 52
+
 def test_range():
     """ Tests that the range of the calendar covers the same range as the data """
     begin_date = datetime.datetime(2000, 1, 1)
@@ -0,0 +1,64 @@
+""" Tests classes and functions in the features module """
+
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import numpy
+from furnace.data import features
+from furnace.test.helpers import is_close, DEFAULT_ASSET_FACTORY
+
+def test_features():
+    """ Tests features against hand rolled versions on a single date """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    store = features.FeatureStore()
+    date = datetime(2012, 12, 31)
+    closes = spy.prices(datetime(2012, 1, 1), date)
+
+    assert is_close(store.feature(spy, ("growth", 25, 5))[date], closes.iloc[-6] / closes.iloc[-31] - 1.0)
+    assert is_close(store.feature(spy, ("percent_above", 25))[date], closes.iloc[-1] / closes.iloc[-25:].mean() - 1.0)
+    assert is_close(store.feature(spy, ("percent_above", 25, 5))[date],
+                    closes.iloc[-5:].mean() / closes.iloc[-25:].mean() - 1.0)
+    assert store.feature(spy, ("above", 25, 5))[date] == (store.feature(spy, ("percent_above", 25, 5))[date] > 0.0)
+
+    changes = closes.diff().iloc[-14:]
+    relative_strength = changes.clip(lower=0.0).sum() / -changes.clip(upper=0.0).sum()
+    assert is_close(store.feature(spy, ("rsi", 14))[date], 100.0 - 100.0 / (1.0 + relative_strength))
+
+    ibs = store.feature(spy, ("ibs",)).dropna()
+    assert ((ibs >= 0.0) & (ibs <= 1.0)).all()
+
+    specs = [("growth", 1), ("ibs",), ("rsi", 14)]
+    matrix = store.features_on(spy, specs, [datetime(2012, 12, 28), date])
+    assert matrix.shape == (2, 3)
+    assert numpy.allclose(matrix[-1], [store.feature(spy, spec)[date] for spec in specs])
+    assert list(store.features(spy, specs).columns) == ["growth_1", "ibs", "rsi_14"]
+
+def test_ibs_flat_days():
+    """ Tests days whose high equals their low have no internal bar strength rather than an infinite one """
+
+    iyr = DEFAULT_ASSET_FACTORY.make_asset("IYR")
+    ibs = features.ibs(iyr)
+    flat = (iyr.prices(column="High") == iyr.prices(column="Low")).values
+
+    assert flat.any()
+    assert numpy.isnan(ibs.values[flat]).all()
+    assert not numpy.isinf(ibs.values).any()
+
+def test_feature_store_cache():
+    """ Tests that features are computed once, then served from memory or from disk """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    directory = tempfile.mkdtemp()
+    try:
+        store = features.make_feature_store(directory)
+        feature = store.feature(spy, ("rsi", 14))
+        assert store.feature(spy, ("rsi", 14)) is feature
+        assert os.path.exists(os.path.join(directory, "SPY_rsi_14.pickle"))
+
+        reloaded = features.FeatureStore(directory).feature(spy, ("rsi", 14))
+        assert reloaded is not feature
+        assert reloaded.equals(feature)
+    finally:
+        shutil.rmtree(directory)
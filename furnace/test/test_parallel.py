@@ -0,0 +1,15 @@
+""" Tests running work across forked processes """
+
+from furnace import parallel
+
+def test_map_forked():
+    """ Tests closures map in order whether or not they're run in a pool """
+    offset = 10
+
+    def shifted(item):
+        """ A closure, which couldn't be pickled """
+        return item + offset
+
+    assert parallel.map_forked(shifted, range(5), processes=1) == range(10, 15)
+    assert parallel.map_forked(shifted, range(5), processes=2) == range(10, 15)
+    assert parallel.map_forked(shifted, [], processes=2) == []
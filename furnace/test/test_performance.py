@@ -4,6 +4,7 @@ from datetime import datetime
 from furnace import strategy
 from furnace.test.helpers import make_default_asset_factory, is_close, CALENDAR, DEFAULT_ASSET_FACTORY
 from furnace import performance
+import numpy
 
 
 #TODO: mentioned elsewhere, but i really just need a single set of canned fake performance data that have
@@ -89,8 +90,10 @@ def test_number_of_trades_buyhold():
     buy_and_hold_perf = buy_and_hold.performance_during(begin, end)
 
     assert buy_and_hold_perf.number_of_trades() == 2
-    #TODO: grab the trade table here and assert that the first trade is on begin and the last trade is on
-    #end
+
+    ledger = buy_and_hold_perf.trade_ledger()
+    assert list(ledger.ordinals()) == [begin.toordinal(), end.toordinal()]
+    assert ledger.basis_deltas()[0] == -ledger.basis_deltas()[1]
 
 def test_number_of_trades_ndaily():
     """ Regression test of a more aggressive rebalancing rule regarding number of trades """
@@ -118,6 +121,60 @@ def test_number_of_trades_yearly():
 
     assert rebalance_perf.number_of_trades() == 8
 
+def test_trade_ledger_yearly():
+    """ Tests the trades recorded for a yearly rebalance of 80% spy and 20% lqd over three years. We buy in, make
+    two rebalances and sell out, trading both assets each time """
+
+    begin = datetime(2003, 1, 2)
+    end = datetime(2006, 1, 3)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    rebalance = strategy.yearly_rebalance_multi_asset(universe, CALENDAR, {"SPY": .8, "LQD": .2})
+
+    ledger = rebalance.performance_during(begin, end).trade_ledger()
+    ordinals, trades = ledger.trades_by_day()
+
+    assert sorted(ledger.symbols()) == ["LQD", "SPY"]
+    assert list(ordinals) == [date.toordinal() for date in
+                              [begin, datetime(2004, 1, 2), datetime(2005, 1, 3), end]]
+    assert list(trades) == [2, 2, 2, 2]
+
+    #we buy in to the index at 1.0 and sell out at the total return
+    assert is_close(ledger.notionals()[:2].sum(), 1.0)
+    assert is_close(-ledger.notionals()[-2:].sum(), 1.0 + rebalance.performance_during(begin, end).total_return())
+
+def test_trade_ledger_rebalance_many():
+    """ Tests recording many rebalances at once matches recording them one at a time, skipping those that leave our
+    holdings where they were """
+    dates = [datetime(2004, 1, 2), datetime(2004, 2, 2), datetime(2004, 3, 1)]
+    bases = numpy.array([[0.5, 0.25], [0.5, 0.25], [0.25, 0.5]])
+    prices = numpy.array([[1.0, 2.0], [1.1, 2.1], [1.2, 2.2]])
+
+    one_at_a_time = performance.TradeLedger()
+    for date, basis, price in zip(dates, bases, prices):
+        one_at_a_time.rebalance(date, ["SPY", "LQD"], basis, price)
+    at_once = performance.TradeLedger()
+    at_once.rebalance_many(dates, ["SPY", "LQD"], bases, prices)
+
+    assert len(at_once) == len(one_at_a_time) == 4
+    assert list(at_once.ordinals()) == list(one_at_a_time.ordinals())
+    assert numpy.allclose(at_once.notionals(), one_at_a_time.notionals())
+    at_once.liquidate(datetime(2004, 4, 1), ["SPY", "LQD"], prices[-1])
+    assert numpy.allclose(at_once.basis_deltas()[-2:], [-0.25, -0.5])
+
+def test_turnover():
+    """ Tests that turnover is zero when we never rebalance, and grows as we rebalance more often """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    buy_and_hold = strategy.buy_and_hold_stocks_and_bonds(universe, begin, end, CALENDAR)
+    yearly = strategy.yearly_rebalance_multi_asset(universe, CALENDAR, {"SPY": .8, "LQD": .2})
+    monthly = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": .8, "LQD": .2}, 25)
+
+    assert buy_and_hold.performance_during(begin, end).turnover() == 0.0
+    assert 0.0 < yearly.performance_during(begin, end).turnover() < monthly.performance_during(begin, end).turnover()
+
 def test_actual_performance():
     """ Test that actual performance of 100,000 in  mixed stocks and bonds portfolio, 80% stocks 20%
     stocks, is X after comissions of 7 dollars a trade are taken into account """
@@ -181,3 +238,147 @@ def test_actual_performance_2years():
     calculated_principle -= comissions * 2
 
     assert is_close(rebalance_perf.growth_curve(principle, comissions).ix[-1], calculated_principle)
+
+def test_compact():
+    """ Tests that a compact performance agrees with the full performance it came from, including the per asset
+    detail it rebuilds """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    rebalanced = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": .8, "LQD": .2}, 25)
+
+    full = rebalanced.performance_during(begin, end)
+    compact = rebalanced.performance_during(begin, end, compact=True)
+
+    assert compact.begin() == full.begin()
+    assert compact.end() == full.end()
+    assert is_close(compact.cagr(), full.cagr())
+    assert is_close(compact.simple_sharpe(), full.simple_sharpe())
+    assert is_close(compact.growth_by(datetime(2005, 1, 3)), full.growth_by(datetime(2005, 1, 3)))
+    assert compact.number_of_trades() == full.number_of_trades()
+    assert is_close(compact.trade_ledger().notionals(), full.trade_ledger().notionals()).all()
+    assert is_close(compact.turnover(), full.turnover())
+
+    #NOTE: compacting mustn't touch the ledger of the performance it summarizes
+    compacted = full.compact()
+    assert compacted.trade_ledger() is not full.trade_ledger()
+    assert list(compacted.trade_ledger().ordinals()) == list(full.trade_ledger().ordinals())
+
+    details = compact.details()
+    assert is_close(details["SPY_Basis"], full._table["SPY_Basis"]).all() #pylint: disable=W0212
+    assert is_close(details["index"], full._table["index"]).all() #pylint: disable=W0212
+
+def test_batch_metrics():
+    """ Tests that metrics computed in a batch agree with those computed one performance at a time, even when the
+    performances differ in length """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    rebalanced = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": .8, "LQD": .2}, 25)
+
+    performances = [
+        rebalanced.performance_during(datetime(2003, 1, 2), datetime(2012, 12, 31)),
+        rebalanced.performance_during(datetime(2004, 1, 2), datetime(2008, 12, 31), compact=True)
+    ]
+    metrics = performance.batch_metrics(performances)
+
+    for row, performance_ in enumerate(performances):
+        assert is_close(metrics["cagr"][row], performance_.cagr())
+        assert is_close(metrics["volatility"][row], performance_.volatility())
+        assert is_close(metrics["simple_sharpe"][row], performance_.simple_sharpe())
+        assert is_close(metrics["turnover"][row], performance_.turnover())
+        assert metrics["number_of_trades"][row] == performance_.number_of_trades()
+
+    #the long performance sits through the 2008 crash, the short one only its beginning
+    assert metrics["max_drawdown"][0] > metrics["max_drawdown"][1] > 0.0
+
+    returns_only = performance.batch_metrics(numpy.vstack([performances[0].daily_returns()] * 3))
+    assert is_close(returns_only["cagr"], metrics["cagr"][0]).all()
+    assert numpy.isnan(returns_only["turnover"]).all()
+
+def test_drawdown():
+    """ Regression test of max drawdown and its duration for buy and hold spy through the 2008 crash, checking that
+    a drawdown tracker fed one day at a time agrees """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY"])
+    performance_ = strategy.buy_and_hold_stocks(universe, begin, end, CALENDAR).performance_during(begin, end)
+
+    assert is_close(performance_.max_drawdown(), 0.5519)
+    assert performance_.drawdown_duration() == 1223
+
+    tracker = performance.DrawdownTracker()
+    for daily_return in performance_.daily_returns():
+        tracker.update(daily_return)
+
+    assert is_close(tracker.max_drawdown(), performance_.max_drawdown())
+    assert tracker.longest_duration() == performance_.drawdown_duration()
+
+def test_rolling_risk():
+    """ Tests rolling volatility and simple sharpe against windowed calculations, both over a whole performance and
+    one day at a time """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2006, 12, 29)
+    window = 25
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    performance_ = strategy.buy_and_hold_stocks_and_bonds(universe, begin, end, CALENDAR).performance_during(begin, end)
+
+    volatilities = performance_.rolling_volatility(window)
+    sharpes = performance_.rolling_sharpe(window)
+    returns = performance_.daily_returns()
+
+    assert numpy.isnan(volatilities[:window - 1]).all()
+    assert is_close(volatilities[-1], numpy.sqrt(252.0 * returns[-window:].var(ddof=1)))
+
+    risk = performance.RollingRisk(window)
+    for daily_return in returns:
+        risk.update(daily_return)
+    assert is_close(risk.volatility(), volatilities[-1])
+    assert is_close(risk.simple_sharpe(), sharpes[-1])
+
+def test_live_performance():
+    """ Tests that carrying a backtest on day by day, rebalancing on the same schedule, ends up where a backtest over
+    the whole period does """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2012, 12, 31)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    weights = {"SPY": .2, "LQD": .8}
+    rebalanced = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, weights, 25)
+
+    full = rebalanced.performance_during(begin, end)
+    backtest = rebalanced.performance_during(begin, datetime(2010, 12, 31))
+    live = performance.make_live_performance(backtest)
+
+    days = [day for day in CALENDAR.every_nth_between(backtest.end(), full.end(), 1)[1:] if day <= full.end()]
+    for day_number, day in enumerate(days, 1):
+        live.append_day(day, dict((symbol, universe[symbol].prices(day, day)[0]) for symbol in weights))
+        if day_number % 25 == 0:
+            live.rebalance(day, weights)
+
+    assert live.end() == full.end()
+    assert is_close(live.total_return(), full.total_return())
+    assert is_close(live.volatility(), full.volatility())
+    assert is_close(live.max_drawdown(), full.max_drawdown())
+    assert is_close(live.rolling_volatility(), full.rolling_volatility(25)[-1])
+    assert live.number_of_trades() == full.number_of_trades()
+
+def test_live_metrics_undefined():
+    """ Tests live metrics are nan rather than an error or a division by zero until there are enough days of returns
+    to define them """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    days = [datetime(2012, 12, 26), datetime(2012, 12, 27), datetime(2012, 12, 28)]
+    prices = [dict((symbol, universe[symbol].prices(day, day)[0]) for symbol in ("SPY", "LQD"))
+              for day in days]
+
+    live = performance.open_live_performance(days[0], {"SPY": .5, "LQD": .5}, prices[0])
+    assert numpy.isnan(live.volatility())
+    assert numpy.isnan(live.cagr())
+    assert numpy.isnan(live.expected_return())
+    live.append_day(days[1], prices[1])
+    assert numpy.isnan(live.volatility())
+    assert numpy.isfinite(live.cagr())
+    assert numpy.isfinite(live.expected_return())
+    live.append_day(days[2], prices[2])
+    assert numpy.isfinite(live.volatility())
@@ -1,8 +1,9 @@
 """ Tests classes and functions in the portfolio module """
 
 from datetime import datetime
+import numpy
 from furnace import portfolio
-from furnace.test.helpers import is_close, DEFAULT_ASSET_FACTORY
+from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
 from furnace import weathermen
 
 def test_index_total_return_spy():
@@ -84,3 +85,78 @@ def test_proportional_weighting():
     optimal_weightings = portfolio.Weightings([portfolio.Weighting(spy, .302), portfolio.Weighting(lqd, .698)])
 
     assert optimal_weightings == weightings
+
+def test_proportional_weighting_many():
+    """ Tests that batch proportional and anti proportional weightings agree with weighting one date at a time """
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD", "GSG"])
+    dates = [datetime(2008, 10, 31), datetime(2010, 3, 31), datetime(2012, 12, 31)]
+    panel = weathermen.period_average(CALENDAR).forecast_many(universe, dates, 25)
+
+    for portfolio_opt in [portfolio.ProportionalWeighting(universe),
+                          portfolio.AntiProportionalWeighting(["SPY", "LQD", "GSG"])]:
+        weightings = portfolio_opt.optimize_many(panel, DEFAULT_ASSET_FACTORY)
+        assert len(weightings) == len(dates)
+        for date, weighting in zip(dates, weightings):
+            assert weighting == portfolio_opt.optimize(panel.on(date), DEFAULT_ASSET_FACTORY)
+
+    #NOTE: rows without a positive sharpe fall back to equal weights
+    weights = portfolio.proportional_weights(numpy.array([[1.0, 3.0], [-1.0, -2.0]]))
+    assert numpy.allclose(weights, [[.25, .75], [.5, .5]])
+    assert numpy.allclose(portfolio.anti_proportional_weights(numpy.array([[1.0, 3.0]])), [[.75, .25]])
+
+def test_mean_variance():
+    """ Tests mean variance weights against their optimality conditions, and that warm starts land on the same
+    solutions as cold starts """
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD", "GSG", "UUP"])
+    dates = [datetime(2010, 3, 31), datetime(2010, 4, 1), datetime(2012, 12, 31)]
+    panel = weathermen.period_average(CALENDAR).forecast_many(universe, dates, 25)
+    covariance = universe.windowed_covariance(60)
+
+    for risk_aversion in [2.0, 20.0]:
+        weightings = portfolio.MeanVariance(universe, risk_aversion).optimize_many(panel, universe)
+        for row, (date, weighting) in enumerate(zip(dates, weightings)):
+            weights = numpy.array([each.weight() for each in weighting])
+            assert numpy.isclose(weights.sum(), 1.0) and (weights >= 0.0).all()
+
+            #NOTE: held assets share the best marginal utility, no other asset offers more
+            utilities = panel.cagrs()[row] - risk_aversion * covariance.on(date).dot(weights)
+            held = weights > 1e-6
+            assert numpy.allclose(utilities[held], utilities[held].max(), atol=1e-6)
+            assert utilities.max() <= utilities[held].max() + 1e-6
+
+            assert weighting == portfolio.MeanVariance(universe, risk_aversion).optimize(panel.on(date), universe)
+
+    minimum = portfolio.MinimumVariance(universe).optimize_many(panel, universe)[-1]
+    weights = numpy.array([each.weight() for each in minimum])
+    matrix = covariance.on(dates[-1])
+    for _ in xrange(200):
+        trial = portfolio.project_to_simplex(numpy.random.uniform(-1.0, 2.0, len(weights)))
+        assert weights.dot(matrix).dot(weights) <= trial.dot(matrix).dot(trial) + 1e-12
+
+def test_risk_parity():
+    """ Tests that risk parity weights have every asset contributing equally to portfolio variance, solving many
+    dates at once """
+
+    covariances = numpy.array([numpy.diag([.04, .01, .0025]),
+                               [[.04, .006, 0.0], [.006, .01, -.001], [0.0, -.001, .0025]]])
+    weights = portfolio.risk_parity_weights(covariances)
+    assert numpy.allclose(weights[0], numpy.array([1.0, 2.0, 4.0]) / 7.0)
+    contributions = weights * numpy.einsum('dij,dj->di', covariances, weights)
+    assert numpy.allclose(contributions / contributions.sum(axis=1)[:, numpy.newaxis], 1.0 / 3.0)
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD", "GSG", "UUP"])
+    dates = [datetime(2010, 3, 31), datetime(2011, 6, 30), datetime(2012, 12, 31)]
+    panel = weathermen.period_average(CALENDAR).forecast_many(universe, dates, 25)
+    assert panel.covariances().shape == (3, 4, 4)
+
+    weightings = portfolio.RiskParity(universe).optimize_many(panel, universe)
+    for row, weighting in enumerate(weightings):
+        weights = numpy.array([each.weight() for each in weighting])
+        contributions = weights * panel.covariances()[row].dot(weights)
+        assert numpy.allclose(contributions, contributions.mean())
+
+    optimizer = portfolio.RiskParity(universe, 60)
+    for date, weighting in zip(dates, optimizer.optimize_many(panel, universe)):
+        assert weighting == optimizer.optimize(panel.on(date), universe)
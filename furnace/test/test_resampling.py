@@ -0,0 +1,42 @@
+""" Tests resampling of strategy returns """
+
+import numpy
+from datetime import datetime
+from furnace import strategy, resampling
+from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
+
+def test_stationary_bootstrap_indices():
+    """ Tests bootstrapped paths are made of blocks walking forward through the days """
+    indices = resampling.stationary_bootstrap_indices(10, 1000, 5.0, numpy.random.RandomState(0))
+    steps = (indices[:, 1:] - indices[:, :-1]) % 10
+
+    assert indices.shape == (1000, 10)
+    assert indices.min() == 0 and indices.max() == 9
+
+    #NOTE: a new block starts on a step that isn't 1 or, one time in ten, happens to land one past the last day
+    assert abs((steps != 1).mean() - 0.2 * 0.9) < 0.01
+
+def test_bootstrap_rotations():
+    """ With blocks longer than the returns every path is the returns rotated, which keeps their cagr """
+    returns = numpy.random.RandomState(0).normal(0.0003, 0.01, 500)
+    metrics = resampling.bootstrap(returns, paths=50, mean_block=1e12, seed=0)
+
+    assert numpy.allclose(metrics["cagr"], metrics["cagr"][0])
+    assert numpy.allclose(metrics["volatility"], metrics["volatility"][0])
+
+def test_confidence_intervals():
+    """ Regression test of confidence intervals for a stocks and bonds mix, chunked in or out of a pool """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    perf = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": .2, "LQD": .8}, 25).performance_during(
+        datetime(2003, 1, 2), datetime(2012, 12, 31))
+
+    intervals = resampling.confidence_intervals(perf.daily_returns(), paths=2000, seed=42, chunk_size=500)
+    pooled = resampling.confidence_intervals(perf.daily_returns(), paths=2000, seed=42, chunk_size=500, processes=2)
+
+    assert is_close(intervals.ix["cagr", "estimate"], perf.cagr())
+    assert is_close(intervals.ix["simple_sharpe", "estimate"], perf.simple_sharpe())
+    assert (intervals["lower"] < intervals["estimate"]).all()
+    assert (intervals["estimate"] < intervals["upper"]).all()
+    assert numpy.allclose(intervals.values, pooled.values)
+    assert is_close(intervals.ix["cagr", "lower"], 0.01393)
+    assert is_close(intervals.ix["max_drawdown", "upper"], 0.3364)
@@ -0,0 +1,86 @@
+""" Tests searches over strategy parameter grids """
+
+import timeit
+from datetime import datetime
+from furnace import strategy, search
+from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
+
+def test_grid():
+    """ Tests grids cover every combination of parameters """
+    configurations = search.grid(stock_percent=[0.2, 0.8], days=[5, 25, 125])
+
+    assert len(configurations) == 6
+    assert {"stock_percent": 0.8, "days": 25} in configurations
+
+def test_successive_halving():
+    """ Tests halving finds the optimum of a noisy score while spending most evaluations on cheap budgets """
+    configurations = search.grid(x=range(27))
+
+    def evaluate(configuration, budget):
+        """ Peaks at 20, with noise that fades as budget grows """
+        return -(configuration["x"] - 20) ** 2 + (1.0 - budget) * 10.0 * ((configuration["x"] * 7) % 3)
+
+    found = search.successive_halving(configurations, evaluate, 1.0 / 9)
+    evaluations = found.evaluations()
+
+    assert found.best() == ({"x": 20}, 0.0)
+    assert len(found) == 27 + 9 + 3
+    assert list(evaluations.groupby("rung")["budget"].first()) == [1.0 / 9, 1.0 / 3, 1.0]
+
+def test_successive_halving_strategies():
+    """ Regression test of halving over stocks and bonds mixes, scored over start offsets """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+
+    def build(universe, calendar, configuration):
+        """ A stocks and bonds mix rebalanced every days """
+        return strategy.ndays_rebalance_multi_asset(universe, calendar,
+                                                    {"SPY": configuration["stock_percent"],
+                                                     "LQD": 1.0 - configuration["stock_percent"]},
+                                                    configuration["days"])
+
+    evaluate = search.offsets_evaluator(build, universe, CALENDAR, datetime(2003, 1, 2), datetime(2004, 12, 31),
+                                        [0, 20], min_days=250)
+    found = search.successive_halving(search.grid(stock_percent=[0.2, 0.8], days=[25]), evaluate, 0.5, eta=2,
+                                      processes=2)
+    configuration, score = found.best()
+
+    assert len(found) == 3
+    assert configuration == {"stock_percent": 0.2, "days": 25}
+    assert is_close(score, 1.7951)
+
+def test_coarse_to_fine():
+    """ Regression test of screening stocks and bonds mixes on weekly bars, refining the best on daily bars """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+
+    def build(universe, calendar, configuration):
+        """ A stocks and bonds mix rebalanced every days """
+        return strategy.ndays_rebalance_multi_asset(universe, calendar,
+                                                    {"SPY": configuration["stock_percent"],
+                                                     "LQD": 1.0 - configuration["stock_percent"]},
+                                                    configuration["days"])
+
+    found = search.coarse_to_fine(build, universe, CALENDAR, search.grid(stock_percent=[0.2, 0.8], days=[25, 125]),
+                                  datetime(2003, 1, 2), datetime(2006, 12, 29), top_k=2)
+    evaluations = found.evaluations()
+    configuration, score = found.best()
+
+    assert list(evaluations["rung"]) == [0, 0, 0, 0, 1, 1]
+    assert is_close(evaluations["budget"][0], 0.20697)
+    assert configuration == {"stock_percent": 0.2, "days": 25}
+    assert is_close(score, 1.4582)
+
+def test_coarse_to_fine_cheaper():
+    """ Tests a mix rebalanced on every bar costs less to screen on weekly bars than to backtest on daily bars, as
+    compact backtests cost in the days they cover rather than in tables per period """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    weekly = CALENDAR.resampled("weekly")
+    begin, end = weekly.dates_at([weekly.ordinals_after([datetime(2003, 1, 2)])[0],
+                                  weekly.ordinals_before([datetime(2012, 12, 31)])[0]])
+    daily_mix = strategy.ndays_rebalance_multi_asset(universe, CALENDAR, {"SPY": 0.6, "LQD": 0.4}, 1)
+    weekly_mix = strategy.ndays_rebalance_multi_asset(universe.resampled(weekly), weekly, {"SPY": 0.6, "LQD": 0.4}, 1)
+
+    def cost(strategy_):
+        """ The best of a few timings of a compact backtest """
+        return min(timeit.repeat(lambda: strategy_.performance_during(begin, end, compact=True), number=1, repeat=5))
+
+    assert cost(weekly_mix) < cost(daily_mix) / 2.0
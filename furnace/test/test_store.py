@@ -0,0 +1,78 @@
+""" Tests the sweep result store """
+
+import shutil
+import tempfile
+import numpy
+import pandas
+from furnace.data import store
+from furnace.test.helpers import is_close
+
+def make_results(rows, seed):
+    """ Helper making random sweep results over stock percents and rebalance periods """
+    random_state = numpy.random.RandomState(seed)
+    return pandas.DataFrame({
+        "pct": random_state.randint(0, 5, rows) / 4.0,
+        "ndays": random_state.choice([1, 25, 125], rows),
+        "days_out": random_state.randint(1, 250, rows),
+        "sharpe": random_state.normal(size=rows)
+    })
+
+def test_group_by():
+    """ Tests group by aggregates across chunks match pandas over the whole table """
+    directory = tempfile.mkdtemp()
+    try:
+        results = store.make_result_store(directory, parameters=("pct", "ndays"), chunk_size=1000)
+        table = make_results(3500, 0)
+        table.loc[3, "sharpe"] = numpy.nan
+        for first in range(0, 3500, 700):
+            results.append(table.iloc[first:first + 700])
+
+        grouped = results.group_by(["pct", "ndays"], "sharpe")
+        expected = table.groupby(["pct", "ndays"])["sharpe"]
+
+        assert len(results) == 3500
+        assert list(grouped.index) == list(expected.mean().index)
+        assert numpy.allclose(grouped["count"], expected.count())
+        assert numpy.allclose(grouped["mean"], expected.mean())
+        assert numpy.allclose(grouped["std"], expected.std())
+        assert numpy.allclose(grouped["max"], expected.max())
+    finally:
+        shutil.rmtree(directory)
+
+def test_filters():
+    """ Tests filters skip chunks using the parameter index and survive reopening the store """
+    directory = tempfile.mkdtemp()
+    try:
+        results = store.make_result_store(directory, parameters=("pct", "ndays"), chunk_size=500)
+        results.append(make_results(500, 0).assign(ndays=25))
+        results.append(make_results(500, 1).assign(ndays=125))
+        results.flush()
+
+        reopened = store.make_result_store(directory)
+        chunks = list(reopened.chunks(["sharpe"], ndays=125))
+        by_pct = reopened.group_by("pct", "sharpe", ndays=[25])
+        table = make_results(500, 0)
+
+        assert reopened.parameters() == ["pct", "ndays"]
+        assert len(chunks) == 1 and len(chunks[0]["sharpe"]) == 500
+        assert len(reopened.read(pct=0.5)) == (reopened.read()["pct"] == 0.5).sum()
+        assert is_close(by_pct.ix[0.5, "mean"], table[table["pct"] == 0.5]["sharpe"].mean())
+    finally:
+        shutil.rmtree(directory)
+
+def test_group_by_std_offset():
+    """ Tests std stays accurate for values far from zero relative to their spread, across chunks """
+    directory = tempfile.mkdtemp()
+    try:
+        results = store.make_result_store(directory, parameters=("pct", "ndays"), chunk_size=1000)
+        table = make_results(3500, 1)
+        expected = table.groupby(["pct", "ndays"])["sharpe"].std() * 1e-3
+        table["sharpe"] = 1e8 + 1e-3 * table["sharpe"]
+        for first in range(0, 3500, 700):
+            results.append(table.iloc[first:first + 700])
+
+        grouped = results.group_by(["pct", "ndays"], "sharpe")
+
+        assert numpy.allclose(grouped["std"], expected, rtol=1e-3)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,61 @@
+""" Tests walk forward analysis """
+
+import functools
+import numpy
+from datetime import datetime
+from furnace import strategy, walkforward
+from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
+
+def test_folds():
+    """ Tests rolling and expanding folds abut and train on the right spans """
+    begin = datetime(2003, 1, 2)
+    end = datetime(2006, 12, 29)
+
+    rolling = walkforward.folds_during(CALENDAR, begin, end, 250, 125)
+    expanding = walkforward.folds_during(CALENDAR, begin, end, 250, 125, expanding=True)
+
+    assert len(rolling) == len(expanding) == 6
+    assert rolling[0].train_begin() == begin
+    assert all(fold.train_begin() == begin for fold in expanding)
+    assert all(CALENDAR.number_trading_days_between(fold.train_begin(), fold.train_end()) == 250 for fold in rolling)
+    assert all(fold.test_end() == next_fold.test_begin() for fold, next_fold in zip(rolling[:-1], rolling[1:]))
+    assert CALENDAR.number_trading_days_between(rolling[-1].test_end(), end) < 125
+
+def test_walk_forward():
+    """ A static strategy walked forward matches its backtest over the test spans, in a pool or not """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    folds = walkforward.folds_during(CALENDAR, datetime(2003, 1, 2), datetime(2007, 1, 2), 250, 250)
+
+    def builder(universe, calendar, _):
+        """ Trades the same mix on every fold """
+        return strategy.ndays_rebalance_multi_asset(universe, calendar, {"SPY": .2, "LQD": .8}, 25)
+
+    walked = walkforward.walk_forward(builder, universe, CALENDAR, folds, processes=1)
+    pooled = walkforward.walk_forward(builder, universe, CALENDAR, folds, processes=2)
+    backtest = builder(universe, CALENDAR, None).performance_during(folds[0].test_begin(), folds[-1].test_end())
+
+    assert walked.performance().begin() == folds[0].test_begin()
+    assert is_close(walked.performance().cagr(), backtest.cagr())
+    assert is_close(walked.performance().simple_sharpe(), backtest.simple_sharpe())
+    assert walked.performance().number_of_trades() == backtest.number_of_trades()
+    assert is_close(pooled.performance().cagr(), backtest.cagr())
+    assert len(walked.fold_metrics()) == len(folds)
+
+    #NOTE: stitching mustn't rescale the periods the fold performances were linked from, each pegged at 1.0
+    for fold_performance in walked.fold_performances():
+        _, basis, prices = fold_performance.positions_on(fold_performance.begin())
+        assert is_close(numpy.dot(basis, prices), 1.0)
+
+def test_best_in_sample():
+    """ Regression test of picking the best of a few mixes on each train span """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    folds = walkforward.folds_during(CALENDAR, datetime(2003, 1, 2), datetime(2008, 1, 2), 250, 250)
+    candidates = [functools.partial(strategy.ndays_rebalance_multi_asset, weights={"SPY": percent,
+                                                                                   "LQD": 1.0 - percent}, days=25)
+                  for percent in (.2, .5, .8)]
+
+    walked = walkforward.walk_forward(walkforward.best_in_sample(candidates), universe, CALENDAR, folds)
+
+    assert walked.performance().end() == folds[-1].test_end()
+    assert is_close(walked.performance().cagr(), 0.05984)
+    assert is_close(walked.performance().simple_sharpe(), 1.0873)
@@ -1,8 +1,15 @@
 """ Tests classes and functions in the weathermen module """
 
 from datetime import datetime
+import numpy
+import shutil
+import tempfile
+import warnings
+import statsmodels.api as sm
 from furnace.test.helpers import is_close, CALENDAR, DEFAULT_ASSET_FACTORY
-from furnace import weathermen
+from furnace import strategy, weathermen
+from furnace.data.asset import annualized
+from furnace.data import features
 
 def test_period_average():
     """ Tests the period average weatherman regression style. This was hand confirmed """
@@ -16,6 +23,22 @@ def test_period_average():
 
     assert is_close(forecast.cagr(spy), .152)
 
+def test_period_average_annual():
+    """ Tests period averages over an annual rule's year, which is a float of trading days, match integer periods """
+    dates = [datetime(2010, 3, 31), datetime(2012, 12, 31)]
+    period = strategy.AnnualRebalance(CALENDAR).period_length()
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    weatherman = weathermen.period_average(CALENDAR)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        panel = weatherman.forecast_many(universe, dates, period)
+        forecast = weatherman(universe, dates[-1], period)
+
+    expected = weatherman.forecast_many(universe, dates, 252)
+    assert numpy.allclose(panel.cagrs(), expected.cagrs())
+    assert is_close(forecast.cagr(universe["SPY"]), expected.on(dates[-1]).cagr(universe["SPY"]))
+
 def test_simple_autocorr():
     """ Tests a simple autocorrelation forecaster. Hand checked the actual prediction, but simply sanity
     checked behavior of the model itself """
@@ -53,3 +76,296 @@ def test_asset_specific():
     assert is_close(forecast.cagr(lqd), 0.07035)
     assert is_close(forecast.cagr(uup), 0.00251)
 
+
+def test_forecast_many():
+    """ Tests that batch forecasts agree with forecasting one date at a time """
+
+    dates = [datetime(2010, 3, 31), datetime(2011, 6, 30), datetime(2012, 12, 31)]
+    period = 25
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    lqd = DEFAULT_ASSET_FACTORY.make_asset("LQD")
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+
+    test_weathermen = [weathermen.period_average(CALENDAR),
+                       weathermen.historical_average(),
+                       weathermen.asset_specific({spy: weathermen.simple_linear(CALENDAR, spy),
+                                                  lqd: weathermen.period_average(CALENDAR)})]
+    for test_weatherman in test_weathermen:
+        panel = test_weatherman.forecast_many(universe, dates, period)
+        assert [asset.symbol() for asset in panel.assets()] == ["LQD", "SPY"]
+        assert panel.cagrs().shape == (3, 2)
+        for date in dates:
+            forecast = test_weatherman(universe, date, period)
+            for asset in [spy, lqd]:
+                assert is_close(panel.on(date).cagr(asset), forecast.cagr(asset))
+                assert is_close(panel.on(date).volatility(asset), forecast.volatility(asset))
+
+    assert is_close(test_weathermen[0].forecast_many(universe, dates, period).on(dates[-1]).cagr(spy), .152)
+
+def test_rolling_coefficients():
+    """ Tests the running normal equation fits against fitting each window directly """
+
+    random = numpy.random.RandomState(7)
+    features = numpy.column_stack([numpy.ones(300), random.randn(300), random.randn(300)])
+    targets = features.dot([.1, .5, -.2]) + random.randn(300) * .1
+    features[17, 1] = numpy.nan
+    complete = ~numpy.isnan(features).any(axis=1)
+
+    expanding = weathermen.rolling_coefficients(features, targets)
+    windowed = weathermen.rolling_coefficients(features, targets, 50)
+    assert numpy.isnan(expanding[2]).all()
+    for row in [60, 120, 299]:
+        rows = complete[:row + 1]
+        expected = numpy.linalg.lstsq(features[:row + 1][rows], targets[:row + 1][rows])[0]
+        assert numpy.allclose(expanding[row], expected)
+
+        rows = complete[row - 49:row + 1]
+        expected = numpy.linalg.lstsq(features[row - 49:row + 1][rows], targets[row - 49:row + 1][rows])[0]
+        assert numpy.allclose(windowed[row], expected)
+
+def test_rolling_linear():
+    """ Tests the rolling linear forecaster. Fit over all history, it agrees with the simple linear forecaster """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    period = 25
+    rolling_weatherman = weathermen.rolling_linear(CALENDAR)
+
+    #NOTE: all history known at the last date is everything the simple linear model was fit on
+    params = weathermen.simple_linear(CALENDAR, spy).params_on(spy.end(), 25)
+    closes = spy.prices()
+    growths = closes.pct_change(25).values
+    features = numpy.column_stack([numpy.ones(len(growths)), weathermen.shifted(growths, 25)])
+    coefficients = weathermen.rolling_coefficients(features, growths)
+    assert numpy.allclose(coefficients[-1], params)
+
+    time_point = datetime(2012, 12, 31)
+    forecast = rolling_weatherman(DEFAULT_ASSET_FACTORY, time_point, period)
+    panel = rolling_weatherman.forecast_many([spy], [datetime(2010, 3, 31), time_point], period)
+    assert is_close(forecast.cagr(spy), panel.cagrs()[-1, 0])
+    assert is_close(forecast.volatility(spy),
+                    weathermen.period_average(CALENDAR)(None, time_point, period).volatility(spy))
+
+    expected = numpy.linalg.lstsq(features[:closes.index.get_loc(time_point) + 1][25 * 2:],
+                                  growths[:closes.index.get_loc(time_point) + 1][25 * 2:])[0]
+    predictors = [1.0, spy.total_return(CALENDAR.nth_trading_day_before(25, time_point), time_point)]
+    assert is_close(forecast.cagr(spy), annualized(numpy.dot(expected, predictors), 25))
+
+def test_rolling_linear_per_date():
+    """ Tests forecasting one date at a time agrees with batches, and fits the history once rather than per call """
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    dates = CALENDAR.dates_at(CALENDAR.nth_trading_days("monthly", 0))
+    dates = list(dates[(dates >= datetime(2011, 1, 1)) & (dates <= datetime(2012, 12, 31))])
+    rolling_weatherman = weathermen.rolling_linear(CALENDAR, lags=(25, 50))
+    panel = weathermen.rolling_linear(CALENDAR, lags=(25, 50)).forecast_many(universe, dates, 25)
+
+    fits = []
+    rolling_coefficients = weathermen.rolling_coefficients
+
+    def counted(*args):
+        """ Counts fits over whole histories """
+        fits.append(args)
+        return rolling_coefficients(*args)
+
+    weathermen.rolling_coefficients = counted
+    try:
+        for date in dates:
+            forecast = rolling_weatherman(universe, date, 25)
+            for asset in universe:
+                assert is_close(forecast.simple_sharpe(asset), panel.on(date).simple_sharpe(asset))
+    finally:
+        weathermen.rolling_coefficients = rolling_coefficients
+    assert len(fits) == 2
+
+def test_rolling_linear_features():
+    """ Tests the rolling linear forecaster with a technical feature pulled from the feature store """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    store = features.FeatureStore()
+    time_point = datetime(2012, 12, 31)
+    rolling_weatherman = weathermen.rolling_linear(CALENDAR, window=500, feature_specs=[("rsi", 14)],
+                                                   feature_store=store)
+    forecast = rolling_weatherman(DEFAULT_ASSET_FACTORY, time_point, 25)
+
+    closes = spy.prices()
+    growths = closes.pct_change(25).values
+    rsis = store.feature(spy, ("rsi", 14)).values
+    regressors = numpy.column_stack([numpy.ones(len(growths)), weathermen.shifted(growths, 25),
+                                     weathermen.shifted(rsis, 25)])
+    last = closes.index.get_loc(time_point)
+    expected = numpy.linalg.lstsq(regressors[last - 499:last + 1], growths[last - 499:last + 1])[0]
+    predictors = [1.0, growths[last], rsis[last]]
+    assert is_close(forecast.cagr(spy), annualized(numpy.dot(expected, predictors), 25))
+
+def test_rolling_linear_dummy():
+    """ Tests dummy features that hold constant across a window leave that window's fit missing rather than failing
+    every other window's """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    store = features.FeatureStore()
+    for spec in [("above", 25, 5), ("above", 200)]:
+        for window in [None, 60, 250]:
+            rolling_weatherman = weathermen.rolling_linear(CALENDAR, window=window, feature_specs=[spec],
+                                                           feature_store=store)
+            panel = rolling_weatherman.forecast_many(DEFAULT_ASSET_FACTORY.make_universe(["SPY"]),
+                                                     [datetime(2010, 12, 31), datetime(2012, 12, 31)], 25)
+            assert numpy.isfinite(panel.cagrs()).any()
+
+    dummy = numpy.concatenate([numpy.zeros(50), numpy.ones(50), numpy.zeros(50)])
+    random = numpy.random.RandomState(7)
+    regressors = numpy.column_stack([numpy.ones(150), random.randn(150), dummy])
+    coefficients = weathermen.rolling_coefficients(regressors, random.randn(150), 30)
+    assert numpy.isnan(coefficients[[40, 90, 140]]).all()
+    assert numpy.isfinite(coefficients[[60, 110]]).all()
+
+def test_predict_arma():
+    """ Tests ARMA predictions from fitted parameters against statsmodels' own forecasts """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    returns = spy.prices().pct_change().values[-800:-300]
+    for order in [(1, 0), (1, 1)]:
+        fit = sm.tsa.ARMA(returns, order=order).fit(disp=0)
+        expected = numpy.prod(1.0 + fit.forecast(5)[0]) - 1.0
+        assert is_close(weathermen.predict_arma(weathermen.fit_arma(returns, *order), returns, order[0], order[1], 5),
+                        expected)
+
+def test_model_forecaster():
+    """ Tests that model fits are cached per window end, reused between refits and the same fit in parallel """
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    dates = [datetime(2012, 9, 4), datetime(2012, 10, 1), datetime(2012, 11, 1), datetime(2012, 12, 3)]
+    serial = weathermen.model_forecaster(CALENDAR, ("arma", 1, 0), window=250, refit_every=2, processes=1)
+    panel = serial.forecast_many(universe, dates, 25)
+
+    #NOTE: refits are made on every other rebalance of a rule rebalancing every 25 trading days
+    spy = universe["SPY"]
+    returns = spy.prices().pct_change().dropna()
+    rebalances = weathermen.rebalance_days(CALENDAR, returns.index[249:], 25)
+    fit_ends = [rebalances[(rebalances.searchsorted(date, side="right") - 1) // 2 * 2] for date in dates]
+    assert sorted(set(fit_end for _, fit_end, _ in serial.fits())) == sorted(set(fit_ends))
+    assert len(serial.fits()) == 2 * len(set(fit_ends))
+    serial.forecast_many(universe, dates[:3], 25)
+    assert len(serial.fits()) == 2 * len(set(fit_ends))
+
+    parallel = weathermen.model_forecaster(CALENDAR, ("arma", 1, 0), window=250, refit_every=2, processes=2)
+    assert numpy.allclose(parallel.forecast_many(universe, dates, 25).cagrs(), panel.cagrs())
+
+    params = serial.fits()[("SPY", fit_ends[3], ("arma", 1, 0))]
+    window = returns[returns.index <= dates[3]].values[-250:]
+    assert is_close(panel.on(dates[3]).cagr(spy), annualized(weathermen.predict_arma(params, window, 1, 0, 25), 25))
+
+    cautious = weathermen.ensemble([serial, weathermen.period_average(CALENDAR)], "cautious")
+    averaged = weathermen.ensemble([serial, weathermen.period_average(CALENDAR)])
+    period_average = weathermen.period_average(CALENDAR).forecast_many(universe, dates, 25)
+    assert numpy.allclose(cautious.forecast_many(universe, dates, 25).cagrs(),
+                          numpy.minimum(panel.cagrs(), period_average.cagrs()))
+    assert is_close(averaged.forecast_many(universe, dates, 25).on(dates[1]).cagr(spy),
+                    (panel.on(dates[1]).cagr(spy) + period_average.on(dates[1]).cagr(spy)) / 2.0)
+
+def test_memoized():
+    """ Tests memoized forecasts match the forecaster they wrap, are shared through a cache, evicted least recently
+    used first and shared across processes through a directory """
+
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"])
+    spy = universe["SPY"]
+    dates = [datetime(2010, 3, 31), datetime(2011, 6, 30), datetime(2012, 12, 31)]
+    period_average = weathermen.period_average(CALENDAR)
+    expected = period_average.forecast_many(universe, dates, 25)
+
+    cache = weathermen.ForecastCache()
+    memoized = weathermen.memoized(period_average, cache)
+    assert is_close(memoized(universe, dates[1], 25).cagr(spy), expected.on(dates[1]).cagr(spy))
+    assert len(cache) == 1
+    assert numpy.allclose(memoized.forecast_many(universe, dates, 25).cagrs(), expected.cagrs())
+    assert len(cache) == 6
+
+    #NOTE: a second strategy's forecaster finds everything in the shared cache
+    shared = weathermen.memoized(weathermen.period_average(CALENDAR), cache)
+    assert numpy.allclose(shared.forecast_many(universe, dates, 25).volatilities(), expected.volatilities())
+    assert len(cache) == 6
+
+    small = weathermen.ForecastCache(max_size=2)
+    for key in ["a", "b", "a", "c"]:
+        small.put(key, (1.0, 1.0))
+    assert small.get("b") is None and small.get("a") is not None and small.get("c") is not None
+
+    directory = tempfile.mkdtemp()
+    try:
+        saved = weathermen.ForecastCache(directory=directory)
+        weathermen.memoized(period_average, saved).forecast_many(universe, dates, 25)
+        saved.save()
+        assert len(weathermen.ForecastCache(directory=directory)) == 6
+    finally:
+        shutil.rmtree(directory)
+
+def test_refit_schedules():
+    """ Tests that scheduled fits are made on only the history known at the time, and reused until the schedule calls
+    for a refit """
+
+    spy = DEFAULT_ASSET_FACTORY.make_asset("SPY")
+    universe = DEFAULT_ASSET_FACTORY.make_universe(["SPY"])
+    dates = CALENDAR.dates_at(CALENDAR.nth_trading_days("weekly", 0))
+    dates = list(dates[(dates >= datetime(2012, 1, 1)) & (dates <= datetime(2012, 12, 31))])
+
+    closes = spy.prices()
+    growths = closes.pct_change(25).values
+    regressors = numpy.column_stack([numpy.ones(len(growths)), weathermen.shifted(growths, 25)])
+    expanding = weathermen.rolling_coefficients(regressors, growths)
+
+    #NOTE: refits start on the third day with a growth and its lag known, so there are more growths than params, and
+    #are made on the days a rule rebalancing weekly from the calendar's first day would rebalance
+    first = numpy.flatnonzero(~numpy.isnan(regressors).any(axis=1) & ~numpy.isnan(growths))[2]
+    rebalances = weathermen.rebalance_days(CALENDAR, closes.index[first:], 5)
+    in_use = [rebalances[rebalances.searchsorted(date, side="right") - 1] for date in dates]
+
+    every_fourth = weathermen.simple_linear(CALENDAR, spy, refit=weathermen.every_n_rebalances(4))
+    every_fourth.forecast_many(universe, dates, 5)
+    for date in dates:
+        fit_date = rebalances[(rebalances.searchsorted(date, side="right") - 1) // 4 * 4]
+        assert numpy.allclose(every_fourth.params_on(date, 5), expanding[closes.index.get_loc(fit_date)])
+
+    monthly = weathermen.simple_linear(CALENDAR, spy, refit=weathermen.monthly())
+    params = [tuple(monthly.params_on(date, 5)) for date in dates]
+    assert len(set(params)) == len(set((day.year, day.month) for day in in_use))
+
+    never = weathermen.simple_linear(CALENDAR, spy, refit=weathermen.on_drift(numpy.inf))
+    always = weathermen.simple_linear(CALENDAR, spy, refit=weathermen.on_drift(0.0))
+    assert len(set(tuple(never.params_on(date, 5)) for date in dates)) == 1
+    assert len(set(tuple(always.params_on(date, 5)) for date in dates)) == len(set(in_use))
+
+    #NOTE: the fit in use on a date mustn't depend on the dates forecast before it, or memoized forecasts would
+    forwards = weathermen.simple_linear(CALENDAR, spy, refit=weathermen.on_drift(1.5))
+    backwards = weathermen.simple_linear(CALENDAR, spy, refit=weathermen.on_drift(1.5))
+    assert numpy.allclose([forwards.params_on(date, 5) for date in dates],
+                          [backwards.params_on(date, 5) for date in reversed(dates)][::-1])
+
+    models = weathermen.model_forecaster(CALENDAR, ("arma", 1, 0), window=250, processes=1,
+                                         refit=weathermen.on_drift(1.5))
+    skipping = weathermen.model_forecaster(CALENDAR, ("arma", 1, 0), window=250, processes=1,
+                                           refit=weathermen.on_drift(1.5))
+    panel = models.forecast_many(universe, dates[:10], 21)
+    assert numpy.allclose(skipping.forecast_many(universe, dates[5:10], 21).cagrs(), panel.cagrs()[5:])
+    assert models.spec() == ("model", ("arma", 1, 0), 250, ("on_drift", 1.5))
+
+    #NOTE: each refit on drift waits on the fit before it, so every asset's next refit is fit in one batch
+    batches = []
+    map_forked = weathermen.parallel.map_forked
+
+    def counted(function, items, processes=None):
+        """ Counts the fits in each batch """
+        batches.append(len(items))
+        return map_forked(function, items, processes)
+
+    weathermen.parallel.map_forked = counted
+    try:
+        refitting = weathermen.model_forecaster(CALENDAR, ("arma", 1, 0), window=250, processes=1,
+                                                refit=weathermen.on_drift(0.0))
+        refitting.forecast_many(DEFAULT_ASSET_FACTORY.make_universe(["SPY", "LQD"]), dates[:10], 21)
+    finally:
+        weathermen.parallel.map_forked = map_forked
+    assert len(refitting.fits()) == sum(batches) > max(batches) == 2
+
+    shorter = weathermen.simple_linear(CALENDAR, spy, horizon=5)
+    assert is_close(shorter(DEFAULT_ASSET_FACTORY, dates[-1], 25).cagr(spy),
+                    annualized(numpy.dot(shorter.params_on(dates[-1], 25),
+                                         [1.0, spy.total_return(CALENDAR.nth_trading_day_before(5, dates[-1]),
+                                                                dates[-1])]), 5))
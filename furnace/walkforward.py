@@ -0,0 +1,107 @@
+""" Walk forward analysis - splitting a date range in to train and test folds, configuring a strategy on each train
+span and stitching together how it does on the test spans that follow. Only test spans are ever traded, so the
+stitched performance is out of sample as long as each fold's strategy only looks at its train span """
+
+import functools
+import numpy
+from furnace import parallel, performance
+
+class Fold(object):
+    """ A train span followed by the test span it's evaluated on. The test span begins the day the train span ends """
+
+    def __init__(self, train_begin, train_end, test_end):
+        assert train_begin < train_end < test_end
+        self._train_begin = train_begin
+        self._train_end = train_end
+        self._test_end = test_end
+
+    def train_begin(self):
+        """ Getter for the first date of the train span """
+        return self._train_begin
+
+    def train_end(self):
+        """ Getter for the last date of the train span """
+        return self._train_end
+
+    def test_begin(self):
+        """ Getter for the first date of the test span, which is the last of the train span """
+        return self._train_end
+
+    def test_end(self):
+        """ Getter for the last date of the test span """
+        return self._test_end
+
+def folds_during(calendar, begin_date, end_date, train_days, test_days, expanding=False):
+    """ Splits begin to end in to folds of test_days trading days, each following train_days trading days of
+    training. Rolling folds keep train_days of training while expanding folds train from begin onward. Test spans
+    abut one another, and any days left over at end too few for a full test span are left out """
+    assert train_days > 0 and test_days > 0
+    first = calendar.ordinals_after([begin_date])[0]
+    last = calendar.ordinals_before([end_date])[0]
+
+    #NOTE: rules like n day rebalancing drop trailing partial periods, so short test spans could leave gaps
+    test_begins = numpy.arange(first + train_days, last - test_days + 1, test_days)
+    test_ends = test_begins + test_days
+    train_begins = numpy.repeat(first, len(test_begins)) if expanding else test_begins - train_days
+
+    return [Fold(*dates) for dates in zip(calendar.dates_at(train_begins), calendar.dates_at(test_begins),
+                                          calendar.dates_at(test_ends))]
+
+def best_in_sample(candidates, metric="simple_sharpe"):
+    """ A fold builder that backtests every candidate over the train span and trades the one with the highest
+    metric. Candidates are strategy builders taking a universe and a calendar, like partially applied strategy
+    family functions """
+    def builder(universe, calendar, fold):
+        """ Picks the best candidate over fold's train span """
+        strategies = [candidate(universe, calendar) for candidate in candidates]
+        performances = [strategy_.performance_during(fold.train_begin(), fold.train_end(), compact=True)
+                        for strategy_ in strategies]
+        scores = performance.batch_metrics(performances)[metric].values
+        return strategies[int(numpy.nanargmax(scores))]
+    return builder
+
+def walk_forward(builder, universe, calendar, folds, processes=None):
+    """ Runs each fold's strategy over its test span and chain links them together. Builder takes a universe, a
+    calendar and a fold and returns the strategy to trade on that fold, configured using no more than its train span.
+    Folds are run across a pool of processes. None uses a process per cpu and 1 runs folds in this process """
+    assert folds
+    period_performances = parallel.map_forked(functools.partial(run_fold, builder, universe, calendar), folds,
+                                              processes)
+    return WalkForward(folds, period_performances, universe)
+
+def run_fold(builder, universe, calendar, fold):
+    """ Returns the unlinked period performances of fold's strategy over its test span """
+    strategy_ = builder(universe, calendar, fold)
+    return strategy_.period_performances_during(fold.test_begin(), fold.test_end())
+
+class WalkForward(object):
+    """ The results of a walk forward analysis - the stitched out of sample performance along with how each fold
+    did on its own """
+
+    def __init__(self, folds, period_performances, universe):
+        self._folds = folds
+        self._fold_performances = [performance.link_periods(periods, universe) for periods in period_performances]
+
+        #NOTE: linking reindexes periods in place, so the stitched performance is linked from copies to leave the
+        #periods each fold performance holds on to as they were
+        self._performance = performance.link_periods([period.copy() for periods in period_performances
+                                                      for period in periods], universe)
+
+    def folds(self):
+        """ Getter for the folds """
+        return self._folds
+
+    def fold_performances(self):
+        """ The out of sample performance of each fold on its own """
+        return self._fold_performances
+
+    def performance(self):
+        """ The out of sample performance of every fold chain linked together """
+        return self._performance
+
+    def fold_metrics(self):
+        """ Returns a table of metrics, as batch metrics, with a row per fold """
+        metrics = performance.batch_metrics(self._fold_performances)
+        metrics.insert(0, "test_end", [fold.test_end() for fold in self._folds])
+        metrics.insert(0, "test_begin", [fold.test_begin() for fold in self._folds])
+        return metrics
@@ -1,9 +1,18 @@
 """ A collection of forecasters """
 
 import abc
+import bisect
+import collections
+import cPickle
+import functools
+import os
+import tempfile
+import numpy
 import pandas as pd
 import statsmodels.api as sm
 from furnace.data.asset import annualized
+from furnace import parallel
+from furnace.data import features
 
 class Forecast(object):
     """ Represents metrics from a forecaster. Currently assumes growth but can be attached to any value in the
@@ -28,14 +37,105 @@ class Forecast(object):
         """ Generates a volatility estimate for the asset """
         pass
 
+class ForecastPanel(object):
+    """ Forecasts for many dates at once, held as (dates x assets) arrays of cagr and volatility. Assets are columns
+    in symbol order. Panels may also carry a covariance, which is only stacked up by date when asked for """
+
+    def __init__(self, dates, assets, cagrs, volatilities, covariance=None):
+        assert cagrs.shape == volatilities.shape == (len(dates), len(assets))
+        assert covariance is None or covariance.assets() == list(assets)
+        self._dates = pd.DatetimeIndex(dates)
+        self._assets = list(assets)
+        self._cagrs = cagrs
+        self._volatilities = volatilities
+        self._covariance = covariance
+        self._covariances = None
+
+    def dates(self):
+        """ The dates forecast, one per row """
+        return self._dates
+
+    def assets(self):
+        """ The assets forecast, one per column """
+        return self._assets
+
+    def cagrs(self):
+        """ The (dates x assets) cagr forecasts """
+        return self._cagrs
+
+    def volatilities(self):
+        """ The (dates x assets) volatility forecasts """
+        return self._volatilities
+
+    def simple_sharpes(self):
+        """ The (dates x assets) simple sharpe forecasts """
+        return self._cagrs / self._volatilities
+
+    def covariances(self):
+        """ The (dates x assets x assets) covariance forecasts, or None if this panel doesn't forecast covariance """
+        if self._covariances is None and self._covariance is not None:
+            self._covariances = numpy.array([self._covariance.on(date) for date in self._dates])
+        return self._covariances
+
+    def on(self, date, asset_factory=None):
+        """ Returns the single date forecast for date """
+        row = self._dates.get_loc(date)
+        return Tabulated(asset_factory, self._dates[row], self._assets, self._cagrs[row], self._volatilities[row])
+
+def make_forecast_panel(dates, columns, covariance=None):
+    """ Stacks per asset (asset, cagrs, volatilities) columns into a panel, ordering assets by symbol """
+    columns = sorted(columns, key=lambda column: column[0])
+    assets = [asset for asset, _, _ in columns]
+    cagrs = numpy.column_stack([cagrs for _, cagrs, _ in columns])
+    volatilities = numpy.column_stack([volatilities for _, _, volatilities in columns])
+    return ForecastPanel(dates, assets, cagrs, volatilities, covariance)
+
+class Tabulated(Forecast):
+    """ A forecast looked up from one date's row of a forecast panel """
+
+    def __init__(self, asset_factory, time_point, assets, cagrs, volatilities):
+        super(Tabulated, self).__init__(asset_factory)
+        self._time_point = time_point
+        self._columns = dict((asset.symbol(), column) for column, asset in enumerate(assets))
+        self._cagrs = cagrs
+        self._volatilities = volatilities
+
+    def simple_sharpe(self, asset):
+        return self.cagr(asset) / self.volatility(asset)
+
+    def cagr(self, asset):
+        return self._cagrs[self._columns[asset.symbol()]]
+
+    def volatility(self, asset):
+        return self._volatilities[self._columns[asset.symbol()]]
+
+    def time_point(self):
+        """ The date this forecast was made on """
+        return self._time_point
+
+#NOTE: forecasters are called like the factory functions they replaced, but are objects so that they can also
+#forecast many dates at once. Strategies look for forecast_many and fall back to calling per date without it.
+#forecast_many takes anything iterable over assets, such as a universe, and returns a ForecastPanel
+class NullForecaster(object):
+    """ Forecaster for the Null forecast """
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("null",)
+
+    def __call__(self, asset_factory, dummy_time_point, dummy_period):
+        return Null(asset_factory, 1.0, 1.0)
+
+    def forecast_many(self, universe, dates, dummy_period):
+        """ Canned forecasts for every date and asset """
+        ones = numpy.ones(len(dates))
+        return make_forecast_panel(dates, [(asset, ones, ones) for asset in universe])
+
 def null_forecaster():
     """ A null forecaster returns canned input. Useful for testing portfolio optimizers and
     strategies that don't rely on forecasts """
 
-    def forecast(asset_factory, dummy_time_point, dummy_period):
-        """ Factory function for the null forecaster """
-        return Null(asset_factory, 1.0, 1.0)
-    return forecast
+    return NullForecaster()
 
 class Null(Forecast):
     """ Simply returns some default value for all symbols """
@@ -63,11 +163,24 @@ def historical_average():
     All data we have is used to generate the average, including all of past history and all
     future we have access too, even past the date we're looking """
 
-    def forecast(asset_factory, dummy_time_point, dummy_period):
-        """ Factory function for the historical average forecaster """
+    return HistoricalAverageForecaster()
+
+class HistoricalAverageForecaster(object):
+    """ Forecaster for the HistoricalAverage forecast """
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("historical_average",)
+
+    def __call__(self, asset_factory, dummy_time_point, dummy_period):
         return HistoricalAverage(asset_factory)
 
-    return forecast
+    def forecast_many(self, universe, dates, dummy_period):
+        """ The same whole history forecast for every date """
+        ones = numpy.ones(len(dates))
+        forecast = HistoricalAverage(universe)
+        return make_forecast_panel(dates, [(asset, forecast.cagr(asset) * ones, forecast.volatility(asset) * ones)
+                                           for asset in universe])
 
 class HistoricalAverage(Forecast):
     """ Forecast simply returns the historical average of any asset """
@@ -88,11 +201,36 @@ def period_average(calendar):
     """ Period average forecaster uses the previous period, defined by some n-trading days ago to the present
     to generate an average for growth or volatility. """
 
-    def forecast(asset_factory, time_point, period):
-        """ Factory function for the period average forecaster """
-        return PeriodAverage(asset_factory, time_point, period, calendar)
+    return PeriodAverageForecaster(calendar)
+
+def trailing_periods(calendar, dates, period):
+    """ Returns the begin and end dates of the period trading days up to and including each of dates, as used by
+    the period based forecasts. Periods may be floats, as annual rules give a year of 252.0 trading days """
+    ends = pd.DatetimeIndex(dates)
+    ordinals = calendar.ordinals_before(ends)
+    assert (calendar.dates_at(ordinals).values == ends.values).all()
+    return calendar.dates_at(ordinals - int(period)).values, ends
+
+class PeriodAverageForecaster(object):
+    """ Forecaster for the PeriodAverage forecast """
+
+    def __init__(self, calendar):
+        self._calendar = calendar
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("period_average",)
 
-    return forecast
+    def __call__(self, asset_factory, time_point, period):
+        return PeriodAverage(asset_factory, time_point, period, self._calendar)
+
+    def forecast_many(self, universe, dates, period):
+        """ Period average forecasts for every date, from running statistics of each asset. Whole universes also
+        get the covariance over the same periods """
+        begins, ends = trailing_periods(self._calendar, dates, period)
+        covariance = universe.windowed_covariance(period) if hasattr(universe, "windowed_covariance") else None
+        return make_forecast_panel(dates, [(asset, asset.cagrs(begins, ends), asset.volatilities(begins, ends))
+                                           for asset in universe], covariance)
 
 class PeriodAverage(Forecast):
     """ Forecast that uses last period's average of any asset.
@@ -127,20 +265,209 @@ class PeriodAverage(Forecast):
         """ End of this period """
         return self._time_point
 
-def simple_linear(calendar, asset):
-    """ Creates a simple linear predictor of a single asset """
+    def time_point(self):
+        """ The date this forecast was made on """
+        return self._time_point
+
+class RefitSchedule(object):
+    """ Decides when model forecasters refit. Between refits the previous fit is reused """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def due(self, fit_date, date, rebalances, drift):
+        """ Predicate on refitting on date, given the fit made on fit_date rebalances rebalances before. Calling drift
+        returns the fit's recent squared error relative to its in sample error """
+        pass
+
+    @abc.abstractmethod
+    def spec(self):
+        """ Describes this schedule for memoization """
+        pass
+
+    def uses_drift(self):
+        """ Predicate on due calling drift, so deciding on a refit needs the fit before it """
+        return False
 
-    adjusted_closes = asset._table["Adjusted Close"]
-    growths = adjusted_closes.pct_change(25)
-    y_x = sm.add_constant(pd.concat({'growth':growths, 'growth_lag':growths.shift(25)}, axis=1).dropna())
-    model = sm.OLS(y_x["growth"], y_x[["const", "growth_lag"]])
-    fit = model.fit()
+class EveryNRebalances(RefitSchedule):
+    """ Refits on every nth rebalance """
 
-    def make_forecast(asset_factory, time_point, period):
-        """ Returns the forecast for a particular time period """
-        return SimpleLinear(asset_factory, fit, time_point, period, calendar)
+    def __init__(self, rebalances):
+        self._rebalances = rebalances
 
-    return make_forecast
+    def due(self, fit_date, date, rebalances, drift):
+        return rebalances >= self._rebalances
+
+    def spec(self):
+        return ("every_n_rebalances", self._rebalances)
+
+class Monthly(RefitSchedule):
+    """ Refits on the first rebalance of every month """
+
+    def due(self, fit_date, date, rebalances, drift):
+        return (date.year, date.month) != (fit_date.year, fit_date.month)
+
+    def spec(self):
+        return ("monthly",)
+
+class OnDrift(RefitSchedule):
+    """ Refits once the fit's squared error since it was made grows past threshold times its in sample error """
+
+    def __init__(self, threshold):
+        self._threshold = threshold
+
+    def due(self, fit_date, date, rebalances, drift):
+        return drift() > self._threshold
+
+    def spec(self):
+        return ("on_drift", self._threshold)
+
+    def uses_drift(self):
+        return True
+
+def every_n_rebalances(rebalances):
+    """ Creates a schedule refitting on every nth rebalance """
+    return EveryNRebalances(rebalances)
+
+def monthly():
+    """ Creates a schedule refitting on the first rebalance of every month """
+    return Monthly()
+
+def on_drift(threshold=1.5):
+    """ Creates a schedule refitting once a fit's recent squared error passes threshold times its in sample error """
+    return OnDrift(threshold)
+
+def rebalance_days(calendar, days, period):
+    """ Returns those of days a rule rebalancing every period trading days from the calendar's first day rebalances
+    on. Refits are only made on these, so they follow a fixed schedule whichever dates are forecast """
+    days = pd.DatetimeIndex(days)
+    return days[calendar.ordinals_after(days) % int(period) == 0]
+
+class Refits(object):
+    """ Follows one model's refits through the rebalance days it may refit on, walking forward from the first. The fit
+    in use on a date is the last refit on or before it, so it doesn't depend on which dates were forecast before """
+
+    def __init__(self, schedule, days):
+        self._schedule = schedule
+        self._days = pd.DatetimeIndex(days)
+        self._fit_rows = [0]
+        self._walked = 0
+
+    def fit_date_on(self, date, drift):
+        """ Returns the date of the fit to forecast date with. Dates before the first day are fit on themselves.
+        drift is called with a fit date and a later day only when the schedule needs it """
+        date = pd.Timestamp(date)
+        row = self._days.searchsorted(date, side="right") - 1
+        if row < 0:
+            return date
+
+        self.walk_to(date, drift)
+        return self._days[self._fit_rows[bisect.bisect_right(self._fit_rows, row) - 1]]
+
+    def walk_to(self, date, drift, fitted=None):
+        """ Walks refits forward to date, returning None. Given fitted, a predicate on a fit date's fit being made,
+        schedules that use drift stop before checking a fit not made yet and return its date instead, so the fits they
+        wait on can be made together """
+        row = self._days.searchsorted(pd.Timestamp(date), side="right") - 1
+        while self._walked < row:
+            fit_date, day = self._days[self._fit_rows[-1]], self._days[self._walked + 1]
+            if fitted is not None and self._schedule.uses_drift() and not fitted(fit_date):
+                return fit_date
+
+            rebalances = self._walked + 1 - self._fit_rows[-1]
+            if self._schedule.due(fit_date, day, rebalances, functools.partial(drift, fit_date, day)):
+                self._fit_rows.append(self._walked + 1)
+            self._walked += 1
+        return None
+
+def simple_linear(calendar, asset, horizon=25, refit=None):
+    """ Creates a simple linear predictor of growth over the next horizon trading days from growth over the last
+    horizon trading days, fit on a single asset. Without a refit schedule the model is fit once on the asset's whole
+    history. With one, it's refit on the rebalances the schedule calls for, on only the history known at each, and
+    reused until the next """
+
+    if refit is None:
+        adjusted_closes = asset._table["Adjusted Close"]
+        growths = adjusted_closes.pct_change(horizon)
+        y_x = sm.add_constant(pd.concat({'growth':growths, 'growth_lag':growths.shift(horizon)}, axis=1).dropna())
+        model = sm.OLS(y_x["growth"], y_x[["const", "growth_lag"]])
+        fit = model.fit()
+        return SimpleLinearForecaster(calendar, asset, horizon, None, fit.params[["const", "growth_lag"]].values)
+
+    return SimpleLinearForecaster(calendar, asset, horizon, refit)
+
+class SimpleLinearForecaster(object):
+    """ Forecaster for the SimpleLinear forecast. Scheduled fits are kept by the date they were made """
+
+    def __init__(self, calendar, asset, horizon, schedule, params=None):
+        self._calendar = calendar
+        self._symbol = asset.symbol()
+        self._horizon = horizon
+        self._schedule = schedule
+        self._params = params
+        self._fits = {}
+
+        growths = asset.prices().pct_change(horizon)
+        self._dates = growths.index
+        self._growths = growths.values
+        self._lagged_growths = shifted(self._growths, horizon)
+
+        #NOTE: refits start once there are more growths known than params to fit
+        known = numpy.flatnonzero(self._known_by(self._dates[-1]))
+        self._refit_days = self._dates[known[2]:] if len(known) > 2 else self._dates[:0]
+        self._refits = {}
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("simple_linear", self._symbol, self._horizon, None if self._schedule is None else self._schedule.spec())
+
+    def __call__(self, asset_factory, time_point, period):
+        return SimpleLinear(asset_factory, self.params_on(time_point, period), time_point, period, self._calendar,
+                            self._horizon)
+
+    def forecast_many(self, universe, dates, period):
+        """ Linear forecasts for every date, predicted from each trailing horizon's growth at once """
+        begins, ends = trailing_periods(self._calendar, dates, period)
+        growth_begins, _ = trailing_periods(self._calendar, dates, self._horizon)
+        params = numpy.array([self.params_on(end, period) for end in ends])
+
+        return make_forecast_panel(dates, [(asset,
+                                            annualized(params[:, 0] + params[:, 1] *
+                                                       asset.total_returns(growth_begins, ends), self._horizon),
+                                            asset.volatilities(begins, ends))
+                                           for asset in universe])
+
+    def params_on(self, date, period):
+        """ The (const, slope) of the fit in use on date, by a rule rebalancing every period trading days """
+        if self._schedule is None:
+            return self._params
+        if period not in self._refits:
+            self._refits[period] = Refits(self._schedule, rebalance_days(self._calendar, self._refit_days, period))
+        return self._fit_on(self._refits[period].fit_date_on(date, self._drift))[0]
+
+    def _fit_on(self, fit_date):
+        """ Fits on the growths known by fit_date, returning params and their mean squared error """
+        if fit_date not in self._fits:
+            known = self._known_by(fit_date)
+            regressors = numpy.column_stack([numpy.ones(known.sum()), self._lagged_growths[known]])
+            params = numpy.linalg.lstsq(regressors, self._growths[known])[0]
+            errors = self._growths[known] - regressors.dot(params)
+            self._fits[fit_date] = (params, (errors * errors).mean())
+        return self._fits[fit_date]
+
+    def _drift(self, fit_date, date):
+        """ The squared error of the fit made on fit_date over the growths known since, relative to in sample """
+        params, in_sample = self._fit_on(fit_date)
+        recent = self._known_by(date) & ~self._known_by(fit_date)
+        if not recent.any():
+            return 0.0
+        errors = self._growths[recent] - params[0] - params[1] * self._lagged_growths[recent]
+        return (errors * errors).mean() / in_sample
+
+    def _known_by(self, date):
+        """ Mask of the growths, and their lags, known by date """
+        known = ~(numpy.isnan(self._growths) | numpy.isnan(self._lagged_growths))
+        known[self._dates.searchsorted(date, side='right'):] = False
+        return known
 
 class SimpleLinear(Forecast):
     """ Forecast that uses last period's average of any asset.
@@ -148,13 +475,14 @@ class SimpleLinear(Forecast):
     of *value* to consider, but period days of performance since performance is judged
     off of pct_changes """
 
-    def __init__(self, asset_factory, model, time_point, period, calendar):
+    def __init__(self, asset_factory, params, time_point, period, calendar, horizon=25):
         super(SimpleLinear, self).__init__(asset_factory)
         assert time_point in calendar
         self._time_point = time_point
         self._period = period
         self._calendar = calendar
-        self._model = model
+        self._params = params
+        self._horizon = horizon
 
     def simple_sharpe(self, asset):
         return self.cagr(asset) / self.volatility(asset)
@@ -166,11 +494,345 @@ class SimpleLinear(Forecast):
         return asset.volatility(begin, end)
 
     def cagr(self, asset):
-        """ Returns a period average based forecast of growth"""
-        begin = self._calendar.nth_trading_day_before(self._period, self._time_point)
+        """ Returns a linear forecast of growth from the last horizon's growth """
+        begin = self._calendar.nth_trading_day_before(self._horizon, self._time_point)
         end = self._time_point
-        assert self._calendar.number_trading_days_between(begin, end) == 25
-        return annualized(self._model.predict([1.0, asset.total_return(begin, end)]), 25)
+        assert self._calendar.number_trading_days_between(begin, end) == self._horizon
+        return annualized(numpy.dot(self._params, [1.0, asset.total_return(begin, end)]), self._horizon)
+
+    def time_point(self):
+        """ The date this forecast was made on """
+        return self._time_point
+
+def rolling_linear(calendar, lags=(25,), window=None, horizon=25, feature_specs=(), feature_store=None):
+    """ Creates a linear predictor of each asset's growth over the next horizon trading days from its growths over
+    horizon days lagged by each of lags. Unlike simple_linear, coefficients are refit on every date from only the
+    history known by then, over the trailing window of trading days or all history if window is None.
+
+    Technical features named by feature_specs are pulled from the feature store as further predictors """
+    if feature_store is None:
+        feature_store = features.FeatureStore()
+    return RollingLinearForecaster(calendar, lags, window, horizon, feature_specs, feature_store)
+
+class RollingLinearForecaster(object):
+    """ Forecaster for the RollingLinear forecast. Batch forecasts fit every date of an asset's history in one pass,
+    from running sums of the least squares normal equations """
+
+    def __init__(self, calendar, lags, window, horizon, feature_specs, feature_store):
+        #NOTE: lags shorter than the horizon would need growths from the future to forecast
+        assert min(lags) >= horizon
+        self._calendar = calendar
+        self._lags = lags
+        self._window = window
+        self._horizon = horizon
+        self._feature_specs = feature_specs
+        self._feature_store = feature_store
+        self._histories = {}
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("rolling_linear", tuple(self._lags), self._window, self._horizon, tuple(self._feature_specs))
+
+    def __call__(self, asset_factory, time_point, period):
+        return Batched(asset_factory, self, time_point, period)
+
+    def forecast_many(self, universe, dates, period):
+        """ Linear forecasts for every date, each fit only on history up to that date """
+        begins, ends = trailing_periods(self._calendar, dates, period)
+        return make_forecast_panel(dates, [(asset, self._cagrs(asset, ends), asset.volatilities(begins, ends))
+                                           for asset in universe])
+
+    def _cagrs(self, asset, dates):
+        """ Looks every date up in the forecasts over asset's history """
+        history, cagrs = self._history(asset)
+        dates = pd.DatetimeIndex(dates).values
+        rows = history.searchsorted(dates)
+        assert (history[rows] == dates).all()
+        return cagrs[rows]
+
+    def _history(self, asset):
+        """ Fits and predicts every date of asset's history at once. Histories are kept by symbol, so forecasting one
+        date at a time costs a lookup rather than a pass over the whole history """
+        kept = self._histories.get(asset.symbol())
+        if kept is not None and kept[0] is asset:
+            return kept[1:]
+
+        closes = asset.prices()
+        growths = closes.pct_change(self._horizon).values
+        technicals = [self._feature_store.feature(asset, spec).values for spec in self._feature_specs]
+
+        #NOTE: growths are regressed on what was known on the day they began
+        regressors = numpy.column_stack([numpy.ones(len(growths))] +
+                                        [shifted(growths, lag) for lag in self._lags] +
+                                        [shifted(technical, self._horizon) for technical in technicals])
+        coefficients = rolling_coefficients(regressors, growths, self._window)
+
+        #NOTE: the growth ending horizon - lag days after a date is known on the date and predicts the next horizon
+        predictors = numpy.column_stack([numpy.ones(len(growths))] +
+                                        [shifted(growths, lag - self._horizon) for lag in self._lags] +
+                                        technicals)
+        cagrs = annualized((coefficients * predictors).sum(axis=1), self._horizon)
+
+        self._histories[asset.symbol()] = (asset, closes.index.values, cagrs)
+        return closes.index.values, cagrs
+
+class Batched(Forecast):
+    """ Forecast on a single date from a forecaster that only forecasts in batches, asked one asset at a time """
+
+    def __init__(self, asset_factory, forecaster, time_point, period):
+        super(Batched, self).__init__(asset_factory)
+        self._forecaster = forecaster
+        self._time_point = time_point
+        self._period = period
+        self._panels = {}
+
+    def simple_sharpe(self, asset):
+        return self.cagr(asset) / self.volatility(asset)
+
+    def cagr(self, asset):
+        return self._forecast(asset).cagrs()[0, 0]
+
+    def volatility(self, asset):
+        return self._forecast(asset).volatilities()[0, 0]
+
+    def time_point(self):
+        """ The date this forecast was made on """
+        return self._time_point
+
+    def _forecast(self, asset):
+        """ A panel of just this asset on just this date, made once and shared by every accessor """
+        if asset not in self._panels:
+            self._panels[asset] = self._forecaster.forecast_many([asset], [self._time_point], self._period)
+        return self._panels[asset]
+
+def shifted(values, lag):
+    """ Shifts values lag rows later, filling the first lag rows with NaN """
+    result = numpy.empty(len(values))
+    result[:lag] = numpy.nan
+    result[lag:] = values[:len(values) - lag]
+    return result
+
+#NOTE: the largest condition number of the normal equations we'll solve
+MAX_CONDITION = 1e12
+
+def rolling_coefficients(features, targets, window=None):
+    """ Least squares coefficients of targets on (rows x features) features, fit at every row on the rows up to and
+    including it, or only the trailing window of them. Rows with missing values are left out. Coefficients are
+    NaN until there are more rows than features, and wherever the fit is degenerate, such as a dummy feature that
+    holds constant across a window and so matches the intercept.
+
+    Fits come from running sums of the normal equations, each row adding its outer product in O(features^2) and
+    dropping out of the window the same way """
+    complete = ~(numpy.isnan(features).any(axis=1) | numpy.isnan(targets))
+    features = numpy.where(complete[:, numpy.newaxis], features, 0.0)
+    targets = numpy.where(complete, targets, 0.0)
+
+    grams = numpy.cumsum(numpy.einsum('ti,tj->tij', features, features), axis=0)
+    moments = numpy.cumsum(features * targets[:, numpy.newaxis], axis=0)
+    counts = numpy.cumsum(complete)
+    if window is not None:
+        grams[window:] -= grams[:-window].copy()
+        moments[window:] -= moments[:-window].copy()
+        counts[window:] -= counts[:-window].copy()
+
+    coefficients = numpy.empty(features.shape)
+    coefficients[:] = numpy.nan
+    solvable = numpy.flatnonzero(counts > features.shape[1])
+
+    #NOTE: running sums leave rounding noise behind, so degenerate grams are rarely exactly singular. Anything this
+    #badly conditioned would only give noise for coefficients
+    singular_values = numpy.linalg.svd(grams[solvable], compute_uv=False)
+    solvable = solvable[singular_values[:, -1] > singular_values[:, 0] / MAX_CONDITION]
+    coefficients[solvable] = numpy.linalg.solve(grams[solvable], moments[solvable])
+    return coefficients
+
+def fit_arma(returns, ar_order, ma_order):
+    """ Fits an ARMA model with a mean to daily returns, returning its mean, autoregressive and moving average
+    parameters in that order """
+    try:
+        return sm.tsa.ARMA(returns, order=(ar_order, ma_order)).fit(disp=0).params
+    except (ValueError, numpy.linalg.LinAlgError):
+        #NOTE: models that can't be fit fall back to the mean return with no dynamics
+        return numpy.concatenate([[returns.mean()], numpy.zeros(ar_order + ma_order)])
+
+def arma_recursion(params, returns, ar_order, ma_order, horizon):
+    """ Runs ARMA params over returns and horizon days past them, returning the residuals on returns and the
+    predicted deviations from the mean past them """
+    mean, ar_params, ma_params = params[0], params[1:1 + ar_order], params[1 + ar_order:]
+    deviations = numpy.concatenate([returns - mean, numpy.zeros(horizon)])
+    residuals = numpy.zeros(len(deviations))
+    for day in xrange(len(deviations)):
+        predicted = (sum(ar_param * deviations[day - lag] for lag, ar_param in enumerate(ar_params, 1) if day >= lag) +
+                     sum(ma_param * residuals[day - lag] for lag, ma_param in enumerate(ma_params, 1) if day >= lag))
+        if day < len(returns):
+            residuals[day] = deviations[day] - predicted
+        else:
+            deviations[day] = predicted
+    return residuals[:len(returns)], deviations[len(returns):]
+
+def predict_arma(params, returns, ar_order, ma_order, horizon):
+    """ Predicts the compound growth over the next horizon days from ARMA params, with moving average residuals
+    recovered from returns """
+    _, deviations = arma_recursion(params, returns, ar_order, ma_order, horizon)
+    return numpy.prod(1.0 + params[0] + deviations) - 1.0
+
+def arma_residuals(params, returns, ar_order, ma_order):
+    """ The residuals of ARMA params on returns """
+    return arma_recursion(params, returns, ar_order, ma_order, 0)[0]
+
+#NOTE: models are named by specs like features, so ("arma", 1, 1) is an ARMA(1, 1). Each has a fit of a window of
+#returns to parameters, a prediction of growth over a horizon from parameters and the returns up to a date, and the
+#residuals of parameters on returns
+MODELS = {
+    "arma": (fit_arma, predict_arma, arma_residuals)
+}
+
+def fit_model(job):
+    """ Fits a (spec, returns) job, returning the model's parameters """
+    spec, returns = job
+    return MODELS[spec[0]][0](returns, *spec[1:])
+
+def model_forecaster(calendar, spec, window=500, refit_every=1, processes=None, refit=None):
+    """ Creates a forecaster of growth from time series models, such as ARMA, fit to each asset's daily returns
+    over a trailing window of trading days. Models are refit on the refit schedule, or every refit_every rebalances
+    without one, across a pool of processes. None uses a process per cpu and 1 fits in this process """
+    assert spec[0] in MODELS
+    return ModelForecaster(calendar, spec, window, every_n_rebalances(refit_every) if refit is None else refit,
+                           processes)
+
+class ModelForecaster(object):
+    """ Forecaster for models fit per asset. Fits are cached by (asset, window end, spec), so they're shared across
+    forecast calls and reused between refits """
+
+    def __init__(self, calendar, spec, window, schedule, processes):
+        self._calendar = calendar
+        self._spec = spec
+        self._window = window
+        self._schedule = schedule
+        self._processes = processes
+        self._fits = {}
+        self._refits = {}
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("model", self._spec, self._window, self._schedule.spec())
+
+    def __call__(self, asset_factory, time_point, period):
+        return Batched(asset_factory, self, time_point, period)
+
+    def forecast_many(self, universe, dates, period):
+        """ Model forecasts for every date, fitting every model not yet cached in one parallel batch. Schedules that
+        refit on drift need each fit to decide on the next, so those fits are made a batch across assets at a time """
+        begins, ends = trailing_periods(self._calendar, dates, period)
+        returns = dict((asset, asset.prices().pct_change().dropna()) for asset in universe)
+        refits = {}
+        for asset, asset_returns in returns.iteritems():
+            #NOTE: refits start from the first full window of returns
+            key = (asset.symbol(), period)
+            if key not in self._refits:
+                days = rebalance_days(self._calendar, asset_returns.index[self._window - 1:], period)
+                self._refits[key] = Refits(self._schedule, days)
+            refits[asset] = self._refits[key]
+
+        #NOTE: every model walks its refits as far as it can before fitting the models they wait on together
+        while True:
+            waiting = []
+            for asset, asset_returns in returns.iteritems():
+                fit_date = refits[asset].walk_to(ends.max(), self._drifts(asset.symbol(), asset_returns),
+                                                 functools.partial(self._fitted, asset.symbol()))
+                if fit_date is not None:
+                    waiting.append((asset.symbol(), asset_returns, fit_date))
+            if not waiting:
+                break
+            self._fit(waiting)
+
+        fit_dates = dict((asset, [refits[asset].fit_date_on(end, self._drifts(asset.symbol(), asset_returns))
+                                  for end in ends])
+                         for asset, asset_returns in returns.iteritems())
+        self._fit([(asset.symbol(), asset_returns, fit_date)
+                   for asset, asset_returns in returns.iteritems()
+                   for fit_date in sorted(set(fit_dates[asset]))])
+
+        predict = MODELS[self._spec[0]][1]
+        columns = []
+        for asset, asset_returns in returns.iteritems():
+            rows = asset_returns.index.get_indexer(ends)
+            assert (rows >= 0).all()
+            growths = [predict(self._fits[(asset.symbol(), fit_date, self._spec)], self._window_of(asset_returns, row),
+                               *(self._spec[1:] + (period,)))
+                       for row, fit_date in zip(rows, fit_dates[asset])]
+            columns.append((asset, annualized(numpy.array(growths), period), asset.volatilities(begins, ends)))
+        return make_forecast_panel(dates, columns)
+
+    def fits(self):
+        """ The fitted parameters, by (symbol, window end, spec) """
+        return self._fits
+
+    def _fit(self, windows):
+        """ Fits every (symbol, returns, window end) not already cached """
+        keys = []
+        jobs = []
+        for symbol, returns, fit_date in windows:
+            key = (symbol, fit_date, self._spec)
+            if key not in self._fits:
+                keys.append(key)
+                jobs.append((self._spec, self._window_of(returns, returns.index.get_loc(fit_date))))
+
+        self._fits.update(zip(keys, parallel.map_forked(fit_model, jobs, self._processes)))
+
+    def _fitted(self, symbol, fit_date):
+        """ Predicate on the fit of symbol's window ending on fit_date being cached """
+        return (symbol, fit_date, self._spec) in self._fits
+
+    def _drifts(self, symbol, returns):
+        """ The drift of symbol's fits, called with a fit date and a later day """
+        return functools.partial(self._drift, symbol, returns)
+
+    def _drift(self, symbol, returns, fit_date, date):
+        """ The squared residuals of the cached fit made on fit_date over the returns since, relative to in sample """
+        residuals = MODELS[self._spec[0]][2](self._fits[(symbol, fit_date, self._spec)],
+                                             self._window_of(returns, returns.index.get_loc(date)),
+                                             *self._spec[1:])
+        recent = returns.index.get_loc(date) - returns.index.get_loc(fit_date)
+        if recent >= len(residuals):
+            return numpy.inf
+        in_sample, since = residuals[:-recent], residuals[-recent:]
+        return (since * since).mean() / (in_sample * in_sample).mean()
+
+    def _window_of(self, returns, row):
+        """ The window of returns up to and including row """
+        return returns.values[max(row + 1 - self._window, 0):row + 1]
+
+def ensemble(weather_team, rule="mean"):
+    """ Combines the batch forecasts of a team of forecasters. The mean rule averages their cagrs and volatilities,
+    the cautious rule takes the lowest cagr and highest volatility forecast for each asset and date """
+    assert rule in ("mean", "cautious")
+    return EnsembleForecaster(weather_team, rule)
+
+class EnsembleForecaster(object):
+    """ Forecaster for ensembles of batch forecasters """
+
+    def __init__(self, weather_team, rule):
+        self._weather_team = weather_team
+        self._rule = rule
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("ensemble", self._rule, tuple(forecaster.spec() for forecaster in self._weather_team))
+
+    def __call__(self, asset_factory, time_point, period):
+        return Batched(asset_factory, self, time_point, period)
+
+    def forecast_many(self, universe, dates, period):
+        """ Combines every member's forecasts """
+        panels = [forecaster.forecast_many(universe, dates, period) for forecaster in self._weather_team]
+        cagrs = numpy.array([panel.cagrs() for panel in panels])
+        volatilities = numpy.array([panel.volatilities() for panel in panels])
+        if self._rule == "mean":
+            cagrs, volatilities = cagrs.mean(axis=0), volatilities.mean(axis=0)
+        else:
+            cagrs, volatilities = cagrs.min(axis=0), volatilities.max(axis=0)
+        return ForecastPanel(dates, panels[0].assets(), cagrs, volatilities)
 
 class AssetSpecific(Forecast):
     """ Returns a specific model depending on asset type """
@@ -194,13 +856,184 @@ def asset_specific(weather_team):
     """ Asset specific forecaster is merely a wrapper around other forecasters that are then
     looked up on a asset symbol name basis. So for instance LQD and SPY can use different models """
 
-    def forecast(asset_factory, time_point, period):
-        """ Returns a forecaster that wraps other forecasters based on asset symbol lookup"""
+    return AssetSpecificForecaster(weather_team)
+
+class AssetSpecificForecaster(object):
+    """ Forecaster for the AssetSpecific forecast """
+
+    def __init__(self, weather_team):
+        self._weather_team = weather_team
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return ("asset_specific", tuple(sorted((asset.symbol(), forecaster.spec())
+                                               for asset, forecaster in self._weather_team.iteritems())))
+
+    def __call__(self, asset_factory, time_point, period):
         forecasts = dict([(key, forecaster(asset_factory, time_point, period))
                           for key, forecaster
-                          in weather_team.iteritems()])
+                          in self._weather_team.iteritems()])
 
         return AssetSpecific(asset_factory, forecasts)
 
-    return forecast
+    def forecast_many(self, universe, dates, period):
+        """ Stitches each asset's column from its own forecaster's panel. Members that can't batch forecast are
+        called per date """
+        columns = []
+        for asset in universe:
+            forecaster = self._weather_team[asset]
+            if hasattr(forecaster, "forecast_many"):
+                panel = forecaster.forecast_many([asset], dates, period)
+                columns.append((asset, panel.cagrs()[:, 0], panel.volatilities()[:, 0]))
+            else:
+                forecasts = [forecaster(universe, date, period) for date in dates]
+                columns.append((asset, numpy.array([forecast.cagr(asset) for forecast in forecasts]),
+                                numpy.array([forecast.volatility(asset) for forecast in forecasts])))
+        return make_forecast_panel(dates, columns)
+
+
+class ForecastCache(object):
+    """ Holds forecast cagrs and volatilities by (forecaster spec, asset symbol, time point, period), evicting the
+    least recently used beyond max_size. One cache can be shared by every strategy in a sweep.
+
+    Given a directory, forecasts found there are loaded up front and save() writes new ones out for other processes
+    to load. Each save writes its own file, so workers sharing a directory never write over each other """
+
+    def __init__(self, max_size=1000000, directory=None):
+        self._max_size = max_size
+        self._directory = directory
+        self._forecasts = collections.OrderedDict()
+        self._unsaved = {}
+        if directory is not None:
+            self.load()
+
+    def __len__(self):
+        return len(self._forecasts)
+
+    def get(self, key):
+        """ Returns the (cagr, volatility) for key, or None if it isn't cached """
+        forecast = self._forecasts.pop(key, None)
+        if forecast is not None:
+            self._forecasts[key] = forecast
+        return forecast
+
+    def put(self, key, forecast):
+        """ Caches a (cagr, volatility) for key """
+        self._forecasts.pop(key, None)
+        self._forecasts[key] = forecast
+        while len(self._forecasts) > self._max_size:
+            self._forecasts.popitem(last=False)
+        if self._directory is not None:
+            self._unsaved[key] = forecast
+
+    def load(self):
+        """ Loads every forecast saved in our directory """
+        for name in sorted(os.listdir(self._directory)):
+            if name.endswith(".pickle"):
+                with open(os.path.join(self._directory, name), "rb") as saved:
+                    for key, forecast in cPickle.load(saved).iteritems():
+                        self.put(key, forecast)
+        self._unsaved.clear()
 
+    def save(self):
+        """ Writes forecasts cached since the last save or load to a new file in our directory """
+        if not self._unsaved:
+            return
+        handle, path = tempfile.mkstemp(suffix=".pickle", prefix="forecasts_", dir=self._directory)
+        with os.fdopen(handle, "wb") as saved:
+            cPickle.dump(self._unsaved, saved, cPickle.HIGHEST_PROTOCOL)
+        self._unsaved.clear()
+        return path
+
+def memoized(forecaster, cache=None, spec=None):
+    """ Wraps a forecaster so its forecasts are looked up in a forecast cache before being made. The spec describing
+    the forecaster defaults to its own. Pass the same cache to every strategy that should share forecasts """
+    return MemoizedForecaster(forecaster, ForecastCache() if cache is None else cache,
+                              forecaster.spec() if spec is None else spec)
+
+class MemoizedForecaster(object):
+    """ Forecaster for memoized forecasts """
+
+    def __init__(self, forecaster, cache, spec):
+        self._forecaster = forecaster
+        self._cache = cache
+        self._spec = spec
+
+    def spec(self):
+        """ Describes this forecaster for memoization """
+        return self._spec
+
+    def __call__(self, asset_factory, time_point, period):
+        return Memoized(asset_factory, self, time_point, period)
+
+    def forecast_many(self, universe, dates, period):
+        """ Looks every asset and date up, then forecasts the missing ones in a single batch. Memoized panels never
+        carry covariance """
+        assets = sorted(universe)
+        dates = pd.DatetimeIndex(dates)
+        cagrs = numpy.empty((len(dates), len(assets)))
+        volatilities = numpy.empty((len(dates), len(assets)))
+        missing = numpy.zeros((len(dates), len(assets)), dtype=bool)
+        for row, date in enumerate(dates):
+            for column, asset in enumerate(assets):
+                forecast = self._cache.get(self.key(asset, date, period))
+                if forecast is None:
+                    missing[row, column] = True
+                else:
+                    cagrs[row, column], volatilities[row, column] = forecast
+
+        if missing.any():
+            rows = missing.any(axis=1)
+            columns = missing.any(axis=0)
+            panel = self._forecast_many([asset for asset, held in zip(assets, columns) if held], dates[rows], period)
+            cagrs[numpy.ix_(rows, columns)] = panel.cagrs()
+            volatilities[numpy.ix_(rows, columns)] = panel.volatilities()
+            for row, column in zip(*numpy.nonzero(missing)):
+                self._cache.put(self.key(assets[column], dates[row], period),
+                                (cagrs[row, column], volatilities[row, column]))
+        return ForecastPanel(dates, assets, cagrs, volatilities)
+
+    def forecast(self, asset_factory, asset, time_point, period):
+        """ Looks one forecast up, making and caching it if it's missing """
+        key = self.key(asset, time_point, period)
+        forecast = self._cache.get(key)
+        if forecast is None:
+            made = self._forecaster(asset_factory, time_point, period)
+            forecast = (made.cagr(asset), made.volatility(asset))
+            self._cache.put(key, forecast)
+        return forecast
+
+    def key(self, asset, time_point, period):
+        """ The cache key of a forecast """
+        return (self._spec, asset.symbol(), pd.Timestamp(time_point), period)
+
+    def _forecast_many(self, assets, dates, period):
+        """ Forecasts in a batch, calling per date for forecasters that can't batch """
+        if hasattr(self._forecaster, "forecast_many"):
+            return self._forecaster.forecast_many(assets, dates, period)
+        forecasts = [self._forecaster(assets, date, period) for date in dates]
+        return ForecastPanel(dates, assets,
+                             numpy.array([[forecast.cagr(asset) for asset in assets] for forecast in forecasts]),
+                             numpy.array([[forecast.volatility(asset) for asset in assets] for forecast in forecasts]))
+
+class Memoized(Forecast):
+    """ Forecast on a single date from a memoized forecaster """
+
+    def __init__(self, asset_factory, forecaster, time_point, period):
+        super(Memoized, self).__init__(asset_factory)
+        self._forecaster = forecaster
+        self._time_point = time_point
+        self._period = period
+
+    def simple_sharpe(self, asset):
+        return self.cagr(asset) / self.volatility(asset)
+
+    def cagr(self, asset):
+        return self._forecaster.forecast(self._asset_factory, asset, self._time_point, self._period)[0]
+
+    def volatility(self, asset):
+        return self._forecaster.forecast(self._asset_factory, asset, self._time_point, self._period)[1]
+
+    def time_point(self):
+        """ The date this forecast was made on """
+        return self._time_point